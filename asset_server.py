@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+asset_server.py - /assets responses: zip members, ranges, validators, caching, precompression.
+
+serve_asset(name) answers GET /assets/<name> from, in this order:
+
+  1. the file root/<name>; if the client accepts gzip and root/<name>.gz exists and is
+     not older than the file, that precompressed variant is sent instead
+  2. a member of a zip archive, addressed either explicitly
+     (meter_analyses/1_input_raw/all.zip/KSS_input_raw.htm) or implicitly through the
+     directory's all.zip when the file itself is absent. Members are streamed out of the
+     archive without extracting them. A deflated member is sent to gzip-accepting clients
+     as its stored deflate stream in a gzip wrapper, without decompressing or recompressing.
+
+Every response has a strong, content-based ETag and Last-Modified. It answers
+If-None-Match / If-Modified-Since with 304, and Range / If-Range with 206 (seeking
+inside stored members, decompressing up to the offset inside deflated ones). Data
+directories that never change between deploys get a long max-age; code and
+styles (css, js, openapi.yaml) are revalidated on every use instead.
+
+The .gz variants are built by
+  python asset_server.py --precompress      # text files of at least --min-bytes under assets/
+(the Dockerfiles do this). mp3s are left as they are: gzip does not shrink
+them. For audio it is Range that matters, so the <audio> player can seek.
+"""
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import struct
+import zipfile
+from pathlib import Path
+
+from flask import Response, abort, request, send_file
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+ASSETS_ROOT = Path(__file__).resolve().parent / "assets"
+ARCHIVE_NAME = "all.zip"
+# data that only changes with a deploy of new analyses or recordings
+LONG_CACHE_DIRS = ("meter_analyses", "melodies", "ocr_comparison", "videos", "wsc2022")
+LONG_MAX_AGE = 30 * 24 * 3600
+PRECOMPRESS_SUFFIXES = (".htm", ".html", ".txt", ".md", ".tsv", ".csv", ".css", ".js", ".yaml", ".svg")
+PRECOMPRESS_MIN_BYTES = 8 * 1024
+
+_LOCAL_HEADER = struct.Struct("<4s5H3I2H")  # zip local file header, 30 bytes
+_etags = {}  # (path, mtime_ns, size) -> sha1 hex
+
+def _accepts_gzip() -> bool:
+    return request.accept_encodings["gzip"] > 0 and "Range" not in request.headers
+
+def _max_age(name: str) -> int:
+    return LONG_MAX_AGE if name.split("/", 1)[0] in LONG_CACHE_DIRS else 0
+
+def _content_etag(path: Path) -> str:
+    st = path.stat()
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    if key not in _etags:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        _etags[key] = h.hexdigest()
+    return _etags[key]
+
+def _vary(rv: Response) -> Response:
+    rv.vary.add("Accept-Encoding")
+    return rv
+
+def _send_path(path: Path, name: str) -> Response:
+    mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    gz = path.with_name(path.name + ".gz")
+    if gz.exists() and gz.stat().st_mtime >= path.stat().st_mtime and _accepts_gzip():
+        rv = send_file(gz, mimetype=mimetype, etag=_content_etag(gz) + "-gzip", max_age=_max_age(name),
+                       conditional=True)
+        rv.content_encoding = "gzip"
+        return _vary(rv)
+    rv = send_file(path, mimetype=mimetype, etag=_content_etag(path), max_age=_max_age(name), conditional=True)
+    return _vary(rv) if gz.exists() else rv
+
+def _respond(data, size: int, mimetype: str, etag: str, last_modified: float, max_age: int,
+             encoding: str = None) -> Response:
+    """A conditional, range-capable response over a seekable member stream (as werkzeug's send_file)."""
+    rv = Response(data, mimetype=mimetype, direct_passthrough=True)
+    rv.content_length = size
+    rv.last_modified = last_modified
+    rv.set_etag(etag)
+    if encoding:
+        rv.content_encoding = encoding
+    if max_age:
+        rv.cache_control.public = True
+        rv.cache_control.max_age = max_age
+    else:
+        rv.cache_control.no_cache = True
+    return _vary(rv).make_conditional(request.environ, accept_ranges=True, complete_length=size)
+
+def _gzip_member(archive: Path, info: zipfile.ZipInfo) -> bytes:
+    """A deflated member as a gzip file: its raw deflate stream between gzip header and trailer."""
+    with open(archive, "rb") as f:
+        f.seek(info.header_offset)
+        header = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+        f.seek(header[-2] + header[-1], os.SEEK_CUR)  # file name and extra field
+        deflated = f.read(info.compress_size)
+    return (b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x02\xff" + deflated
+            + struct.pack("<II", info.CRC, info.file_size & 0xFFFFFFFF))
+
+def _send_member(archive: Path, member: str, name: str) -> Response:
+    try:
+        zf = zipfile.ZipFile(archive)
+    except (OSError, zipfile.BadZipFile):
+        abort(404)
+    with zf:
+        try:
+            info = zf.getinfo(member)
+        except KeyError:
+            abort(404)
+        mimetype = mimetypes.guess_type(member)[0] or "application/octet-stream"
+        etag = f"{_content_etag(archive)[:16]}-{info.CRC:08x}-{info.file_size}"
+        last_modified = archive.stat().st_mtime
+        if info.compress_type == zipfile.ZIP_DEFLATED and _accepts_gzip():
+            body = _gzip_member(archive, info)
+            return _respond([body], len(body), mimetype, etag + "-gzip", last_modified, _max_age(name), "gzip")
+        stream = zf.open(info)  # keeps the archive open until the response closes it
+    return _respond(wrap_file(request.environ, stream), info.file_size, mimetype, etag, last_modified,
+                    _max_age(name))
+
+def serve_asset(name: str, root: Path = ASSETS_ROOT) -> Response:
+    path = safe_join(str(root), name)
+    if path is None:
+        abort(404)
+    path = Path(path)
+    if path.is_file():
+        return _send_path(path, name)
+    parts = name.split("/")
+    if ARCHIVE_NAME in parts[:-1]:  # .../all.zip/<member>
+        i = parts.index(ARCHIVE_NAME)
+        return _send_member(root.joinpath(*parts[:i + 1]), "/".join(parts[i + 1:]), name)
+    archive = path.parent / ARCHIVE_NAME
+    if archive.is_file():
+        return _send_member(archive, path.name, name)
+    abort(404)
+
+def precompress(root: Path = ASSETS_ROOT, min_bytes: int = PRECOMPRESS_MIN_BYTES) -> tuple:
+    """Write <file>.gz next to each text asset that is large enough and shrinks; returns (written, kept)."""
+    written = kept = 0
+    for path in sorted(root.rglob("*")):
+        if not (path.is_file() and path.suffix.lower() in PRECOMPRESS_SUFFIXES and path.stat().st_size >= min_bytes):
+            continue
+        gz = path.with_name(path.name + ".gz")
+        if gz.exists() and gz.stat().st_mtime >= path.stat().st_mtime:
+            kept += 1
+            continue
+        data = path.read_bytes()
+        packed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(packed) < 0.9 * len(data):
+            gz.write_bytes(packed)
+            written += 1
+        elif gz.exists():
+            gz.unlink()
+    return written, kept
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Precompress /assets text files for asset_server")
+    p.add_argument("--precompress", action="store_true", help="Write .gz variants under assets/")
+    p.add_argument("--min-bytes", type=int, default=PRECOMPRESS_MIN_BYTES, help="Smallest file to precompress")
+    args = p.parse_args()
+    if not args.precompress:
+        p.error("nothing to do (use --precompress)")
+    written, kept = precompress(min_bytes=args.min_bytes)
+    print(f"{written} .gz variants written, {kept} already current")
@@ -46,3 +46,9 @@ function sarvamCostInr(pages) {
 function googleCostUsd(billablePages) {
   return billablePages * OCR_PRICING.google.usdPerPage;
 }
+
+// Pages served from the server's OCR page cache are not sent to the provider,
+// so only the remainder is billed.
+function billableOcrPages(pages, cachedPages) {
+  return Math.max(0, pages - (cachedPages || 0));
+}
@@ -7,11 +7,28 @@ The third CER row in the comparison table ("misplaced material restored") is
 computed as a one-off: temporarily edit gcv_norm_ws.txt to restore the
 misplaced word on page 7 (निर्वृतो), rerun, record the numbers, then revert.
 
-Run from anywhere: python3 score_ocr.py [--verbose]
+Distances come from a pluggable engine (--engine, default myers), all exact
+and equal to the plain `levenshtein` DP:
+
+  myers   bit-parallel (Myers 1999 / Hyyrö 2001) over Python ints, O(n·m/w)
+  banded  Ukkonen band around the diagonal, widened until it provably holds the
+          optimum; NumPy rows, fast when the texts are nearly identical
+  numpy   full DP, one vectorized NumPy row at a time
+  dp      the reference pure-Python double loop
+
+--verbose prints the character diffs of each page. The alignment is computed in
+O(m log n) memory instead of the full n·m matrix and gives exactly the
+operations the matrix backtrace would. With --windowed, only the regions around
+differing lines are aligned (pages are anchored on identical lines first), which
+keeps full-book diffs fast; such a diff is exact within each region but may be
+a little longer than the optimum when a difference spans distant lines.
+
+Run from anywhere: python3 score_ocr.py [--verbose [--windowed]] [--engine myers|banded|numpy|dp]
 """
 
 import unicodedata
 import sys
+from difflib import SequenceMatcher
 from pathlib import Path
 import re
 
@@ -32,6 +49,8 @@ FILES_NORM_WS = {
 PAGE_RE = re.compile(r"^===\s*(\d+)\s*===\s*$")
 
 VERBOSE = "--verbose" in sys.argv
+ENGINE = sys.argv[sys.argv.index("--engine") + 1] if "--engine" in sys.argv else "myers"
+WINDOWED = "--windowed" in sys.argv
 
 
 def parse_pages(path):
@@ -70,6 +89,101 @@ def levenshtein(a, b):
 	return prev[-1]
 
 
+def levenshtein_myers(a, b):
+	"""Bit-parallel edit distance: each column of the DP is a pair of bit vectors of
+	vertical +1/-1 deltas, updated for one character of a with a few word-level ops."""
+	if len(a) < len(b):
+		a, b = b, a
+	m = len(b)
+	if m == 0:
+		return len(a)
+	peq = {}
+	for i, c in enumerate(b):
+		peq[c] = peq.get(c, 0) | (1 << i)
+	mask = (1 << m) - 1
+	last = 1 << (m - 1)
+	pv, mv, dist = mask, 0, m
+	for ca in a:
+		eq = peq.get(ca, 0)
+		xv = eq | mv
+		xh = ((((eq & pv) + pv) & mask) ^ pv) | eq
+		ph = (mv | ~(xh | pv)) & mask
+		mh = pv & xh
+		if ph & last:
+			dist += 1
+		elif mh & last:
+			dist -= 1
+		# global distance: the top row grows by one per column, so shift in a +1
+		ph = ((ph << 1) | 1) & mask
+		mh = (mh << 1) & mask
+		pv = (mh | ~(xv | ph)) & mask
+		mv = ph & xv
+	return dist
+
+
+def _codes(s):
+	import numpy as np
+	return np.frombuffer(s.encode("utf-32-le"), dtype=np.uint32)
+
+
+def levenshtein_numpy(a, b):
+	"""Row-by-row DP: deletions and substitutions are elementwise; insertions
+	(the left-to-right dependency) become a running minimum of row[j] - j."""
+	import numpy as np
+	if len(a) < len(b):
+		a, b = b, a
+	m = len(b)
+	if m == 0:
+		return len(a)
+	bc, cols = _codes(b), np.arange(m + 1)
+	prev = cols.copy()
+	for i, ca in enumerate(_codes(a), 1):
+		row = np.empty(m + 1, dtype=prev.dtype)
+		row[0] = i
+		np.minimum(prev[1:] + 1, prev[:-1] + (bc != ca), out=row[1:])
+		prev = np.minimum.accumulate(row - cols) + cols
+	return int(prev[-1])
+
+
+def levenshtein_banded(a, b, band=64):
+	"""Distance restricted to |i - j| <= k. An alignment of cost d never leaves the band
+	of width d, so a result <= k is exact; otherwise the result is still the cost of a
+	real alignment, an upper bound on d, and one more pass with k = that bound is exact."""
+	import numpy as np
+	if len(a) < len(b):
+		a, b = b, a
+	n, m = len(a), len(b)
+	if m == 0:
+		return n
+	ac, bc, cols = _codes(a), _codes(b), np.arange(m + 1)
+	big = n + m + 1
+	k = max(band, n - m)
+	while True:
+		prev = np.where(cols <= k, cols, big)
+		for i in range(1, n + 1):
+			lo, hi = max(0, i - k), min(m, i + k)
+			if lo > hi:
+				break
+			row = prev[lo:hi + 1] + 1
+			s = max(lo, 1)
+			np.minimum(row[s - lo:], prev[s - 1:hi] + (bc[s - 1:hi] != ac[i - 1]), out=row[s - lo:])
+			if lo == 0:
+				row[0] = i
+			prev[lo:hi + 1] = np.minimum.accumulate(row - cols[lo:hi + 1]) + cols[lo:hi + 1]
+		dist = int(prev[m])
+		if dist <= k:
+			return dist
+		k = dist
+
+
+ENGINES = {
+	"myers": levenshtein_myers,
+	"banded": levenshtein_banded,
+	"numpy": levenshtein_numpy,
+	"dp": levenshtein,
+}
+
+
 def backtrace(a, b, dp):
 	i, j = len(a), len(b)
 	ops = []
@@ -87,6 +201,96 @@ def backtrace(a, b, dp):
 	return ops
 
 
+def _next_row(prev, i, ca, bc, cols):
+	"""DP row i from row i - 1, over the columns prev covers (NumPy, as in levenshtein_numpy)."""
+	import numpy as np
+	width = len(prev) - 1
+	row = np.empty_like(prev)
+	row[0] = i
+	np.minimum(prev[1:] + 1, prev[:-1] + (bc[:width] != ca), out=row[1:])
+	return np.minimum.accumulate(row - cols[:width + 1]) + cols[:width + 1]
+
+
+def align(a, b, block=64):
+	"""backtrace(a, b, levenshtein_matrix(a, b)) without the matrix.
+
+	The backtrace walks up from (len(a), len(b)) and each of its steps depends only on
+	DP cells above and left of it. So, Hirschberg-style, the rows are split in half:
+	the lower half is walked first from a recomputed middle row, then the upper half
+	from the column where the walk crossed it. Only one row per level of recursion
+	is kept (O(m log n)), blocks of `block` rows are walked directly, and each row
+	is cut to the columns left of the walk.
+	"""
+	import numpy as np
+	ac, bc = _codes(a), _codes(b)
+	cols = np.arange(len(b) + 1)
+	ops = []  # built from the end, like backtrace
+
+	def walk(top, lo, hi, j):
+		# top: DP row lo (columns 0..j); walk up from (hi, j) to row lo, return the column there
+		if hi - lo > block:
+			mid = (lo + hi) // 2
+			row = top[:j + 1]
+			for i in range(lo + 1, mid + 1):
+				row = _next_row(row, i, ac[i - 1], bc, cols)
+			return walk(top, lo, mid, walk(row, mid, hi, j))
+		rows = [top[:j + 1]]
+		for i in range(lo + 1, hi + 1):
+			rows.append(_next_row(rows[-1], i, ac[i - 1], bc, cols))
+		i = hi
+		while i > lo or (lo == 0 and j > 0):
+			cur = rows[i - lo]
+			if i > lo and j > 0 and cur[j] == rows[i - lo - 1][j - 1] + (a[i - 1] != b[j - 1]):
+				ops.append(("match" if a[i - 1] == b[j - 1] else "sub", a[i - 1], b[j - 1]))
+				i -= 1; j -= 1
+			elif i > lo and cur[j] == rows[i - lo - 1][j] + 1:
+				ops.append(("del", a[i - 1], ""))
+				i -= 1
+			else:
+				ops.append(("ins", "", b[j - 1]))
+				j -= 1
+		return j
+
+	walk(cols, 0, len(a), len(b))
+	ops.reverse()
+	return ops
+
+
+def _line_offsets(lines):
+	offsets = [0]
+	for line in lines:
+		offsets.append(offsets[-1] + len(line))
+	return offsets
+
+
+def align_windowed(a, b, context=1):
+	"""Align only around mismatches: anchor on identical lines (difflib), then run align()
+	on each differing stretch plus `context` lines either side, merging overlaps."""
+	la, lb = re.split(r"(?<=\n)", a), re.split(r"(?<=\n)", b)
+	oa, ob = _line_offsets(la), _line_offsets(lb)
+	opcodes = SequenceMatcher(None, la, lb, autojunk=False).get_opcodes()
+	regions = []
+	for k, (tag, i1, i2, j1, j2) in enumerate(opcodes):
+		if tag == "equal":
+			continue
+		# grow into the neighbouring equal runs (which map line to line, so both sides move alike)
+		before = min(context, opcodes[k - 1][2] - opcodes[k - 1][1]) if k > 0 else 0
+		after = min(context, opcodes[k + 1][2] - opcodes[k + 1][1]) if k + 1 < len(opcodes) else 0
+		region = [i1 - before, i2 + after, j1 - before, j2 + after]
+		if regions and region[0] <= regions[-1][1]:
+			regions[-1][1], regions[-1][3] = region[1], region[3]
+		else:
+			regions.append(region)
+
+	ops, pos_a = [], 0
+	for i1, i2, j1, j2 in regions:
+		ops.extend(("match", c, c) for c in a[pos_a:oa[i1]])
+		ops.extend(align(a[oa[i1]:oa[i2]], b[ob[j1]:ob[j2]]))
+		pos_a = oa[i2]
+	ops.extend(("match", c, c) for c in a[pos_a:])
+	return ops
+
+
 def show_char(c):
 	if c == "\n": return "\\n"
 	if c == " ":  return "\\s"
@@ -95,8 +299,7 @@ def show_char(c):
 
 
 def print_diff(a, b, page, provider):
-	dp = levenshtein_matrix(a, b)
-	ops = backtrace(a, b, dp)
+	ops = align_windowed(a, b) if WINDOWED else align(a, b)
 	errors = [(op, ca, cb) for op, ca, cb in ops if op != "match"]
 	print(f"  --- diffs page {page} ({provider}) ---")
 	for op, ca, cb in errors:
@@ -109,6 +312,7 @@ def print_diff(a, b, page, provider):
 
 
 def score(pages, label):
+	distance = ENGINES[ENGINE]
 	page_nums = sorted(pages["truth"].keys())
 	print(f"\n===== {label} =====")
 	for provider in ("gcv", "sarvam"):
@@ -116,7 +320,7 @@ def score(pages, label):
 		tot_dist = tot_len = 0
 		for p in page_nums:
 			t, o = pages["truth"][p], pages[provider][p]
-			dist = levenshtein(t, o)
+			dist = distance(t, o)
 			tot_dist += dist
 			tot_len += len(t)
 			print(f"  page {p}: {len(t)} chars, dist {dist}, CER {dist/len(t):.4f}")
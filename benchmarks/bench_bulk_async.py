@@ -0,0 +1,110 @@
+"""Throughput benchmark: bulk_vision_runner --mode async vs --mode thread.
+
+Runs bulk_vision_runner.main() over a tree of small synthetic PDFs with the
+Google provider replaced by a local fake that just waits (time.sleep in
+thread mode, asyncio.sleep in async mode), so the run is pure provider
+latency, as with real Vision operations. For each mode and --workers value
+it reports wall time, files/s and the peak number of live threads.
+
+No network or API key is needed.
+
+Run from the repo root:
+  python benchmarks/bench_bulk_async.py [--files 2000] [--latency 1.0] [--workers 64,512,2000]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+os.environ.setdefault("TQDM_DISABLE", "1")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pypdf import PdfWriter
+
+import bulk_vision_runner
+
+
+def make_tree(root: Path, files: int):
+	writer = PdfWriter()
+	writer.add_blank_page(width=612, height=792)
+	sample = root / "sample.pdf"
+	with open(sample, "wb") as fh:
+		writer.write(fh)
+	data = sample.read_bytes()
+	sample.unlink()
+	for i in range(files):
+		sub = root / f"d{i // 500:03d}"
+		sub.mkdir(exist_ok=True)
+		(sub / f"f{i:05d}.pdf").write_bytes(data)
+
+
+def install_fakes(latency: float):
+	def fake_google_ocr(pdf_path, api_key=None, include_page_numbers=True):
+		time.sleep(latency)
+		return "fake OCR text", 1, 0
+
+	async def fake_google_ocr_batch_async(pdf_paths, api_key=None, include_page_numbers=True):
+		await asyncio.sleep(latency)
+		return [("fake OCR text", 1, 0) for _ in pdf_paths]
+
+	bulk_vision_runner.run_google_ocr = fake_google_ocr
+	bulk_vision_runner.run_google_ocr_batch_async = fake_google_ocr_batch_async
+
+
+def run_once(root: Path, work: Path, mode: str, workers: int):
+	out_dir = work / f"out-{mode}-{workers}"
+	sys.argv = [
+		"bulk_vision_runner.py", "--root", str(root), "--out-dir", str(out_dir),
+		"--mode", mode, "--workers", str(workers), "--initial-workers", str(workers),
+		"--manifest", str(work / f"run-{mode}-{workers}.sqlite3"), "--log-csv", str(work / f"run-{mode}-{workers}.csv"),
+		"--page-manifest", str(work / "pages.json"), "--count-workers", "1",
+	]
+	peak = threading.active_count()
+	done = threading.Event()
+
+	def sample_threads():
+		nonlocal peak
+		while not done.wait(0.05):
+			peak = max(peak, threading.active_count())
+
+	sampler = threading.Thread(target=sample_threads, daemon=True)
+	sampler.start()
+	t0 = time.perf_counter()
+	bulk_vision_runner.main()
+	wall = time.perf_counter() - t0
+	done.set()
+	sampler.join()
+	written = sum(1 for _ in out_dir.rglob("*.txt"))
+	return wall, written, peak
+
+
+def main():
+	ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	ap.add_argument("--files", type=int, default=2000, help="number of one-page PDFs")
+	ap.add_argument("--latency", type=float, default=1.0, help="fake provider seconds per file")
+	ap.add_argument("--workers", default="64,512,2000", help="comma-separated --workers values")
+	ap.add_argument("--modes", default="thread,async", help="comma-separated modes")
+	args = ap.parse_args()
+
+	logging.basicConfig(level=logging.WARNING)
+	install_fakes(args.latency)
+	with tempfile.TemporaryDirectory() as tmp:
+		root, work = Path(tmp) / "pdfs", Path(tmp) / "work"
+		root.mkdir()
+		work.mkdir()
+		make_tree(root, args.files)
+		print(f"{args.files} files, {args.latency:g} s fake latency per file")
+		for workers in (int(w) for w in args.workers.split(",")):
+			for mode in args.modes.split(","):
+				wall, written, peak = run_once(root, work, mode, workers)
+				print(f"  {mode:6} workers={workers:5}   {wall:7.2f} s   {written / wall:8.1f} files/s   "
+					f"peak threads {peak:5}   ({written} written)")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,101 @@
+"""Throughput of /api/identify-meter and /api/scan with and without request coalescing.
+
+Boots the app under gunicorn (gthread) once per API_COALESCE_MS value, the
+first normally 0 (coalescing off), and drives it from N closed-loop clients
+that each post one verse per request, alternating between the two endpoints.
+Verses are drawn from --distinct GRETIL verses with Zipf weights (--zipf),
+so some are requested far more often than others, as with the example
+verses and famous passages. 0 draws every verse with the same weight.
+
+For every coalescing window and client count it reports requests/s,
+p50/p99 latency per endpoint, and the speedup over the first window, and
+optionally writes them as JSON. Reuses loadtest_api's server and client
+loop. No network is needed.
+
+Run from the repo root:
+  python benchmarks/bench_coalesce.py [--coalesce-ms 0,2,5] [--max-batch 32] [--configs 4x4,1x16]
+      [--clients 16,64] [--secs 15] [--distinct 500] [--zipf 1.1] [--json bench_coalesce.json]
+"""
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from loadtest_api import GRETIL_DIR, GRETIL_TEXTS, SCAN_FLAGS, free_port, run, start_server
+
+
+def load_verses(distinct, seed):
+	rng = random.Random(seed)
+	verses = []
+	for name in GRETIL_TEXTS:
+		verses.extend(l for l in (GRETIL_DIR / f"{name}_input_cleaned.txt").read_text(encoding="utf-8").splitlines() if l.strip())
+	return rng.sample(verses, min(distinct, len(verses)))
+
+
+def make_requests(verses, zipf):
+	"""endpoint -> function(rng) returning requests.post kwargs."""
+	weights = [1 / (rank + 1) ** zipf for rank in range(len(verses))]
+
+	def pick(rng):
+		return rng.choices(verses, weights=weights)[0]
+
+	def identify_meter(rng):
+		return {"url": "/api/identify-meter", "data": {"input_text": pick(rng), "from_scheme": "IAST",
+			"resplit_option": "resplit_lite_keep_mid", **SCAN_FLAGS}}
+
+	def scan(rng):
+		return {"url": "/api/scan", "data": {"input_text": pick(rng), "from_scheme": "IAST", **SCAN_FLAGS}}
+
+	return {"identify-meter": identify_meter, "scan": scan}
+
+
+def main():
+	ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	ap.add_argument("--coalesce-ms", default="0,2,5", help="comma-separated API_COALESCE_MS values (0 = off)")
+	ap.add_argument("--max-batch", type=int, default=32, help="API_COALESCE_MAX_BATCH")
+	ap.add_argument("--configs", default="4x4", help="comma-separated WORKERSxTHREADS gunicorn configs")
+	ap.add_argument("--clients", default="16,64", help="comma-separated concurrent client counts")
+	ap.add_argument("--secs", type=float, default=15, help="measured seconds per run")
+	ap.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before each run")
+	ap.add_argument("--distinct", type=int, default=500, help="distinct verses in the workload")
+	ap.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of verse popularity (0 = uniform)")
+	ap.add_argument("--json", type=Path, default=None, help="also write the results here")
+	args = ap.parse_args()
+
+	builders = make_requests(load_verses(args.distinct, seed=0), args.zipf)
+	weights = {name: 1 for name in builders}
+
+	results = []
+	for config in args.configs.split(","):
+		workers, threads = (int(x) for x in config.lower().split("x"))
+		baseline = {}
+		for window in args.coalesce_ms.split(","):
+			env = {"API_COALESCE_MS": window, "API_COALESCE_MAX_BATCH": str(args.max_batch)}
+			proc, base = start_server(free_port(), workers, threads, 0, extra_env=env)
+			try:
+				for clients in (int(c) for c in args.clients.split(",")):
+					per_endpoint, rps = run(base, builders, weights, clients, args.secs, args.warmup)
+					baseline.setdefault(clients, rps)
+					speedup = rps / baseline[clients] if baseline[clients] else None
+					results.append({"workers": workers, "threads": threads, "coalesce_ms": float(window),
+						"clients": clients, "rps": round(rps, 2), "speedup": speedup and round(speedup, 2),
+						"endpoints": per_endpoint})
+					print(f"{workers}x{threads}  coalesce {float(window):5.1f} ms  {clients:4} clients: "
+						f"{rps:8.1f} req/s  x{speedup or 0:.2f}", end="")
+					for name, r in per_endpoint.items():
+						print(f"   {name} p50 {r['p50_ms']:.1f} p99 {r['p99_ms']:.1f} ms err {r['errors']}", end="")
+					print()
+			finally:
+				proc.terminate()
+				proc.wait()
+
+	if args.json:
+		args.json.write_text(json.dumps({"max_batch": args.max_batch, "distinct": args.distinct, "zipf": args.zipf,
+			"secs": args.secs, "runs": results}, indent=1), encoding="utf-8")
+		print(f"\nresults: {args.json}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,241 @@
+"""Accuracy and throughput benchmark of meter identification over the GRETIL corpus.
+
+Feeds each assets/meter_analyses/2_input_cleaned/<text>_input_cleaned.txt
+through flask_app.run_identify_meter_batch, one line per verse as the web
+upload does, and compares the labels with the recorded
+4_output_cleaned/<text>_output_cleaned.txt ("<id>\\t<label>" per verse).
+
+Two modes, each in its own child process so peak RSS is per mode:
+
+  serial    SKRUTABLE_NO_PARALLEL=1, one verse per call, so per-verse
+            latency (p50/p99) is measured
+  parallel  one batch per text through the meter pool (meter_pool.py), as
+            large web uploads are, or with METER_POOL=0 through
+            identify_meter_batch's own process pool; throughput only. The
+            meter pool server is a fresh one in a temporary METER_POOL_DIR,
+            so it starts cold and never shares a warm host-wide server; its
+            peak RSS and its processes' are read from /proc (VmHWM) before
+            it is stopped at the end of the run.
+
+Labels are compared exactly and by meter name (the label up to its first
+space or bracket), and the verses whose meter name changed are listed, so
+both performance and accuracy regressions show up between backend versions.
+
+Run from the repo root:
+  python benchmarks/bench_meter_corpus.py [--texts BhG,MgD] [--modes serial,parallel] [--out meter_benchmark.json]
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+CORPUS = REPO_ROOT / "assets" / "meter_analyses"
+INPUT_DIR, OUTPUT_DIR = CORPUS / "2_input_cleaned", CORPUS / "4_output_cleaned"
+
+
+def corpus_texts():
+	"""Names with both a cleaned input and a recorded output."""
+	names = [p.name[:-len("_input_cleaned.txt")] for p in sorted(INPUT_DIR.glob("*_input_cleaned.txt"))]
+	return [n for n in names if (OUTPUT_DIR / f"{n}_output_cleaned.txt").exists()]
+
+
+def load_text(name):
+	verses = INPUT_DIR.joinpath(f"{name}_input_cleaned.txt").read_text(encoding="utf-8").splitlines()
+	recorded = []
+	for line in OUTPUT_DIR.joinpath(f"{name}_output_cleaned.txt").read_text(encoding="utf-8").splitlines():
+		if "\t" in line:
+			verse_id, label = line.split("\t", 1)
+			recorded.append((verse_id, label))
+	return verses, recorded
+
+
+def meter_name(label):
+	return re.split(r"[\s(\[]", label.strip(), maxsplit=1)[0]
+
+
+def percentile(sorted_values, q):
+	return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def vm_hwm_mb(pid):
+	"""Peak RSS of a process from /proc/<pid>/status, in MB (0 if it is gone)."""
+	try:
+		for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+			if line.startswith("VmHWM:"):
+				return int(line.split()[1]) / 1024
+	except OSError:
+		pass
+	return 0.0
+
+
+def child_pids(pid):
+	children = []
+	for stat in Path("/proc").glob("[0-9]*/stat"):
+		try:
+			fields = stat.read_text().rsplit(")", 1)[1].split()
+		except OSError:
+			continue
+		if int(fields[1]) == pid:
+			children.append(int(stat.parent.name))
+	return children
+
+
+def stop_pool_server(meter_pool):
+	"""Peak RSS (MB) of the benchmark's own pool server and of its largest process, then stop them."""
+	state = meter_pool.stats()
+	if not state:
+		return 0.0, 0.0
+	server, workers = state["pid"], child_pids(state["pid"])
+	server_mb, worker_mb = vm_hwm_mb(server), max([vm_hwm_mb(pid) for pid in workers] + [0.0])
+	for pid in workers + [server]:
+		try:
+			os.kill(pid, signal.SIGTERM)
+		except ProcessLookupError:
+			pass
+	return server_mb, worker_mb
+
+
+def run_mode(mode, texts, resplit_option, max_diffs):
+	"""Child process body: identify every text in one mode, return its results."""
+	pool_dir = None
+	if mode == "serial":
+		os.environ["SKRUTABLE_NO_PARALLEL"] = "1"
+		os.environ["TQDM_DISABLE"] = "1"  # run_identify_meter_batch would draw a bar per verse
+	elif os.environ.get("METER_POOL", "1") != "0":
+		# a private, cold pool server that this run stops (a host-wide one may be warm or busy)
+		pool_dir = tempfile.mkdtemp(prefix="bench_meter_pool_")
+		os.environ["METER_POOL_DIR"] = pool_dir
+	sys.path.insert(0, str(REPO_ROOT))
+	import flask_app
+
+	r_o, r_k_m = flask_app.parse_complex_resplit_option(resplit_option)
+	results = {}
+	all_latencies = []
+	for name in texts:
+		verses, recorded = load_text(name)
+		latencies = []
+		t0 = time.perf_counter()
+		if mode == "serial":
+			verse_objects = []
+			for verse in verses:
+				vs, secs, _ = flask_app.run_identify_meter_batch([verse], r_o, r_k_m, "IAST")
+				verse_objects.extend(vs)
+				latencies.append(secs)
+		else:
+			verse_objects, _, _ = flask_app.run_identify_meter_batch(verses, r_o, r_k_m, "IAST")
+		wall = time.perf_counter() - t0
+
+		exact = same_meter = 0
+		diffs = []
+		for V, (verse_id, label) in zip(verse_objects, recorded):
+			exact += V.meter_label == label
+			if meter_name(V.meter_label) == meter_name(label):
+				same_meter += 1
+			elif len(diffs) < max_diffs:
+				diffs.append({"id": verse_id, "recorded": label, "now": V.meter_label})
+		compared = min(len(verse_objects), len(recorded))
+		entry = {
+			"verses": len(verses),
+			"compared": compared,
+			"secs": round(wall, 3),
+			"verses_per_sec": round(len(verses) / wall, 1) if wall else None,
+			"exact_agreement": round(exact / compared, 4) if compared else None,
+			"meter_agreement": round(same_meter / compared, 4) if compared else None,
+			"meter_changed": compared - same_meter,
+			"diffs": diffs,
+		}
+		if latencies:
+			all_latencies.extend(latencies)
+			latencies.sort()
+			entry["p50_ms"] = round(statistics.median(latencies) * 1000, 3)
+			entry["p99_ms"] = round(percentile(latencies, 0.99) * 1000, 3)
+		results[name] = entry
+		print(f"  {mode:8} {name:10} {len(verses):6} verses  {entry['verses_per_sec'] or 0:8.1f} v/s  "
+			f"meter agreement {entry['meter_agreement']}", file=sys.stderr)
+
+	rss_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+	rss_server, rss_worker = 0.0, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+	if pool_dir:
+		import meter_pool
+		rss_server, rss_worker = stop_pool_server(meter_pool)
+		shutil.rmtree(pool_dir, ignore_errors=True)
+	total_verses = sum(r["verses"] for r in results.values())
+	total_secs = sum(r["secs"] for r in results.values())
+	all_latencies.sort()
+	return {
+		"texts": results,
+		"verses": total_verses,
+		"secs": round(total_secs, 3),
+		"verses_per_sec": round(total_verses / total_secs, 1) if total_secs else None,
+		"meter_changed": sum(r["meter_changed"] for r in results.values()),
+		"p50_ms": round(statistics.median(all_latencies) * 1000, 3) if all_latencies else None,
+		"p99_ms": round(percentile(all_latencies, 0.99) * 1000, 3) if all_latencies else None,
+		"peak_rss_mb": round(rss_self, 1),
+		"peak_rss_pool_server_mb": round(rss_server, 1),
+		"peak_rss_pool_worker_mb": round(rss_worker, 1),
+	}
+
+
+def main():
+	ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	ap.add_argument("--texts", default=None, help="comma-separated text names (default: all with recorded output)")
+	ap.add_argument("--modes", default="serial,parallel", help="comma-separated: serial, parallel")
+	ap.add_argument("--resplit", default="resplit_lite_keep_mid", help="resplit option, as in the web form")
+	ap.add_argument("--max-diffs", type=int, default=50, help="changed-meter verses listed per text")
+	ap.add_argument("--out", type=Path, default=Path("meter_benchmark.json"), help="JSON report path")
+	ap.add_argument("--child", default=None, help=argparse.SUPPRESS)  # mode:result_path, internal
+	args = ap.parse_args()
+
+	texts = args.texts.split(",") if args.texts else corpus_texts()
+
+	if args.child:
+		mode, result_path = args.child.split(":", 1)
+		result = run_mode(mode, texts, args.resplit, args.max_diffs)
+		Path(result_path).write_text(json.dumps(result, ensure_ascii=False), encoding="utf-8")
+		return
+
+	from skrutable import __version__ as backend_version
+
+	report = {
+		"created": datetime.now().isoformat(timespec="seconds"),
+		"backend_version": backend_version,
+		"front_end_version": (REPO_ROOT / "VERSION").read_text().strip(),
+		"python": platform.python_version(),
+		"cpu_count": os.cpu_count(),
+		"resplit_option": args.resplit,
+		"modes": {},
+	}
+	for mode in args.modes.split(","):
+		with tempfile.NamedTemporaryFile(suffix=".json") as tmp:
+			cmd = [sys.executable, __file__, "--modes", mode, "--resplit", args.resplit,
+				"--max-diffs", str(args.max_diffs), "--child", f"{mode}:{tmp.name}"]
+			if args.texts:
+				cmd += ["--texts", args.texts]
+			subprocess.run(cmd, check=True, cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+			report["modes"][mode] = json.loads(Path(tmp.name).read_text(encoding="utf-8"))
+	args.out.write_text(json.dumps(report, ensure_ascii=False, indent=1), encoding="utf-8")
+
+	print(f"skrutable {backend_version}, {len(texts)} texts")
+	for mode, r in report["modes"].items():
+		serial_lat = f"   per-verse p50 {r['p50_ms']:.2f} ms, p99 {r['p99_ms']:.2f} ms" if r["p50_ms"] is not None else ""
+		print(f"  {mode:8} {r['verses']} verses in {r['secs']:.1f} s = {r['verses_per_sec']} v/s   "
+			f"peak RSS {r['peak_rss_mb']} MB (+{r['peak_rss_pool_server_mb']} MB pool server, "
+			f"{r['peak_rss_pool_worker_mb']} MB largest pool worker)   "
+			f"{r['meter_changed']} meter labels changed{serial_lat}")
+	print(f"report: {args.out}")
+
+
+if __name__ == "__main__":
+	main()
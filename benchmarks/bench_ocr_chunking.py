@@ -0,0 +1,139 @@
+"""Memory and latency benchmark for Sarvam OCR chunk building.
+
+Compares the old approach (PdfReader over the whole file, a PdfWriter per
+10-page chunk written to a temp file that is then read back for upload) with
+ocr_service's lazy, in-memory, one-chunk-ahead builder, on a large synthetic
+scan-like PDF. The upload + Sarvam wait per chunk is simulated with a sleep
+so the overlap from building the next chunk ahead shows up in wall time.
+
+No network or API key is needed.
+
+Run from the repo root:
+  python benchmarks/bench_ocr_chunking.py [--pages 600] [--kb-per-page 150] [--upload-secs 0.2]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("OCR_CACHE_MAX_MB", "0")  # measure chunking alone, not cache hashing
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+
+import ocr_service
+
+
+def make_synthetic_pdf(path: Path, pages: int, kb_per_page: int):
+	"""Write a PDF whose pages each carry a distinct incompressible grayscale image, like a scan."""
+	side = int((kb_per_page * 1024) ** 0.5)
+	writer = PdfWriter()
+	for i in range(pages):
+		page = writer.add_blank_page(width=612, height=792)
+		img = DecodedStreamObject()
+		img.set_data(os.urandom(side * side))
+		img.update({
+			NameObject("/Type"): NameObject("/XObject"),
+			NameObject("/Subtype"): NameObject("/Image"),
+			NameObject("/Width"): NumberObject(side),
+			NameObject("/Height"): NumberObject(side),
+			NameObject("/ColorSpace"): NameObject("/DeviceGray"),
+			NameObject("/BitsPerComponent"): NumberObject(8),
+		})
+		img_ref = writer._add_object(img)
+		page[NameObject("/Resources")] = DictionaryObject({
+			NameObject("/XObject"): DictionaryObject({NameObject("/Im0"): img_ref}),
+		})
+		content = DecodedStreamObject()
+		content.set_data(b"q 612 0 0 792 0 0 cm /Im0 Do Q")
+		page[NameObject("/Contents")] = writer._add_object(content)
+	with open(path, "wb") as f:
+		writer.write(f)
+
+
+def legacy_chunks(pdf_path: Path, chunk_dir: Path, upload_secs: float):
+	"""The pre-change stream_sarvam_ocr chunk loop, with the SDK's read-back of the temp file."""
+	stats = {"disk_bytes": 0}
+	reader = PdfReader(str(pdf_path))
+	total_pages = len(reader.pages)
+	for chunk_start in range(0, total_pages, ocr_service.SARVAM_PAGE_LIMIT):
+		chunk_end = min(chunk_start + ocr_service.SARVAM_PAGE_LIMIT, total_pages)
+		writer = PdfWriter()
+		for p in range(chunk_start, chunk_end):
+			writer.add_page(reader.pages[p])
+		chunk_path = chunk_dir / f"chunk_{chunk_start}.pdf"
+		with open(chunk_path, "wb") as f:
+			writer.write(f)
+		with open(chunk_path, "rb") as f:  # job.upload_file reads it back
+			data = f.read()
+		stats["disk_bytes"] += 2 * len(data)
+		time.sleep(upload_secs)
+	return stats
+
+
+def lazy_chunks(pdf_path: Path, upload_secs: float):
+	"""The in-memory builder used by stream_sarvam_ocr, one chunk ahead of the (simulated) upload."""
+	with open(pdf_path, "rb") as fh:
+		total_pages = len(PdfReader(fh).pages)
+	plans = ocr_service._plan_sarvam_chunks(pdf_path, total_pages, ocr_service._sarvam_cache_options(True))
+	for plan in ocr_service._one_ahead(plans):
+		assert plan.pdf_bytes
+		time.sleep(upload_secs)
+	return {"disk_bytes": 0}
+
+
+def run_variant(variant: str, pdf_path: Path, upload_secs: float):
+	"""Child-process entry point: run one variant and print wall time, peak RSS and temp-file I/O."""
+	t0 = time.perf_counter()
+	if variant == "legacy":
+		with tempfile.TemporaryDirectory() as chunk_dir:
+			stats = legacy_chunks(pdf_path, Path(chunk_dir), upload_secs)
+	else:
+		stats = lazy_chunks(pdf_path, upload_secs)
+	elapsed = time.perf_counter() - t0
+	peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+	print(f"{elapsed} {peak_rss_mb} {stats['disk_bytes']}")
+
+
+def measure(label, pdf_path: Path, upload_secs: float):
+	"""Run a variant in a fresh interpreter so peak RSS isn't polluted by the other one."""
+	out = subprocess.run(
+		[sys.executable, __file__, "--variant", label, "--pdf", str(pdf_path), "--upload-secs", str(upload_secs)],
+		capture_output=True, text=True, check=True,
+	).stdout.split()
+	elapsed, peak_rss_mb, disk_bytes = float(out[0]), float(out[1]), int(out[2])
+	print(f"  {label:8} wall {elapsed:7.2f} s   peak RSS {peak_rss_mb:8.1f} MB   temp-file I/O {disk_bytes / 2**20:8.1f} MB")
+	return elapsed, peak_rss_mb
+
+
+def main():
+	ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	ap.add_argument("--pages", type=int, default=600)
+	ap.add_argument("--kb-per-page", type=int, default=150)
+	ap.add_argument("--upload-secs", type=float, default=0.2, help="simulated upload + OCR time per chunk")
+	ap.add_argument("--variant", choices=("legacy", "lazy"), help=argparse.SUPPRESS)
+	ap.add_argument("--pdf", type=Path, help=argparse.SUPPRESS)
+	args = ap.parse_args()
+
+	if args.variant:
+		run_variant(args.variant, args.pdf, args.upload_secs)
+		return
+
+	with tempfile.TemporaryDirectory() as td:
+		pdf_path = Path(td) / "synthetic.pdf"
+		t0 = time.perf_counter()
+		make_synthetic_pdf(pdf_path, args.pages, args.kb_per_page)
+		print(f"synthetic PDF: {args.pages} pages, {pdf_path.stat().st_size / 2**20:.1f} MB (built in {time.perf_counter() - t0:.1f} s)")
+
+		old_t, old_peak = measure("legacy", pdf_path, args.upload_secs)
+		new_t, new_peak = measure("lazy", pdf_path, args.upload_secs)
+		print(f"  speedup {old_t / new_t:.2f}x, peak RSS {new_peak / old_peak:.0%} of legacy")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,147 @@
+"""OCR quality benchmark over a corpus of ground-truth / provider output sets.
+
+Generalizes assets/ocr_comparison/score_ocr.py from one hard-coded document to
+any number of them. A document is any directory under --root holding
+ground truth and provider outputs named like the ones in assets/ocr_comparison:
+
+  gt_<level>.txt           ground truth at a normalization level
+                           (gt_norm.txt also serves norm_dandas, norm_ws, ...)
+  <provider>_<level>.txt   OCR output, e.g. gcv_raw.txt, sarvam_norm_ws.txt
+
+with levels raw, norm, norm_<suffix>, and pages marked "=== n ===". Each page
+of each (document, level, provider) is scored as its own job on a process
+pool with a score_ocr distance engine, longest pages first; a page missing
+from a provider's output counts as entirely deleted.
+
+The JSON report (--out) holds CER per page, per document/level/provider and
+per level/provider over the corpus, plus wall time and throughput, so runs
+can be compared across provider updates.
+
+Run from the repo root:
+  python benchmarks/bench_ocr_corpus.py [--root assets/ocr_comparison] [--out ocr_benchmark.json] [--engine myers] [--workers N]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "assets" / "ocr_comparison"))
+
+import score_ocr
+
+OUTPUT_RE = re.compile(r"^([A-Za-z0-9-]+)_(raw|norm(?:_[A-Za-z0-9]+)?)\.txt$")
+
+
+def truth_file(doc_dir, level):
+	"""gt_<level>.txt, else the closest shorter level (gt_norm.txt for norm_ws)."""
+	parts = level.split("_")
+	for n in range(len(parts), 0, -1):
+		path = doc_dir / f"gt_{'_'.join(parts[:n])}.txt"
+		if path.exists():
+			return path
+	return None
+
+
+def discover(root):
+	"""[(document, level, provider, truth_path, output_path)] for every set under root."""
+	sets = []
+	for doc_dir in sorted({p.parent for p in root.rglob("gt_*.txt")}):
+		doc = doc_dir.relative_to(root).as_posix() or "."
+		for path in sorted(doc_dir.glob("*.txt")):
+			m = OUTPUT_RE.match(path.name)
+			if not m or m.group(1) == "gt":
+				continue
+			provider, level = m.groups()
+			truth = truth_file(doc_dir, level)
+			if truth is not None:
+				sets.append((doc, level, provider, truth, path))
+	return sets
+
+
+def score_page(engine, truth, ocr):
+	"""Distance of one page; runs in a pool process."""
+	t0 = time.perf_counter()
+	dist = score_ocr.ENGINES[engine](truth, ocr)
+	return dist, time.perf_counter() - t0
+
+
+def total(pages):
+	dist = sum(p["dist"] for p in pages)
+	chars = sum(p["chars"] for p in pages)
+	return {"pages": len(pages), "chars": chars, "dist": dist, "cer": dist / chars if chars else 0.0}
+
+
+def main():
+	ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	ap.add_argument("--root", type=Path, default=REPO_ROOT / "assets" / "ocr_comparison", help="corpus root")
+	ap.add_argument("--out", type=Path, default=Path("ocr_benchmark.json"), help="JSON report path")
+	ap.add_argument("--engine", choices=sorted(score_ocr.ENGINES), default="myers", help="distance engine")
+	ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scoring processes")
+	args = ap.parse_args()
+
+	sets = discover(args.root)
+	if not sets:
+		sys.exit(f"no ground-truth/provider sets found under {args.root}")
+
+	t0 = time.perf_counter()
+	jobs = []  # (doc, level, provider, page, truth text, ocr text or None)
+	for doc, level, provider, truth_path, output_path in sets:
+		truth, ocr = score_ocr.parse_pages(truth_path), score_ocr.parse_pages(output_path)
+		jobs.extend((doc, level, provider, p, truth[p], ocr.get(p)) for p in sorted(truth))
+	# longest pages first so the pool's tail is short
+	jobs.sort(key=lambda j: len(j[4]), reverse=True)
+	by_set = defaultdict(dict)
+	score_secs = 0.0
+	with ProcessPoolExecutor(max_workers=args.workers) as ex:
+		futures = [ex.submit(score_page, args.engine, t, o if o is not None else "") for *_, t, o in jobs]
+		for (doc, level, provider, p, t, o), fut in zip(jobs, futures):
+			dist, secs = fut.result()
+			score_secs += secs
+			by_set[doc, level, provider][p] = {"chars": len(t), "dist": dist, "cer": dist / len(t) if t else 0.0,
+				"missing": o is None}
+	wall = time.perf_counter() - t0
+	results = [(doc, level, provider, dict(sorted(pages.items()))) for (doc, level, provider), pages in sorted(by_set.items())]
+
+	documents = defaultdict(lambda: defaultdict(dict))
+	corpus = defaultdict(lambda: defaultdict(list))
+	for doc, level, provider, pages in results:
+		documents[doc][level][provider] = {"pages": {str(p): v for p, v in pages.items()}, "total": total(pages.values())}
+		corpus[level][provider].extend(pages.values())
+	summary = {level: {provider: total(pages) for provider, pages in sorted(by_provider.items())}
+		for level, by_provider in sorted(corpus.items())}
+
+	n_pages = sum(len(pages) for *_, pages in results)
+	n_chars = sum(p["chars"] for *_, pages in results for p in pages.values())
+	report = {
+		"created": datetime.now().isoformat(timespec="seconds"),
+		"root": str(args.root),
+		"engine": args.engine,
+		"workers": args.workers,
+		"wall_secs": round(wall, 3),
+		"scoring_cpu_secs": round(score_secs, 3),
+		"pages_scored": n_pages,
+		"chars_scored": n_chars,
+		"pages_per_sec": round(n_pages / wall, 2),
+		"chars_per_sec": round(n_chars / wall, 1),
+		"summary": summary,
+		"documents": documents,
+	}
+	args.out.write_text(json.dumps(report, ensure_ascii=False, indent=1), encoding="utf-8")
+
+	print(f"{len(documents)} documents, {len(sets)} provider outputs, {n_pages} pages in {wall:.2f} s "
+		f"({n_pages / wall:.1f} pages/s, {args.workers} workers, {args.engine})")
+	for level, by_provider in summary.items():
+		for provider, t in by_provider.items():
+			print(f"  {level:12} {provider:10} CER {t['cer']:.4f} ({t['dist']}/{t['chars']})")
+	print(f"report: {args.out}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,94 @@
+"""Latency and agreement check for bulk_vision_runner's PDF page counting.
+
+Times the trailer/xref-only /Count lookup against a full pypdf parse on
+synthetic PDFs, and checks that both give the same count. Also checks the
+shapes the fast path must refuse: an indirect /Count ("/Count 12 0 R") has
+to yield -1 so pdf_page_count falls back to pypdf, and an indirect /Length
+must not be read as a (truncated) direct number.
+
+No network or API key is needed.
+
+Run from the repo root:
+  python benchmarks/bench_pdf_page_count.py [--files 20] [--pages 300]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pypdf import PdfReader, PdfWriter
+
+import bulk_vision_runner
+
+
+def make_synthetic_pdf(path: Path, pages: int):
+	writer = PdfWriter()
+	for _ in range(pages):
+		writer.add_blank_page(width=612, height=792)
+	with open(path, "wb") as f:
+		writer.write(f)
+
+
+def make_indirect_count_pdf(path: Path, pages: int):
+	"""Hand-built PDF whose root /Pages node stores /Count as a reference to object 12."""
+	objs = {
+		1: b"<< /Type /Catalog /Pages 2 0 R >>",
+		2: b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % (100 + i) for i in range(pages)) + b"] /Count 12 0 R >>",
+		12: b"%d" % pages,
+	}
+	for i in range(pages):
+		objs[100 + i] = b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>"
+	out, offsets = bytearray(b"%PDF-1.4\n"), {}
+	for num in sorted(objs):
+		offsets[num] = len(out)
+		out += b"%d 0 obj\n%s\nendobj\n" % (num, objs[num])
+	size = max(objs) + 1
+	xref_pos = len(out)
+	out += b"xref\n0 %d\n0000000000 65535 f \n" % size
+	for num in range(1, size):
+		out += b"%010d 00000 n \n" % offsets[num] if num in offsets else b"0000000000 65535 f \n"
+	out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_pos)
+	path.write_bytes(bytes(out))
+
+
+def check_indirect_refs(td: Path):
+	for key, obj in ((b"Count", b"<< /Type /Pages /Count 12 0 R >>"), (b"Length", b"<< /Length 512 0 R >>")):
+		value = bulk_vision_runner._int_entry(obj, key, -1)
+		assert value == -1, f"/{key.decode()} indirect ref read as {value}"
+	pdf_path = td / "indirect_count.pdf"
+	make_indirect_count_pdf(pdf_path, 30)
+	assert bulk_vision_runner._xref_page_count(pdf_path) == -1, "indirect /Count taken by the fast path"
+	assert bulk_vision_runner.pdf_page_count(pdf_path) == len(PdfReader(str(pdf_path)).pages) == 30
+	print("indirect /Count and /Length: fast path declines, pypdf fallback gives 30 pages")
+
+
+def main():
+	ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	ap.add_argument("--files", type=int, default=20)
+	ap.add_argument("--pages", type=int, default=300)
+	args = ap.parse_args()
+
+	with tempfile.TemporaryDirectory() as td:
+		td = Path(td)
+		check_indirect_refs(td)
+
+		paths = []
+		for i in range(args.files):
+			paths.append(td / f"synthetic_{i}.pdf")
+			make_synthetic_pdf(paths[-1], args.pages + i)
+
+		t0 = time.perf_counter()
+		fast = [bulk_vision_runner._xref_page_count(p) for p in paths]
+		fast_t = time.perf_counter() - t0
+		t0 = time.perf_counter()
+		full = [len(PdfReader(str(p)).pages) for p in paths]
+		full_t = time.perf_counter() - t0
+		assert fast == full, f"xref counts {fast} != pypdf counts {full}"
+		print(f"{args.files} files of ~{args.pages} pages: xref {fast_t * 1000:.1f} ms, pypdf {full_t * 1000:.1f} ms ({full_t / fast_t:.0f}x)")
+
+
+if __name__ == "__main__":
+	main()
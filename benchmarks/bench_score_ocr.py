@@ -0,0 +1,111 @@
+"""Speed and agreement of the CER distance engines in assets/ocr_comparison/score_ocr.py.
+
+First checks every engine against the reference `levenshtein` on random
+strings (including empty and one-sided inputs) and on the real kādambarī
+pages, then times them on
+
+  page   each of the 3 ground-truth pages vs. its GCV and Sarvam OCR
+  book   the pages repeated to --book-chars characters (truth vs. GCV OCR),
+         i.e. a whole book scored as one string
+  near   the same book against a copy with a few substitutions, where the
+         banded engine shines
+
+The reference DP is only timed on the page inputs by default; on a book it
+would take hours (--book-engines dp to try anyway).
+
+Run from the repo root:
+  python benchmarks/bench_score_ocr.py [--book-chars 100000] [--book-engines myers,banded] [--fuzz 300]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "assets" / "ocr_comparison"))
+
+import score_ocr
+
+
+def fuzz(n, seed=0):
+	rng = random.Random(seed)
+	alphabet = "कखगघ ािीु्ं\nअआ॥।"
+	for _ in range(n):
+		a = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+		# b: a with random edits, or unrelated
+		if rng.random() < 0.7:
+			b = list(a)
+			for _ in range(rng.randint(0, 10)):
+				op, pos = rng.random(), rng.randint(0, len(b))
+				if op < 0.33 and pos < len(b):
+					b[pos] = rng.choice(alphabet)
+				elif op < 0.66:
+					b.insert(pos, rng.choice(alphabet))
+				elif pos < len(b):
+					del b[pos]
+			b = "".join(b)
+		else:
+			b = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+		yield a, b
+
+
+def timed(fn, a, b):
+	t0 = time.perf_counter()
+	d = fn(a, b)
+	return d, time.perf_counter() - t0
+
+
+def main():
+	ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	ap.add_argument("--book-chars", type=int, default=100_000, help="length of the book-sized input")
+	ap.add_argument("--book-engines", default="myers,banded", help="engines to time on the book input")
+	ap.add_argument("--fuzz", type=int, default=300, help="random string pairs checked against the DP")
+	args = ap.parse_args()
+
+	engines = {name: fn for name, fn in score_ocr.ENGINES.items() if name != "dp"}
+	for a, b in fuzz(args.fuzz):
+		want = score_ocr.levenshtein(a, b)
+		for name, fn in engines.items():
+			assert fn(a, b) == want, (name, a, b, fn(a, b), want)
+	print(f"agreement: {len(engines)} engines == levenshtein on {args.fuzz} random pairs")
+
+	base = score_ocr.BASE
+	truth = score_ocr.parse_pages(base / score_ocr.FILES_NORM_DANDAS["truth"])
+	pairs = [(truth[p], score_ocr.parse_pages(base / score_ocr.FILES_NORM_DANDAS[prov])[p])
+		for prov in ("gcv", "sarvam") for p in sorted(truth)]
+
+	print(f"\npage-sized: {len(pairs)} pairs, {sum(len(t) for t, _ in pairs)} truth chars")
+	ref = None
+	for name, fn in score_ocr.ENGINES.items():
+		total_secs, dists = 0.0, []
+		for t, o in pairs:
+			d, secs = timed(fn, t, o)
+			dists.append(d)
+			total_secs += secs
+		ref = ref or dists
+		assert dists == ref, (name, dists, ref)
+		print(f"  {name:7} {total_secs * 1000:9.1f} ms   ({total_secs * 1000 / len(pairs):7.2f} ms/page)")
+
+	reps = max(1, args.book_chars // sum(len(t) for t, _ in pairs[:3]))
+	book_t = "\n".join(t for t, _ in pairs[:3] * reps)
+	book_o = "\n".join(o for _, o in pairs[:3] * reps)
+	print(f"\nbook-sized: {len(book_t)} truth chars vs {len(book_o)} OCR chars")
+	for name in args.book_engines.split(","):
+		d, secs = timed(score_ocr.ENGINES[name], book_t, book_o)
+		print(f"  {name:7} {secs:9.2f} s    dist {d}, CER {d / len(book_t):.4f}")
+
+	# near-identical book: the truth with one substitution every ~2000 chars (e.g. a re-OCR)
+	rng = random.Random(1)
+	near = list(book_t)
+	for pos in rng.sample(range(len(near)), len(near) // 2000):
+		near[pos] = "x"
+	near = "".join(near)
+	print(f"\nnear-identical book: {len(book_t)} chars, {len(book_t) // 2000} substitutions")
+	for name in args.book_engines.split(","):
+		d, secs = timed(score_ocr.ENGINES[name], book_t, near)
+		print(f"  {name:7} {secs:9.2f} s    dist {d}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,242 @@
+"""Load test: throughput and latency of the API per gunicorn worker/thread config.
+
+Boots the app under gunicorn (gthread, like the Dockerfile's 4 workers x 4
+threads) with the upstream splitter replaced by a stub that sleeps
+--split-latency-ms and echoes its input, then drives a weighted mix of
+
+  transliterate   /api/transliterate    EXAMPLES["1"] and GRETIL verses, IAST -> DEV
+  scan            /api/scan             EXAMPLES["2"] and GRETIL verses
+  identify-meter  /api/identify-meter   EXAMPLES["2"], ["3b"] and GRETIL verses
+  split           /api/split            EXAMPLES["3"] and GRETIL verses (stubbed upstream)
+  upload_file     /upload_file          --upload-verses GRETIL lines, "identify meter"
+
+from N closed-loop clients (each sends its next request when the last one
+returns). For every config and client count it reports requests/s and
+p50/p95/p99/max latency per endpoint, and optionally writes them as JSON.
+
+GRETIL verses come from assets/meter_analyses/2_input_cleaned. No network
+is needed.
+
+Run from the repo root:
+  python benchmarks/loadtest_api.py [--configs 4x4,2x8] [--clients 8,32] [--secs 20] [--split-latency-ms 300]
+      [--mix transliterate=30,scan=20,identify-meter=30,split=10,upload_file=10] [--json loadtest_api.json]
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import requests
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+GRETIL_DIR = REPO_ROOT / "assets" / "meter_analyses" / "2_input_cleaned"
+GRETIL_TEXTS = ("BhG", "MgD", "KuS", "Kir", "Ram", "BCA")
+
+SCAN_FLAGS = {"show_weights": "false", "show_morae": "false", "show_gaRas": "false", "show_alignment": "false"}
+
+
+def stub_splitter_app():
+	"""Gunicorn app factory: the real app with the upstream splitter replaced by a sleep."""
+	import flask_app
+
+	latency = float(os.environ["LOADTEST_SPLIT_LATENCY_MS"]) / 1000
+
+	def fake_split(text, splitter_model=None, preserve_compound_hyphens=True, preserve_punctuation=True):
+		time.sleep(latency)
+		return text
+
+	flask_app.Spl.split = fake_split
+	return flask_app.app
+
+
+def load_workload(seed):
+	"""EXAMPLES plus a sample of GRETIL verses (one line each, IAST)."""
+	sys.path.insert(0, str(REPO_ROOT))
+	from flask_app import EXAMPLES
+
+	rng = random.Random(seed)
+	verses = []
+	for name in GRETIL_TEXTS:
+		lines = [l for l in (GRETIL_DIR / f"{name}_input_cleaned.txt").read_text(encoding="utf-8").splitlines() if l.strip()]
+		verses.extend(rng.sample(lines, min(300, len(lines))))
+	return EXAMPLES, verses
+
+
+def make_requests(examples, verses, upload_verses):
+	"""endpoint -> function(rng) returning requests.post kwargs."""
+	def pick(rng, example_keys):
+		if rng.random() < 0.5:
+			ex = examples[rng.choice(example_keys)]
+			return ex["text_input"], ex["from_scheme"]
+		return rng.choice(verses), "IAST"
+
+	def transliterate(rng):
+		text, scheme = pick(rng, ["1"])
+		return {"url": "/api/transliterate", "data": {"input_text": text, "from_scheme": scheme, "to_scheme": "DEV"}}
+
+	def scan(rng):
+		text, scheme = pick(rng, ["2"])
+		return {"url": "/api/scan", "data": {"input_text": text, "from_scheme": scheme, **SCAN_FLAGS}}
+
+	def identify_meter(rng):
+		text, scheme = pick(rng, ["2", "3b"])
+		return {"url": "/api/identify-meter", "data": {"input_text": text, "from_scheme": scheme,
+			"resplit_option": "resplit_lite_keep_mid", **SCAN_FLAGS}}
+
+	def split(rng):
+		text, scheme = pick(rng, ["3"])
+		return {"url": "/api/split", "data": {"input_text": text, "from_scheme": scheme, "to_scheme": "IAST"}}
+
+	def upload_file(rng):
+		start = rng.randrange(max(1, len(verses) - upload_verses))
+		body = "\n".join(verses[start:start + upload_verses]).encode("utf-8")
+		return {"url": "/upload_file",
+			"data": {"skrutable_action": "identify meter", "from_scheme": "IAST", "to_scheme": "IAST",
+				"resplit_option": "resplit_lite_keep_mid"},
+			"files": {"input_file": ("gretil.txt", body, "text/plain")}}
+
+	return {"transliterate": transliterate, "scan": scan, "identify-meter": identify_meter,
+		"split": split, "upload_file": upload_file}
+
+
+def free_port():
+	with socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+
+def start_server(port, workers, threads, split_latency_ms, extra_env=None):
+	env = dict(os.environ, LOADTEST_SPLIT_LATENCY_MS=str(split_latency_ms), **(extra_env or {}))
+	proc = subprocess.Popen(
+		[
+			sys.executable, "-m", "gunicorn", "loadtest_api:stub_splitter_app()",
+			"--pythonpath", f"{REPO_ROOT},{REPO_ROOT / 'benchmarks'}",
+			"--chdir", str(REPO_ROOT),
+			"--bind", f"127.0.0.1:{port}",
+			"--worker-class", "gthread", "--workers", str(workers), "--threads", str(threads),
+			"--timeout", "600", "--log-level", "warning",
+		],
+		env=env,
+		stdout=subprocess.DEVNULL,
+		stderr=subprocess.DEVNULL,
+	)
+	base = f"http://127.0.0.1:{port}"
+	for _ in range(300):
+		try:
+			requests.get(f"{base}/metrics", timeout=5)
+			return proc, base
+		except requests.RequestException:
+			time.sleep(0.2)
+	proc.terminate()
+	raise RuntimeError("gunicorn did not start")
+
+
+def client(base, builders, weights, seed, stop, samples):
+	rng = random.Random(seed)
+	names = list(weights)
+	session = requests.Session()
+	while not stop.is_set():
+		name = rng.choices(names, weights=[weights[n] for n in names])[0]
+		kwargs = builders[name](rng)
+		url = base + kwargs.pop("url")
+		t0 = time.perf_counter()
+		try:
+			ok = session.post(url, headers={"Accept": "application/json"}, timeout=600, **kwargs).status_code < 400
+		except requests.RequestException:
+			ok = False
+		samples.append((name, time.perf_counter() - t0, ok))
+
+
+def summarize(samples, secs):
+	by_endpoint = defaultdict(list)
+	errors = defaultdict(int)
+	for name, latency, ok in samples:
+		by_endpoint[name].append(latency)
+		errors[name] += not ok
+	out = {}
+	for name, lat in sorted(by_endpoint.items()):
+		lat.sort()
+		pct = lambda q: round(lat[min(len(lat) - 1, int(len(lat) * q))] * 1000, 1)
+		out[name] = {"requests": len(lat), "errors": errors[name], "rps": round(len(lat) / secs, 2),
+			"p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99), "max_ms": round(lat[-1] * 1000, 1)}
+	return out
+
+
+def run(base, builders, weights, clients, secs, warmup):
+	stop = threading.Event()
+	samples = []
+	threads = [threading.Thread(target=client, args=(base, builders, weights, i, stop, samples), daemon=True)
+		for i in range(clients)]
+	for t in threads:
+		t.start()
+	time.sleep(warmup)
+	del samples[:]
+	t0 = time.perf_counter()
+	time.sleep(secs)
+	measured = list(samples)
+	elapsed = time.perf_counter() - t0
+	stop.set()
+	for t in threads:
+		t.join(timeout=600)
+	return summarize(measured, elapsed), len(measured) / elapsed
+
+
+def parse_mix(value):
+	weights = {}
+	for part in value.split(","):
+		name, _, weight = part.partition("=")
+		weights[name.strip()] = float(weight or 1)
+	return weights
+
+
+def main():
+	ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	ap.add_argument("--configs", default="4x4", help="comma-separated WORKERSxTHREADS gunicorn configs")
+	ap.add_argument("--clients", default="8,32", help="comma-separated concurrent client counts")
+	ap.add_argument("--secs", type=float, default=20, help="measured seconds per run")
+	ap.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before each run")
+	ap.add_argument("--split-latency-ms", type=float, default=300, help="stub splitter latency")
+	ap.add_argument("--mix", type=parse_mix, default=parse_mix("transliterate=30,scan=20,identify-meter=30,split=10,upload_file=10"),
+		help="endpoint=weight list")
+	ap.add_argument("--upload-verses", type=int, default=50, help="verses per /upload_file request")
+	ap.add_argument("--json", type=Path, default=None, help="also write the results here")
+	args = ap.parse_args()
+
+	examples, verses = load_workload(seed=0)
+	builders = make_requests(examples, verses, args.upload_verses)
+	unknown = set(args.mix) - set(builders)
+	if unknown:
+		sys.exit(f"unknown endpoint(s) in --mix: {', '.join(sorted(unknown))}")
+
+	results = []
+	for config in args.configs.split(","):
+		workers, threads = (int(x) for x in config.lower().split("x"))
+		proc, base = start_server(free_port(), workers, threads, args.split_latency_ms)
+		try:
+			for clients in (int(c) for c in args.clients.split(",")):
+				per_endpoint, rps = run(base, builders, args.mix, clients, args.secs, args.warmup)
+				results.append({"workers": workers, "threads": threads, "clients": clients, "rps": round(rps, 2),
+					"endpoints": per_endpoint})
+				print(f"\n{workers} workers x {threads} threads, {clients} clients: {rps:.1f} req/s")
+				for name, r in per_endpoint.items():
+					print(f"  {name:15} n={r['requests']:5} err={r['errors']:3} {r['rps']:7.2f}/s   p50 {r['p50_ms']:8.1f}"
+						f"   p95 {r['p95_ms']:8.1f}   p99 {r['p99_ms']:8.1f}   max {r['max_ms']:8.1f} ms")
+		finally:
+			proc.terminate()
+			proc.wait()
+
+	if args.json:
+		args.json.write_text(json.dumps({"split_latency_ms": args.split_latency_ms, "mix": args.mix,
+			"secs": args.secs, "runs": results}, indent=1), encoding="utf-8")
+		print(f"\nresults: {args.json}")
+
+
+if __name__ == "__main__":
+	main()
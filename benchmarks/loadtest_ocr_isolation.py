@@ -0,0 +1,191 @@
+"""Load test: does OCR traffic slow down meter identification?
+
+Starts the app under gunicorn (gthread, one worker, few threads so contention
+shows quickly) with the OCR providers replaced by fakes that just sleep, then
+measures /api/identify-meter latency in three phases:
+
+  idle     no OCR traffic
+  legacy   N clients looping on the synchronous POST /ocr, which waits for the
+           whole OCR on its request thread
+  jobs     N clients looping on POST /ocr/stream, following the job stream
+           through its "pending" / resume cycle like the web UI does
+
+With jobs, OCR runs on the OCR executor and streams release their request
+thread, so meter latency should stay close to idle; the legacy phase shows
+what it looks like when OCR pins request threads.
+
+No network or API key is needed.
+
+Run from the repo root:
+  python benchmarks/loadtest_ocr_isolation.py [--clients 12] [--ocr-secs 8] [--phase-secs 20] [--threads 4]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+METER_FORM = {
+	"input_text": "dharmakṣetre kurukṣetre samavetā yuyutsavaḥ |\nmāmakāḥ pāṇḍavāś caiva kim akurvata sañjaya ||",
+	"from_scheme": "IAST",
+	"show_weights": "false",
+	"show_morae": "false",
+	"show_gaRas": "false",
+	"show_alignment": "false",
+	"resplit_option": "none",
+}
+
+
+def fake_ocr_app():
+	"""Gunicorn app factory: the real app with OCR providers replaced by sleeps."""
+	import flask_app
+	import ocr_jobs
+
+	secs = float(os.environ["LOADTEST_FAKE_OCR_SECS"])
+
+	def fake_google_ocr(pdf_path, api_key, include_page_numbers=True):
+		time.sleep(secs)
+		return "=== 1 ===\nfake OCR text", 1, 0
+
+	ocr_jobs.run_google_ocr = fake_google_ocr
+	flask_app.run_google_ocr = fake_google_ocr
+	return flask_app.app
+
+
+def free_port():
+	with socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+
+def start_server(port, threads, ocr_secs, jobs_dir):
+	env = dict(
+		os.environ,
+		LOADTEST_FAKE_OCR_SECS=str(ocr_secs),
+		OCR_JOBS_DIR=str(jobs_dir),
+		OCR_CACHE_MAX_MB="0",
+		OCR_STREAM_HOLD_SECS="2",
+		OCR_STREAM_RETRY_SECS="1",
+	)
+	proc = subprocess.Popen(
+		[
+			sys.executable, "-m", "gunicorn", "loadtest_ocr_isolation:fake_ocr_app()",
+			"--pythonpath", f"{REPO_ROOT},{REPO_ROOT / 'benchmarks'}",
+			"--chdir", str(REPO_ROOT),
+			"--bind", f"127.0.0.1:{port}",
+			"--worker-class", "gthread", "--workers", "1", "--threads", str(threads),
+			"--timeout", "600", "--log-level", "warning",
+		],
+		env=env,
+		stdout=subprocess.DEVNULL,
+		stderr=subprocess.DEVNULL,  # the app logs every OCR request
+	)
+	base = f"http://127.0.0.1:{port}"
+	for _ in range(100):
+		try:
+			requests.get(f"{base}/metrics", timeout=1)
+			return proc, base
+		except requests.ConnectionError:
+			time.sleep(0.2)
+	proc.terminate()
+	raise RuntimeError("gunicorn did not start")
+
+
+def legacy_client(base, stop):
+	while not stop.is_set():
+		requests.post(f"{base}/ocr", data={"ocr_provider": "google", "api_key": "x", "display_inline": "yes"},
+			files={"pdf_file": ("fake.pdf", b"%PDF-1.4 fake")}, timeout=600)
+
+
+def jobs_client(base, stop):
+	"""Start a job and follow its stream to the end, reconnecting on "pending", like ocr.html."""
+	while not stop.is_set():
+		res = requests.post(f"{base}/ocr/stream", data={"ocr_provider": "google", "api_key": "x"},
+			files={"pdf_file": ("fake.pdf", b"%PDF-1.4 fake")}, stream=True, timeout=600)
+		job_id, after = None, 0
+		while res is not None:
+			if res.status_code == 503:
+				time.sleep(float(res.headers.get("Retry-After", "1")))
+				break
+			outcome = None
+			for line in res.iter_lines(decode_unicode=True):
+				if not line or not line.startswith("data: "):
+					continue
+				evt = json.loads(line[6:])
+				if evt["type"] == "job":
+					job_id = evt["job_id"]
+				elif evt["type"] == "chunk":
+					after = evt["index"]
+				elif evt["type"] == "pending":
+					outcome = ("pending", evt["retry_ms"] / 1000)
+				elif evt["type"] in ("done", "error"):
+					outcome = (evt["type"], 0)
+			res.close()
+			if outcome is None or outcome[0] != "pending" or stop.is_set():
+				break
+			time.sleep(outcome[1])
+			res = requests.get(f"{base}/ocr/stream/{job_id}?after={after}", stream=True, timeout=600)
+
+
+def probe_meter(base, secs):
+	"""Sequential /api/identify-meter requests for `secs`; returns latencies in ms."""
+	latencies = []
+	deadline = time.perf_counter() + secs
+	while time.perf_counter() < deadline:
+		t0 = time.perf_counter()
+		r = requests.post(f"{base}/api/identify-meter", data=METER_FORM, headers={"Accept": "application/json"}, timeout=600)
+		r.raise_for_status()
+		latencies.append((time.perf_counter() - t0) * 1000)
+	return latencies
+
+
+def run_phase(label, base, client, clients, phase_secs):
+	stop = threading.Event()
+	workers = [threading.Thread(target=client, args=(base, stop), daemon=True) for _ in range(clients if client else 0)]
+	for w in workers:
+		w.start()
+	time.sleep(1.0 if client else 0)  # let the OCR load build up
+	lat = probe_meter(base, phase_secs)
+	stop.set()
+	lat.sort()
+	p50 = statistics.median(lat)
+	p95 = lat[min(len(lat) - 1, int(len(lat) * 0.95))]
+	print(f"  {label:7} n={len(lat):5}   p50 {p50:8.1f} ms   p95 {p95:8.1f} ms   max {lat[-1]:8.1f} ms")
+	return workers
+
+
+def main():
+	ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	ap.add_argument("--clients", type=int, default=12, help="concurrent OCR clients")
+	ap.add_argument("--ocr-secs", type=float, default=8, help="fake OCR time per job")
+	ap.add_argument("--phase-secs", type=float, default=20, help="meter probing time per phase")
+	ap.add_argument("--threads", type=int, default=4, help="gunicorn threads (one worker)")
+	args = ap.parse_args()
+
+	with tempfile.TemporaryDirectory() as jobs_dir:
+		proc, base = start_server(free_port(), args.threads, args.ocr_secs, jobs_dir)
+		try:
+			print(f"{args.clients} OCR clients, {args.ocr_secs:g} s fake OCR, 1 worker x {args.threads} threads")
+			run_phase("idle", base, None, 0, args.phase_secs)
+			run_phase("jobs", base, jobs_client, args.clients, args.phase_secs)
+			# legacy clients stay blocked inside /ocr; let them drain before shutdown
+			workers = run_phase("legacy", base, legacy_client, args.clients, args.phase_secs)
+			for w in workers:
+				w.join(timeout=args.ocr_secs * args.clients)
+		finally:
+			proc.terminate()
+			proc.wait()
+
+
+if __name__ == "__main__":
+	main()
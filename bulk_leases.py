@@ -0,0 +1,127 @@
+"""
+bulk_leases.py - lease files for sharing one PDF tree between several bulk_vision_runner
+processes or hosts (a shared filesystem for --lease-dir and --out-dir is assumed).
+
+A lease is <lease_dir>/<h[:2]>/<h>.lease, where h = sha1 of the PDF's path relative to
+--root, so hosts that mount the tree at different places still agree. It is created
+with O_EXCL (only one claimant wins), kept fresh by a heartbeat thread that touches
+its mtime, and deleted when the file is finished. A lease whose mtime is older than
+the TTL belongs to a crashed node and may be taken over; the takeover goes through
+an atomic rename, so only one node wins that race as well. Keep the TTL well above
+clock skew between hosts plus the heartbeat interval (TTL / 3).
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+
+class LeaseDir:
+
+    def __init__(self, root: Path, ttl: float = 600.0):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._renew_loop, name="lease-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def _path(self, key: str) -> Path:
+        h = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.root / h[:2] / f"{h}.lease"
+
+    def _owner_of(self, path: Path):
+        try:
+            return json.loads(path.read_text(encoding="utf-8")).get("owner")
+        except (OSError, ValueError):
+            return None
+
+    def claim(self, key: str) -> bool:
+        """Try to take the lease for key; False if another live node holds it."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        for _ in range(3):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                try:
+                    age = time.time() - path.stat().st_mtime
+                except FileNotFoundError:
+                    continue  # released meanwhile; try again
+                if age < self.ttl:
+                    return False
+                if not self._take_over(path, key):
+                    return False
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump({"owner": self.owner, "key": key, "claimed": time.time()}, fh)
+            with self._lock:
+                self.held.add(key)
+            return True
+        return False
+
+    def _take_over(self, path: Path, key: str) -> bool:
+        """Remove an expired lease; False if someone else got there first or it was renewed."""
+        stale = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.stale")
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return False
+        previous = self._owner_of(stale)
+        try:
+            renewed = time.time() - stale.stat().st_mtime < self.ttl
+        except FileNotFoundError:
+            renewed = False
+        if renewed:
+            # its holder renewed it between our stat and rename: put it back unless replaced
+            try:
+                os.link(stale, path)
+            except OSError:
+                pass
+            stale.unlink(missing_ok=True)
+            return False
+        stale.unlink(missing_ok=True)
+        logging.warning("Reclaimed expired lease for %s (held by %s)", key, previous)
+        return True
+
+    def release(self, key: str):
+        with self._lock:
+            self.held.discard(key)
+        path = self._path(key)
+        if self._owner_of(path) == self.owner:
+            path.unlink(missing_ok=True)
+
+    def _renew_loop(self):
+        while not self._stop.wait(self.ttl / 3):
+            with self._lock:
+                keys = list(self.held)
+            for key in keys:
+                path = self._path(key)
+                if self._owner_of(path) != self.owner:
+                    logging.warning("Lost lease for %s (expired and taken over); another node may redo it", key)
+                    with self._lock:
+                        self.held.discard(key)
+                    continue
+                try:
+                    os.utime(path)
+                except OSError as e:
+                    logging.warning("Lease renewal failed for %s: %s", key, e)
+
+    def close(self):
+        """Stop renewing and release every lease still held."""
+        self._stop.set()
+        self._heartbeat.join()
+        with self._lock:
+            keys = list(self.held)
+        for key in keys:
+            self.release(key)
+
+def shard_of(key: str, n: int) -> int:
+    """Stable shard index of key (a root-relative path) among n shards."""
+    return int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:8], 16) % n
@@ -0,0 +1,219 @@
+"""
+bulk_manifest.py - SQLite run manifest for bulk_vision_runner.
+
+One row per PDF with its current state, cumulative attempts, page count, timings and
+last error, so a rerun resumes exactly where the previous one stopped and failures
+are visible across runs. The database is in WAL mode; while a run is going, all
+writes go through a single ManifestWriter thread (readers never block it).
+
+States:
+  PENDING     discovered, not yet processed
+  RUNNING     submitted to a worker (left over after a crash = interrupted; reset to
+              PENDING by the next runner that holds the manifest's run lock alone)
+  SUCCESS     .txt written
+  FAIL        retries exhausted (see error_class / error)
+  THROTTLED   last attempt hit the provider quota; will be retried
+  SKIPPED     .txt already existed (e.g. from a run before the manifest)
+"""
+import csv
+import datetime
+import fcntl
+import logging
+import queue
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Tuple
+
+STATUSES = ("PENDING", "RUNNING", "SUCCESS", "FAIL", "THROTTLED", "SKIPPED")
+DONE_STATUSES = ("SUCCESS", "SKIPPED")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    pdf_path     TEXT PRIMARY KEY,
+    out_path     TEXT NOT NULL,
+    size         INTEGER,
+    mtime_ns     INTEGER,
+    pages        INTEGER NOT NULL DEFAULT 0,
+    status       TEXT NOT NULL DEFAULT 'PENDING',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    error_class  TEXT NOT NULL DEFAULT '',
+    error        TEXT NOT NULL DEFAULT '',
+    start_ts     TEXT,
+    end_ts       TEXT,
+    duration_s   REAL,
+    worker       TEXT,
+    updated_ts   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_status ON files (status);
+"""
+
+CSV_HEADER = ["timestamp", "pdf_name", "out_name", "pages", "status", "error", "start_ts", "end_ts", "duration_s",
+              "attempts", "error_class"]
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(db_path), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+class FileState(NamedTuple):
+    status: str
+    attempts: int
+
+class RunManifest:
+    """Main-thread view of the manifest: schema, discovery, selection and CSV export.
+    With read_only (dry runs) nothing is written, and a missing manifest reads as empty."""
+
+    def __init__(self, db_path: Path, read_only: bool = False):
+        self.db_path = Path(db_path)
+        self._run_lock = None
+        if read_only:
+            self.conn = (sqlite3.connect(self.db_path.resolve().as_uri() + "?mode=ro", uri=True, timeout=30)
+                         if self.db_path.exists() else None)
+            return
+        self.conn = _connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+        if self._run_lock is not None:
+            self._run_lock.close()  # releases the flock
+
+    def claim_run(self) -> bool:
+        """Take the manifest's run lock (<db>.lock) for this process's lifetime; False if
+        another runner holds it, i.e. its RUNNING rows are live and must not be reset."""
+        lock = open(str(self.db_path) + ".lock", "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return False
+        self._run_lock = lock
+        return True
+
+    def sync(self, files: Iterable[Tuple[Path, Path, int]], reset_running: bool = True):
+        """
+        Register (pdf_path, out_path, pages) for this run: new files become PENDING, known
+        ones get their page count refreshed. Files whose size or mtime changed since they
+        were recorded go back to PENDING. With reset_running (no other runner holds the
+        manifest), RUNNING rows are left by an interrupted run and are reset to PENDING.
+        """
+        now = _now()
+        with self.conn:
+            if reset_running:
+                self.conn.execute("UPDATE files SET status = 'PENDING', updated_ts = ? WHERE status = 'RUNNING'", (now,))
+            for pdf_path, out_path, pages in files:
+                try:
+                    st = pdf_path.stat()
+                    size, mtime_ns = st.st_size, st.st_mtime_ns
+                except OSError:
+                    size = mtime_ns = None
+                self.conn.execute(
+                    """
+                    INSERT INTO files (pdf_path, out_path, size, mtime_ns, pages, updated_ts)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (pdf_path) DO UPDATE SET
+                        out_path = excluded.out_path,
+                        pages = excluded.pages,
+                        status = CASE WHEN files.size IS NOT excluded.size OR files.mtime_ns IS NOT excluded.mtime_ns
+                                      THEN 'PENDING' ELSE files.status END,
+                        size = excluded.size,
+                        mtime_ns = excluded.mtime_ns
+                    """,
+                    (str(pdf_path), str(out_path), size, mtime_ns, int(pages), now),
+                )
+
+    def states(self) -> Dict[str, FileState]:
+        return {path: FileState(status, attempts)
+                for path, status, attempts in self.conn.execute("SELECT pdf_path, status, attempts FROM files")}
+
+    def status_counts(self) -> Dict[str, Tuple[int, int]]:
+        """status -> (files, pages)"""
+        if self.conn is None:
+            return {}
+        return {status: (n, pages or 0) for status, n, pages in
+                self.conn.execute("SELECT status, COUNT(*), SUM(pages) FROM files GROUP BY status")}
+
+    def export_csv(self, csv_path: Path):
+        """Write the whole manifest as a CSV (basenames only, like the old per-run log)."""
+        rows = self.conn.execute(
+            """
+            SELECT updated_ts, pdf_path, out_path, pages, status, error, start_ts, end_ts, duration_s, attempts, error_class
+            FROM files ORDER BY pdf_path
+            """
+        )
+        tmp = Path(str(csv_path) + ".tmp")
+        with open(tmp, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(CSV_HEADER)
+            for updated, pdf_path, out_path, pages, status, error, start_ts, end_ts, duration, attempts, error_class in rows:
+                writer.writerow([
+                    updated, Path(pdf_path).name, Path(out_path).name, pages, status,
+                    error.replace("\n", "<NL>"), start_ts or "", end_ts or "",
+                    f"{duration:.2f}" if duration is not None else "", attempts, error_class,
+                ])
+        tmp.replace(csv_path)
+
+class ManifestWriter(threading.Thread):
+    """
+    Sole writer while a run is going: the dispatcher enqueues updates and this thread
+    applies them in batched transactions, so completions never wait on disk I/O.
+    """
+
+    _STOP = object()
+
+    def __init__(self, db_path: Path, max_batch: int = 500):
+        super().__init__(name="manifest-writer", daemon=True)
+        self.db_path = Path(db_path)
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+
+    def run(self):
+        conn = _connect(self.db_path)
+        try:
+            stop = False
+            while not stop:
+                batch = [self.queue.get()]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    with conn:
+                        for item in batch:
+                            if item is self._STOP:
+                                stop = True
+                            else:
+                                conn.execute(*item)
+                except sqlite3.Error:
+                    logging.exception("Manifest write failed (%d updates lost)", len(batch))
+        finally:
+            conn.close()
+
+    def close(self):
+        """Flush pending updates and stop the thread."""
+        self.queue.put(self._STOP)
+        self.join()
+
+    def mark_running(self, pdf_path: str):
+        self.queue.put(("UPDATE files SET status = 'RUNNING', updated_ts = ? WHERE pdf_path = ?", (_now(), pdf_path)))
+
+    def mark_skipped(self, pdf_path: str):
+        self.queue.put(("UPDATE files SET status = 'SKIPPED', updated_ts = ? WHERE pdf_path = ?", (_now(), pdf_path)))
+
+    def record_result(self, pdf_path: str, status: str, attempts: int, error_class: str, error: str,
+                      start_ts: str, end_ts: str, duration_s, worker: str):
+        self.queue.put((
+            """
+            UPDATE files SET status = ?, attempts = attempts + ?, error_class = ?, error = ?,
+                             start_ts = ?, end_ts = ?, duration_s = ?, worker = ?, updated_ts = ?
+            WHERE pdf_path = ?
+            """,
+            (status, attempts, error_class, error, start_ts, end_ts, duration_s, worker, _now(), pdf_path),
+        ))
@@ -0,0 +1,177 @@
+"""
+bulk_pipeline.py - optional post-OCR stages for bulk_vision_runner (--pipeline).
+
+Each .txt the runner writes is handed to a process pool as soon as it lands, so the
+CPU-bound skrutable work overlaps with the remaining network-bound OCR instead of
+being a second pass over the archive. Stages run in this order (any subset):
+
+  normalize      NFC, page separators and soft hyphens removed, whitespace tidied
+                 -> <stem>.norm.txt
+  detect         input scheme via SchemeDetector (else --pipeline-from-scheme)
+  transliterate  to --pipeline-to-scheme -> <stem>.<scheme>.txt
+  meter          identify_meter on each verse (text split at double dandas)
+                 -> <stem>.meter.txt, in the web app's download format
+
+Every processed file also gets <stem>.pipeline.json (stages run, options, scheme,
+verse and meter counts, per-stage seconds, or the error), written last, so its presence
+means the sidecars are complete. A file counts as done only if that marker is newer than
+the .txt, records success and matches the current stages and options. All sidecars are
+written atomically.
+"""
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+STAGES = ("normalize", "detect", "transliterate", "meter")
+# run_stages options after the stages, as recorded in <stem>.pipeline.json
+OPTION_NAMES = ("from_scheme", "to_scheme", "resplit_option", "resplit_keep_midpoint")
+
+PAGE_SEPARATOR = re.compile(r"^\s*=== \d+ ===\s*$", re.MULTILINE)
+# a verse ends at a double danda, optionally followed by its number and another double danda
+VERSE_END = re.compile(r"(?:॥|\|\|)\s*(?:[\d०-९]+\s*(?:॥|\|\|))?")
+
+# per-process skrutable objects, built once by _init_worker
+_T = _SD = _MI = None
+
+def sidecar(outpath: Path, suffix: str) -> Path:
+    return outpath.with_name(outpath.stem + suffix)
+
+def _atomic_write(path: Path, text: str):
+    tmp = path.with_name(path.name + f".tmp-{os.getpid()}")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+def _init_worker():
+    global _T, _SD, _MI
+    from skrutable.transliteration import Transliterator
+    from skrutable.scheme_detection import SchemeDetector
+    from skrutable.meter_identification import MeterIdentifier
+    _T, _SD, _MI = Transliterator(), SchemeDetector(), MeterIdentifier()
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFC", text)
+    text = PAGE_SEPARATOR.sub("", text).replace("\u00ad", "")
+    text = "\n".join(line.rstrip() for line in text.splitlines())
+    return re.sub(r"\n{3,}", "\n\n", text).strip() + "\n"
+
+def split_verses(text: str) -> list:
+    """Verses as single lines, split at double dandas; chunks without letters are dropped."""
+    verses = []
+    for chunk in VERSE_END.split(text):
+        verse = " ".join(chunk.split())
+        if any(c.isalpha() for c in verse):
+            verses.append(verse)
+    return verses
+
+def run_stages(outpath_str: str, stages: tuple, from_scheme: str, to_scheme: str, resplit_option: str,
+               resplit_keep_midpoint: bool) -> dict:
+    """Run the selected stages on one OCR output; returns the summary also written to <stem>.pipeline.json."""
+    outpath = Path(outpath_str)
+    summary = {"source": outpath.name, "stages": list(stages),
+               "options": dict(zip(OPTION_NAMES, (from_scheme, to_scheme, resplit_option, resplit_keep_midpoint))),
+               "seconds": {}}
+    try:
+        text = outpath.read_text(encoding="utf-8")
+        scheme = from_scheme
+
+        def timed(stage, fn):
+            t0 = time.perf_counter()
+            result = fn()
+            summary["seconds"][stage] = round(time.perf_counter() - t0, 4)
+            return result
+
+        if "normalize" in stages:
+            text = timed("normalize", lambda: normalize_text(text))
+            _atomic_write(sidecar(outpath, ".norm.txt"), text)
+        if "detect" in stages:
+            detected = timed("detect", lambda: _SD.detect_scheme(text))
+            if detected is not None:
+                scheme = detected
+                summary["confidence"] = _SD.confidence
+        summary["scheme"] = scheme
+        if "transliterate" in stages and scheme != to_scheme:
+            text = timed("transliterate", lambda: _T.transliterate(text, from_scheme=scheme, to_scheme=to_scheme))
+            _atomic_write(sidecar(outpath, f".{to_scheme.lower()}.txt"), text)
+            scheme = to_scheme
+        if "meter" in stages:
+            def identify():
+                verses = split_verses(text)
+                t0 = time.perf_counter()
+                verse_objects = [_MI.identify_meter(v, resplit_option=resplit_option,
+                                                    resplit_keep_midpoint=resplit_keep_midpoint, from_scheme=scheme)
+                                 for v in verses]
+                duration_secs = time.perf_counter() - t0
+                out = "".join(V.text_raw + "\n\n" + V.summarize(show_label=True) + "\n" for V in verse_objects)
+                out += "samāptam: %d padyāni, %f kṣaṇāḥ" % (len(verses), duration_secs)
+                _atomic_write(sidecar(outpath, ".meter.txt"), out)
+                return verse_objects
+            verse_objects = timed("meter", identify)
+            summary["verses"] = len(verse_objects)
+            summary["meters"] = dict(Counter(V.meter_label.split(" ")[0] for V in verse_objects).most_common())
+        summary["status"] = "SUCCESS"
+    except Exception as exc:
+        summary["status"] = "FAIL"
+        summary["error"] = f"{type(exc).__name__}: {exc}"
+    _atomic_write(sidecar(outpath, ".pipeline.json"), json.dumps(summary, ensure_ascii=False, indent=1))
+    return summary
+
+class PostOcrPipeline:
+    """Process pool running run_stages for each finished .txt; the runner polls reap()."""
+
+    def __init__(self, stages, workers: int, from_scheme: str, to_scheme: str, resplit_option: str):
+        self.stages = tuple(s for s in STAGES if s in stages)
+        self.options = (from_scheme, to_scheme) + _parse_resplit(resplit_option)
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        self.pending = set()
+        self.counts = Counter()
+
+    def is_done(self, outpath: Path) -> bool:
+        """True if outpath already has a complete, up-to-date set of sidecars from a successful
+        run with the same stages and options (failed or differently configured runs are redone)."""
+        marker = sidecar(outpath, ".pipeline.json")
+        try:
+            if marker.stat().st_mtime < outpath.stat().st_mtime:
+                return False
+            summary = json.loads(marker.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return False
+        return (summary.get("status") == "SUCCESS" and summary.get("stages") == list(self.stages)
+                and summary.get("options") == dict(zip(OPTION_NAMES, self.options)))
+
+    def submit(self, outpath: Path):
+        self.pending.add(self.pool.submit(run_stages, str(outpath), self.stages, *self.options))
+
+    def reap(self, block: bool = False):
+        """Collect finished jobs (all of them if block) and log failures."""
+        for fut in list(self.pending):
+            if not (block or fut.done()):
+                continue
+            self.pending.discard(fut)
+            try:
+                summary = fut.result()
+            except Exception as exc:
+                logging.error("PIPELINE worker crashed: %s", exc)
+                self.counts["FAIL"] += 1
+                continue
+            self.counts[summary["status"]] += 1
+            if summary["status"] != "SUCCESS":
+                logging.error("PIPELINE FAILED: %s (%s)", summary["source"], summary.get("error"))
+
+    def close(self):
+        if self.pending:
+            logging.info("Waiting for %d post-OCR pipeline jobs...", len(self.pending))
+        self.reap(block=True)
+        self.pool.shutdown()
+        logging.info("Pipeline (%s): %d files processed, %d failed (see *.pipeline.json).",
+                     ",".join(self.stages), self.counts["SUCCESS"], self.counts["FAIL"])
+
+def _parse_resplit(option: str) -> tuple:
+    if option.endswith("_keep_mid"):
+        return option[:-len("_keep_mid")], True
+    return option, False
@@ -2,11 +2,22 @@
 """
 bulk_vision_runner.py - page-aware version (robust page counting) + skip-existing + tqdm
 Logs and CSV use only file basenames (no full paths) for readability.
+Per-file state lives in a SQLite run manifest (see bulk_manifest.py); the CSV log is an export of it.
+Page counts are computed on a process pool (fast xref-only lookup first) and cached in a
+manifest keyed by path, size and mtime, so reruns and --dry-run skip unchanged files.
 Created with ChatGPT 5.
 
 Usage examples:
   python bulk_vision_runner.py --root /path/to/pdfs --dry-run
   python bulk_vision_runner.py --root /path/to/pdfs --workers 10 --mode process --out-dir ./ocr_results --api-key "$MY_API_KEY"
+  python bulk_vision_runner.py --root /path/to/pdfs --workers 16 --pages-per-minute 1800 --api-key "$MY_API_KEY"
+  python bulk_vision_runner.py --root /path/to/pdfs --retry-failed      # resume, also retrying FAIL rows
+  python bulk_vision_runner.py --root /path/to/pdfs --only-status THROTTLED,FAIL
+  python bulk_vision_runner.py --root /mnt/shared/pdfs --out-dir /mnt/shared/ocr --lease-dir /mnt/shared/leases  # on each host
+  python bulk_vision_runner.py --root /path/to/pdfs --pack-pages 200 --pack-file-pages 5   # many small PDFs per Vision call
+  python bulk_vision_runner.py --root /path/to/pdfs --provider sarvam --api-key "$SARVAM_API_KEY"
+  python bulk_vision_runner.py --root /path/to/pdfs --mode async --workers 2000 --pages-per-minute 1800
+  python bulk_vision_runner.py --root /path/to/pdfs --pipeline normalize,detect,transliterate,meter
 
 Dependencies:
   pip install pypdf tqdm
@@ -14,21 +25,32 @@ Dependencies:
   sudo apt install poppler-utils # Debian/Ubuntu (optional)
 """
 import argparse
-import csv
+import asyncio
+import json
 import logging
 import os
 import re
 import subprocess
 import sys
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import zlib
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, ProcessPoolExecutor, wait
 from pathlib import Path
-from typing import List
+from typing import List, NamedTuple, Tuple
 
+import httpx
+from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+from sarvamai.errors import TooManyRequestsError
 from tqdm import tqdm
 
 # import your existing OCR function
-from ocr_service import run_google_ocr
+from ocr_service import GOOGLE_BATCH_MAX_FILES, run_google_ocr, run_google_ocr_batch, run_google_ocr_batch_async, run_sarvam_ocr, \
+    close_google_async_clients, SarvamRateLimitError
+from bulk_manifest import DONE_STATUSES, STATUSES, ManifestWriter, RunManifest
+from bulk_leases import LeaseDir, shard_of
+from bulk_pipeline import STAGES, PostOcrPipeline
 
 # Try to import pypdf for best page counting
 try:
@@ -38,7 +60,10 @@ except Exception:
 
 # ---- settings ----
 DEFAULT_OUT_DIR = Path("ocr_output")
-LOG_CSV = "ocr_run_log.csv"
+LOG_CSV = "ocr_run_log.csv"  # export of the run manifest, rewritten at the end of each run
+RUN_MANIFEST = "ocr_run_manifest.sqlite3"
+PAGE_MANIFEST = "page_count_manifest.json"  # cached page counts, keyed by path + size + mtime
+MAX_THROTTLE_REQUEUES = 10  # per file; throttled attempts don't count against --max-retries
 
 # ---- page-count helpers ----
 def _pdfinfo_pages(pdf_path: Path) -> int:
@@ -92,34 +117,228 @@ def _heuristic_pages(pdf_path: Path) -> int:
     except Exception:
         return 0
 
+_STARTXREF_RE = re.compile(rb"startxref\s+(\d+)")
+_XREF_SUBSECTION_RE = re.compile(rb"(\d+)\s+(\d+)$")
+
+def _read_object(fh, offset: int, limit: int = 1 << 24) -> bytes:
+    """Return the bytes of the object at offset, up to its 'endobj' (or limit bytes)."""
+    fh.seek(offset)
+    buf = b""
+    while len(buf) < limit:
+        block = fh.read(65536)
+        if not block:
+            break
+        buf += block
+        end = buf.find(b"endobj", max(0, len(buf) - len(block) - 6))
+        if end >= 0:
+            return buf[:end]
+    return buf
+
+def _int_entry(obj: bytes, key: bytes, default=None):
+    """
+    Direct integer value of /key in obj, or default if it is missing or an indirect
+    reference ("/Count 12 0 R"). The number must be followed by a non-digit so the
+    lookahead can't be dodged by backtracking into it ("/Count 1" of "12 0 R").
+    """
+    m = re.search(rb"/" + key + rb"\s+(\d+)(?!\d|\s+\d+\s+R)", obj)
+    return int(m.group(1)) if m else default
+
+def _stream_data(obj: bytes) -> bytes:
+    """Decoded data of a stream object (FlateDecode with optional PNG predictor only)."""
+    start = obj.index(b"stream") + len(b"stream")
+    if obj[start:start + 2] == b"\r\n":
+        start += 2
+    elif obj[start:start + 1] in (b"\n", b"\r"):
+        start += 1
+    head = obj[:start]
+    length = _int_entry(head, b"Length")
+    data = obj[start:start + length] if length is not None else obj[start:obj.rindex(b"endstream")]
+    filt = re.search(rb"/Filter\s*\[?\s*/(\w+)", head)
+    if filt:
+        if filt.group(1) != b"FlateDecode" or re.search(rb"/Filter\s*\[\s*/\w+\s*/", head):
+            raise ValueError("unsupported filter")
+        data = zlib.decompressobj().decompress(data)
+    predictor = _int_entry(head, b"Predictor", 1)
+    if predictor >= 10:  # PNG predictors, one filter-type byte per row
+        cols = _int_entry(head, b"Columns", 1)
+        rows, prev = [], bytearray(cols)
+        for r in range(0, len(data), cols + 1):
+            ftype, row = data[r], bytearray(data[r + 1:r + 1 + cols])
+            if ftype == 2:
+                row = bytearray((a + b) & 0xFF for a, b in zip(row, prev))
+            elif ftype != 0:
+                raise ValueError("unsupported PNG predictor row")
+            rows.append(bytes(row))
+            prev = row
+        data = b"".join(rows)
+    elif predictor != 1:
+        raise ValueError("unsupported predictor")
+    return data
+
+def _read_xref_stream(fh, pos: int, offsets: dict):
+    """
+    Parse a cross-reference stream at pos into offsets (object -> byte offset, or
+    (object stream number, index) for compressed objects) and return its dict bytes.
+    Returns None if there is no xref stream at pos.
+    """
+    obj = _read_object(fh, pos)
+    head = obj[:obj.find(b"stream")]
+    if not re.search(rb"/Type\s*/XRef", head):
+        return None
+    w = [int(x) for x in re.search(rb"/W\s*\[([\d\s]+)\]", head).group(1).split()]
+    idx = re.search(rb"/Index\s*\[([\d\s]+)\]", head)
+    idx = [int(x) for x in idx.group(1).split()] if idx else [0, _int_entry(head, b"Size")]
+    data = _stream_data(obj)
+    width = sum(w)
+    field = lambda rec, a, b, default: int.from_bytes(rec[a:b], "big") if b > a else default
+    r = 0
+    for start, count in zip(idx[0::2], idx[1::2]):
+        for num in range(start, start + count):
+            rec = data[r:r + width]
+            r += width
+            kind = field(rec, 0, w[0], 1)
+            f2 = field(rec, w[0], w[0] + w[1], 0)
+            f3 = field(rec, w[0] + w[1], width, 0)
+            if kind == 1:
+                offsets.setdefault(num, f2)
+            elif kind == 2:
+                offsets.setdefault(num, (f2, f3))
+            else:
+                offsets.setdefault(num, None)
+    return head
+
+def _read_xref_section(fh, pos: int, offsets: dict):
+    """
+    Parse the cross-reference section at pos (a classic 'xref' table, possibly with a
+    hybrid /XRefStm, or an xref stream) into offsets; entries already present, i.e.
+    from newer sections, win. Returns the trailer dict bytes, or None if unrecognised.
+    """
+    fh.seek(pos)
+    if fh.readline().strip() != b"xref":
+        return _read_xref_stream(fh, pos, offsets)
+    while True:
+        line_pos = fh.tell()
+        m = _XREF_SUBSECTION_RE.match(fh.readline().strip())
+        if not m:
+            fh.seek(line_pos)
+            break
+        start, count = int(m.group(1)), int(m.group(2))
+        data = fh.read(20 * count)
+        for i in range(count):
+            entry = data[20 * i:20 * i + 18].split()
+            if len(entry) == 3:
+                offsets.setdefault(start + i, int(entry[0]) if entry[2] == b"n" else None)
+    trailer = fh.read(4096)
+    if not trailer.lstrip().startswith(b"trailer"):
+        return None
+    stm = _int_entry(trailer, b"XRefStm")
+    if stm is not None:
+        _read_xref_stream(fh, stm, offsets)
+    return trailer
+
+def _object_body(fh, offsets: dict, num: int) -> bytes:
+    """Bytes of object num, whether stored directly or inside an object stream."""
+    loc = offsets.get(num)
+    if isinstance(loc, int):
+        return _read_object(fh, loc)
+    stm_num, index = loc
+    stm = _read_object(fh, offsets[stm_num])
+    data = _stream_data(stm)
+    first = _int_entry(stm[:stm.find(b"stream")], b"First")
+    header = [int(x) for x in data[:first].split()]
+    starts = header[1::2]
+    if header[2 * index] != num:
+        raise ValueError("object stream index mismatch")
+    end = first + starts[index + 1] if index + 1 < len(starts) else len(data)
+    return data[first + starts[index]:end]
+
+def _xref_page_count(pdf_path: Path) -> int:
+    """
+    Fast page count that reads only the trailer, the cross-reference data, the catalog
+    and the root /Pages node (a few KB for typical scans) and returns its /Count,
+    without parsing the page tree. Handles classic xref tables, xref and object
+    streams, and incremental updates. Returns -1 if the file doesn't fit that shape
+    (encryption, indirect /Count, unusual filters, damage, ...), so the caller can
+    fall back to a full parser.
+    """
+    try:
+        with open(pdf_path, "rb") as fh:
+            fh.seek(0, os.SEEK_END)
+            size = fh.tell()
+            fh.seek(max(0, size - 2048))
+            m = None
+            for m in _STARTXREF_RE.finditer(fh.read()):
+                pass
+            if m is None:
+                return -1
+            xref_pos = int(m.group(1))
+
+            offsets, root, seen = {}, None, set()
+            while xref_pos is not None and xref_pos not in seen and len(seen) < 64:
+                seen.add(xref_pos)
+                trailer = _read_xref_section(fh, xref_pos, offsets)
+                if trailer is None or b"/Encrypt" in trailer:
+                    return -1
+                if root is None:
+                    rm = re.search(rb"/Root\s+(\d+)\s+\d+\s+R", trailer)
+                    root = int(rm.group(1)) if rm else None
+                xref_pos = _int_entry(trailer, b"Prev")
+
+            if offsets.get(root) is None:
+                return -1
+            pm = re.search(rb"/Pages\s+(\d+)\s+\d+\s+R", _object_body(fh, offsets, root))
+            if not pm or offsets.get(int(pm.group(1))) is None:
+                return -1
+            count = _int_entry(_object_body(fh, offsets, int(pm.group(1))), b"Count")
+            return count if count is not None else -1
+    except Exception:
+        return -1
+
 def pdf_page_count(pdf_path: Path) -> int:
     """
     Robust page-count:
+     0) Fast trailer/xref-only /Count lookup
      1) Try pypdf (PdfReader)
      2) Try pdfinfo (poppler)
      3) Heuristic fallback
     Returns integer >= 0. Uses logging.debug to record which method produced the result.
     """
+    # 0) fast path: no full parse
+    n = _xref_page_count(pdf_path)
+    if n >= 0:
+        logging.debug("pdf_page_count: xref -> %d for %s", n, pdf_path)
+        return n
+
     # 1) pypdf if available
     if PdfReader is not None:
         try:
-            reader = PdfReader(str(pdf_path))
-            # prefer explicit pages list if available
-            try:
-                n = len(reader.pages)
-                if isinstance(n, int) and n >= 0:
-                    logging.debug("pdf_page_count: pypdf -> %d for %s", n, pdf_path)
-                    return int(n)
-            except Exception:
-                pass
-            # older versions might have getNumPages
-            if hasattr(reader, "getNumPages"):
+            # open the file ourselves so pypdf reads lazily instead of loading it all into memory
+            with open(pdf_path, "rb") as fh:
+                reader = PdfReader(fh)
+                # /Count of the root page-tree node avoids flattening the whole tree
                 try:
-                    n = reader.getNumPages()
-                    logging.debug("pdf_page_count: pypdf.getNumPages -> %d for %s", n, pdf_path)
-                    return int(n)
+                    n = int(reader.trailer["/Root"]["/Pages"]["/Count"])
+                    if n >= 0:
+                        logging.debug("pdf_page_count: pypdf /Count -> %d for %s", n, pdf_path)
+                        return n
                 except Exception:
                     pass
+                # prefer explicit pages list if available
+                try:
+                    n = len(reader.pages)
+                    if isinstance(n, int) and n >= 0:
+                        logging.debug("pdf_page_count: pypdf -> %d for %s", n, pdf_path)
+                        return int(n)
+                except Exception:
+                    pass
+                # older versions might have getNumPages
+                if hasattr(reader, "getNumPages"):
+                    try:
+                        n = reader.getNumPages()
+                        logging.debug("pdf_page_count: pypdf.getNumPages -> %d for %s", n, pdf_path)
+                        return int(n)
+                    except Exception:
+                        pass
         except Exception:
             # Try decrypting with empty password if encrypted (common)
             try:
@@ -147,6 +366,71 @@ def pdf_page_count(pdf_path: Path) -> int:
     logging.debug("pdf_page_count: heuristic -> %d for %s", n, pdf_path)
     return int(n)
 
+# ---- page-count manifest ----
+def load_page_manifest(path: Path) -> dict:
+    """Return {pdf_path_str: [size, mtime_ns, pages]} from a previous run, or {} if none/unreadable."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+    except Exception:
+        logging.warning("Ignoring unreadable page-count manifest %s", path)
+        return {}
+
+def save_page_manifest(path: Path, manifest: dict):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh)
+    os.replace(tmp, path)
+
+def _count_pages_task(pdf_path_str: str) -> int:
+    # module-level so it can be used with ProcessPoolExecutor
+    try:
+        return pdf_page_count(Path(pdf_path_str))
+    except Exception:
+        return 0
+
+def count_pages(pdfs: List[Path], manifest_path: Path, workers: int) -> List[Tuple[Path, int]]:
+    """
+    Page counts for pdfs, in order. Counts whose file size and mtime match the manifest are
+    reused; the rest are counted on a process pool and written back to the manifest
+    (also when interrupted, so a rerun picks up where this one stopped).
+    """
+    manifest = load_page_manifest(manifest_path)
+    counts = {}
+    todo = []
+    for pth in pdfs:
+        try:
+            st = pth.stat()
+        except OSError:
+            counts[pth] = 0
+            continue
+        entry = manifest.get(str(pth))
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            counts[pth] = entry[2]
+        else:
+            todo.append((pth, st.st_size, st.st_mtime_ns))
+    logging.info("Page counts: %d from manifest, %d to count", len(pdfs) - len(todo), len(todo))
+
+    if todo:
+        paths = [str(pth) for pth, _, _ in todo]
+        ex = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(todo) > 1 else None
+        try:
+            if ex is not None:
+                results = ex.map(_count_pages_task, paths, chunksize=max(1, min(64, len(paths) // (workers * 4))))
+            else:
+                results = map(_count_pages_task, paths)
+            for (pth, size, mtime_ns), pages in tqdm(zip(todo, results), total=len(todo), unit="file", desc="Counting pages"):
+                counts[pth] = pages
+                manifest[str(pth)] = [size, mtime_ns, pages]
+        finally:
+            save_page_manifest(manifest_path, manifest)
+            if ex is not None:
+                ex.shutdown(cancel_futures=True)
+
+    return [(pth, counts[pth]) for pth in pdfs]
+
 # ---- utilities ----
 def find_pdfs(root: Path) -> List[Path]:
     return sorted([p for p in root.rglob("*.pdf") if p.is_file()])
@@ -176,6 +460,129 @@ def _join_pages_with_separators(pages_iterable):
         parts.append(f"=== {i} ===\n{str(ptxt).strip()}")
     return "\n\n".join(parts)
 
+# ---- rate control ----
+class TokenBucket:
+    """
+    Pages-per-minute budget for the whole run. Lives in the dispatcher (main process), so
+    it covers all workers in both thread and process mode. A job larger than the burst
+    may start once the bucket is full, leaving it in debt, so big volumes aren't starved.
+    """
+
+    def __init__(self, pages_per_minute: float, burst_pages: float = 0):
+        self.rate = pages_per_minute / 60.0
+        self.capacity = burst_pages or pages_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, pages: int) -> float:
+        """Take pages' worth of tokens and return 0, or return seconds until they'd be available."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        need = min(pages, self.capacity)
+        if self.tokens >= need:
+            self.tokens -= pages
+            return 0.0
+        return (need - self.tokens) / self.rate
+
+class AimdController:
+    """
+    Additive-increase / multiplicative-decrease limit on in-flight jobs.
+    +1 job per limit's worth of healthy completions; halved on throttling errors
+    (with a global cooldown that grows while throttling persists); cut to 80% when
+    recent seconds-per-page (fast EWMA) rises above latency_factor x the run's
+    long-term level (slow EWMA). Only jobs submitted after the last cut can cause
+    another, so one burst of failures from jobs already in flight counts once.
+    """
+
+    WARMUP = 10  # completions before latency is trusted
+
+    def __init__(self, initial: int, maximum: int, latency_factor: float = 2.0, sleep_base: float = 1.0):
+        self.minimum = 1
+        self.maximum = maximum
+        self.limit = float(max(self.minimum, min(initial, maximum)))
+        self.latency_factor = latency_factor
+        self.sleep_base = sleep_base
+        self.fast = None  # seconds per page, recent
+        self.slow = None  # seconds per page, long-term
+        self.samples = 0
+        self.last_decrease = 0.0
+        self.cooldown_until = 0.0
+        self.throttle_streak = 0
+
+    @property
+    def max_in_flight(self) -> int:
+        return int(self.limit)
+
+    def cooldown(self) -> float:
+        return max(0.0, self.cooldown_until - time.monotonic())
+
+    def _set_limit(self, limit: float, reason: str):
+        before = self.max_in_flight
+        self.limit = max(self.minimum, min(self.maximum, limit))
+        if self.max_in_flight != before:
+            logging.info("AIMD: %s -> in-flight limit %d", reason, self.max_in_flight)
+
+    def _decrease(self, factor: float, submitted: float, reason: str):
+        if submitted < self.last_decrease:
+            return
+        self.last_decrease = time.monotonic()
+        self._set_limit(self.limit * factor, reason)
+
+    def on_success(self, submitted: float, seconds: float, pages: int):
+        self.throttle_streak = 0
+        spp = seconds / max(1, pages)
+        self.samples += 1
+        self.fast = spp if self.fast is None else 0.7 * self.fast + 0.3 * spp
+        self.slow = spp if self.slow is None else 0.97 * self.slow + 0.03 * spp
+        if self.samples > self.WARMUP and self.fast > self.latency_factor * self.slow:
+            self._decrease(0.8, submitted, f"latency {self.fast:.2f} s/page (usual {self.slow:.2f})")
+        else:
+            self._set_limit(self.limit + 1.0 / self.limit, "healthy")
+
+    def on_throttle(self, submitted: float):
+        self.throttle_streak += 1
+        wait = min(60.0, self.sleep_base * (2 ** (self.throttle_streak - 1)))
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + wait)
+        self._decrease(0.5, submitted, f"throttled (cooldown {wait:.1f}s)")
+
+def _is_throttle_error(exc: Exception) -> bool:
+    """True for provider quota / rate-limit errors, judged by exception type or HTTP status
+    (never by message text, which may contain e.g. "429" in a file name)."""
+    if isinstance(exc, (TooManyRequests, ResourceExhausted, TooManyRequestsError, SarvamRateLimitError)):
+        return True
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 429
+
+def _write_output(outpath: Path, res: str) -> bool:
+    """Atomically write res to outpath; False (nothing written) if outpath appeared meanwhile."""
+    # Race-check: if file exists by the time we write, skip to avoid overwrite
+    if outpath.exists():
+        return False
+    # atomic write (temp + replace)
+    tmp = outpath.with_suffix(outpath.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(res)
+    try:
+        os.replace(tmp, outpath)
+    except Exception:
+        # fallback to simple write
+        write_text(outpath, res)
+    return True
+
+class TaskResult(NamedTuple):
+    pdf_path: str
+    outpath: str
+    pages: int
+    status: str          # SUCCESS, FAIL, THROTTLED or SKIPPED-RACE
+    error: str
+    start_ts: str
+    end_ts: str
+    worker: str          # "pid/thread"
+    attempts: int        # provider calls made by this task
+    error_class: str     # exception class of the last error, "" on success
+
 # This wrapper is picklable (module-level) so it can be used with ProcessPoolExecutor
 def worker_task(args_tuple):
     """
@@ -187,14 +594,17 @@ def worker_task(args_tuple):
        out_dir_str,
        max_retries,
        sleep_base,
-       pages_int
+       pages_int,
+       provider,                # "google" or "sarvam"
+       filter_headers_footers   # Sarvam only
     )
-    returns (pdf_path_str, outpath_str, pages_int, status_str, error_message_or_empty, start_ts, end_ts)
-    Note: pdf_path_str/outpath_str in the returned tuple are full paths (used internally),
+    returns a TaskResult
+    Note: pdf_path/outpath in the result are full paths (used internally),
     but the main runner writes only basenames into logs/CSV for readability.
     """
     import traceback, time, os, threading, datetime
-    pdf_path_str, api_key, include_page_numbers, root_str, out_dir_str, max_retries, sleep_base, pages = args_tuple
+    (pdf_path_str, api_key, include_page_numbers, root_str, out_dir_str, max_retries, sleep_base, pages,
+     provider, filter_headers_footers) = args_tuple
     pdf_path = Path(pdf_path_str)
     out_dir = Path(out_dir_str)
     root = Path(root_str)
@@ -203,31 +613,25 @@ def worker_task(args_tuple):
 
     pid = os.getpid()
     tname = threading.current_thread().name
+    worker = f"{pid}/{tname}"
 
     start_ts = datetime.datetime.utcnow().isoformat() + "Z"
     logging.info("START: %s PID=%d THREAD=%s pages=%d", pdf_path.name, pid, tname, pages)
 
     attempt = 0
     last_exc = ""
+    last_exc_class = ""
     while attempt <= max_retries:
         try:
-            res = run_google_ocr(pdf_path, api_key=api_key, include_page_numbers=include_page_numbers)
+            if provider == "sarvam":
+                res, _, _ = run_sarvam_ocr(pdf_path, api_key, include_page_numbers, filter_headers_footers)
+            else:
+                res, _, _ = run_google_ocr(pdf_path, api_key=api_key, include_page_numbers=include_page_numbers)
 
-            # Race-check: if file exists by the time we write, skip to avoid overwrite
-            if outpath.exists():
+            if not _write_output(outpath, res):
                 end_ts = datetime.datetime.utcnow().isoformat() + "Z"
                 logging.info("SKIP-WRITE (exists): %s PID=%d THREAD=%s", outpath.name, pid, tname)
-                return (str(pdf_path), str(outpath), pages, "SKIPPED-RACE", "", start_ts, end_ts)
-
-            # atomic write (temp + replace)
-            tmp = outpath.with_suffix(outpath.suffix + ".tmp")
-            with open(tmp, "w", encoding="utf-8") as fh:
-                fh.write(res)
-            try:
-                os.replace(tmp, outpath)
-            except Exception:
-                # fallback to simple write
-                write_text(outpath, res)
+                return TaskResult(str(pdf_path), str(outpath), pages, "SKIPPED-RACE", "", start_ts, end_ts, worker, attempt + 1, "")
 
             end_ts = datetime.datetime.utcnow().isoformat() + "Z"
             try:
@@ -237,10 +641,21 @@ def worker_task(args_tuple):
             except Exception:
                 elapsed = None
             logging.info("END: %s PID=%d THREAD=%s status=SUCCESS pages=%d elapsed=%.2f s", pdf_path.name, pid, tname, pages, elapsed if elapsed else 0.0)
-            return (str(pdf_path), str(outpath), pages, "SUCCESS", "", start_ts, end_ts)
-        except Exception:
+            return TaskResult(str(pdf_path), str(outpath), pages, "SUCCESS", "", start_ts, end_ts, worker, attempt + 1, "")
+        except Exception as exc:
+            if _is_throttle_error(exc):
+                # hand back to the dispatcher, which backs off globally and requeues
+                end_ts = datetime.datetime.utcnow().isoformat() + "Z"
+                logging.warning("THROTTLED: %s PID=%d THREAD=%s (%s)", pdf_path.name, pid, tname, exc)
+                return TaskResult(str(pdf_path), str(outpath), pages, "THROTTLED", str(exc), start_ts, end_ts, worker,
+                                  attempt + 1, type(exc).__name__)
             attempt += 1
             last_exc = traceback.format_exc()
+            last_exc_class = type(exc).__name__
+            if str(exc) == "QUOTA_EXHAUSTED":
+                # out of Sarvam credits: retrying can't help
+                last_exc_class = "QUOTA_EXHAUSTED"
+                break
             wait = sleep_base * (2 ** (attempt - 1))
             logging.warning("RETRY %d for %s (sleep %.1fs)", attempt, pdf_path.name, wait)
             time.sleep(wait)
@@ -253,23 +668,274 @@ def worker_task(args_tuple):
     except Exception:
         elapsed = None
     logging.error("END: %s PID=%d THREAD=%s status=FAIL pages=%d elapsed=%.2f s", pdf_path.name, pid, tname, pages, elapsed if elapsed else 0.0)
-    return (str(pdf_path), str(outpath), pages, "FAIL", last_exc, start_ts, end_ts)
+    return TaskResult(str(pdf_path), str(outpath), pages, "FAIL", last_exc, start_ts, end_ts, worker, attempt, last_exc_class)
+
+def pack_worker_task(unit):
+    """
+    Run several small PDFs (worker_task argument tuples, Google only) through a single
+    Vision operation, then split the results back out per file. Retries, throttling,
+    skip-if-exists and atomic writes behave as in worker_task, for the pack as a whole.
+    Returns a list of TaskResult in unit order.
+    """
+    import traceback, time, os, threading, datetime
+    _, api_key, include_page_numbers, root_str, out_dir_str, max_retries, sleep_base, _, _, _ = unit[0]
+    pdf_paths = [Path(t[0]) for t in unit]
+    outpaths = [ensure_outpath(Path(root_str), p, Path(out_dir_str)) for p in pdf_paths]
+    pages = [t[7] for t in unit]
+
+    pid = os.getpid()
+    tname = threading.current_thread().name
+    worker = f"{pid}/{tname}"
+    start_ts = datetime.datetime.utcnow().isoformat() + "Z"
+    logging.info("START PACK: %d files, %d pages PID=%d THREAD=%s", len(unit), sum(pages), pid, tname)
+
+    def results(status_for, error, attempts, error_class):
+        end_ts = datetime.datetime.utcnow().isoformat() + "Z"
+        return [TaskResult(str(p), str(o), n, status_for(i), error, start_ts, end_ts, worker, attempts, error_class)
+                for i, (p, o, n) in enumerate(zip(pdf_paths, outpaths, pages))]
+
+    attempt = 0
+    last_exc = ""
+    last_exc_class = ""
+    while attempt <= max_retries:
+        try:
+            texts = run_google_ocr_batch(pdf_paths, api_key, include_page_numbers)
+            written = [_write_output(o, res) for o, (res, _, _) in zip(outpaths, texts)]
+            logging.info("END PACK: %d files PID=%d THREAD=%s status=SUCCESS", len(unit), pid, tname)
+            return results(lambda i: "SUCCESS" if written[i] else "SKIPPED-RACE", "", attempt + 1, "")
+        except Exception as exc:
+            if _is_throttle_error(exc):
+                logging.warning("THROTTLED PACK: %d files PID=%d THREAD=%s (%s)", len(unit), pid, tname, exc)
+                return results(lambda i: "THROTTLED", str(exc), attempt + 1, type(exc).__name__)
+            attempt += 1
+            last_exc = traceback.format_exc()
+            last_exc_class = type(exc).__name__
+            wait = sleep_base * (2 ** (attempt - 1))
+            logging.warning("RETRY %d for pack of %d files starting %s (sleep %.1fs)", attempt, len(unit), pdf_paths[0].name, wait)
+            time.sleep(wait)
+
+    logging.error("END PACK: %d files PID=%d THREAD=%s status=FAIL", len(unit), pid, tname)
+    return results(lambda i: "FAIL", last_exc, attempt, last_exc_class)
+
+def run_unit(unit):
+    """Executor entry point: a unit is a list of worker_task tuples (one file, or a pack)."""
+    if len(unit) == 1:
+        return [worker_task(unit[0])]
+    return pack_worker_task(unit)
+
+def pack_units(tasks: list, pack_pages: int, pack_file_pages: int) -> list:
+    """
+    Group tasks into units for run_unit. Files of at most pack_file_pages pages are packed
+    together until a pack reaches pack_pages pages or GOOGLE_BATCH_MAX_FILES files; larger
+    files (and everything when pack_pages is 0) run alone.
+    """
+    if pack_pages <= 0:
+        return [[t] for t in tasks]
+    units, pack, pack_total = [], [], 0
+    for t in tasks:
+        if t[7] > pack_file_pages:
+            units.append([t])
+            continue
+        pack.append(t)
+        pack_total += t[7]
+        if pack_total >= pack_pages or len(pack) >= GOOGLE_BATCH_MAX_FILES:
+            units.append(pack)
+            pack, pack_total = [], 0
+    if pack:
+        units.append(pack)
+    return units
+
+# ---- async mode ----
+async def run_unit_async(unit, worker: str, sarvam_executor=None):
+    """
+    Coroutine counterpart of run_unit for --mode async, returning the same list of TaskResult:
+    same retries with backoff, throttle hand-back, QUOTA_EXHAUSTED stop, skip-if-exists and
+    atomic writes, but a job waiting on the provider holds no thread. Google goes through
+    ocr_service.run_google_ocr_batch_async. The Sarvam SDK is synchronous, so a Sarvam job
+    runs whole on sarvam_executor and holds one of its threads throughout: async mode does
+    not raise Sarvam concurrency above what thread mode reaches with the same --workers.
+    """
+    import traceback, datetime
+    _, api_key, include_page_numbers, root_str, out_dir_str, max_retries, sleep_base, _, provider, filter_headers_footers = unit[0]
+    pdf_paths = [Path(t[0]) for t in unit]
+    outpaths = [ensure_outpath(Path(root_str), p, Path(out_dir_str)) for p in pdf_paths]
+    pages = [t[7] for t in unit]
+    label = pdf_paths[0].name if len(unit) == 1 else f"pack of {len(unit)} files starting {pdf_paths[0].name}"
+
+    start_ts = datetime.datetime.utcnow().isoformat() + "Z"
+    logging.info("START: %s WORKER=%s pages=%d", label, worker, sum(pages))
+
+    def results(status_for, error, attempts, error_class):
+        end_ts = datetime.datetime.utcnow().isoformat() + "Z"
+        return [TaskResult(str(p), str(o), n, status_for(i), error, start_ts, end_ts, worker, attempts, error_class)
+                for i, (p, o, n) in enumerate(zip(pdf_paths, outpaths, pages))]
+
+    attempt = 0
+    last_exc = ""
+    last_exc_class = ""
+    while attempt <= max_retries:
+        try:
+            if provider == "sarvam":
+                texts = [await asyncio.get_running_loop().run_in_executor(
+                    sarvam_executor, run_sarvam_ocr, pdf_paths[0], api_key, include_page_numbers, filter_headers_footers)]
+            else:
+                texts = await run_google_ocr_batch_async(pdf_paths, api_key, include_page_numbers)
+            written = [await asyncio.to_thread(_write_output, o, res) for o, (res, _, _) in zip(outpaths, texts)]
+            logging.info("END: %s WORKER=%s status=SUCCESS", label, worker)
+            return results(lambda i: "SUCCESS" if written[i] else "SKIPPED-RACE", "", attempt + 1, "")
+        except Exception as exc:
+            if _is_throttle_error(exc):
+                logging.warning("THROTTLED: %s WORKER=%s (%s)", label, worker, exc)
+                return results(lambda i: "THROTTLED", str(exc), attempt + 1, type(exc).__name__)
+            attempt += 1
+            last_exc = traceback.format_exc()
+            last_exc_class = type(exc).__name__
+            if str(exc) == "QUOTA_EXHAUSTED":
+                last_exc_class = "QUOTA_EXHAUSTED"
+                break
+            wait = sleep_base * (2 ** (attempt - 1))
+            logging.warning("RETRY %d for %s (sleep %.1fs)", attempt, label, wait)
+            await asyncio.sleep(wait)
+
+    logging.error("END: %s WORKER=%s status=FAIL", label, worker)
+    return results(lambda i: "FAIL", last_exc, attempt, last_exc_class)
+
+class AsyncExecutor:
+    """
+    Executor for --mode async: one event loop on a background thread runs each submitted
+    coroutine function, at most max_workers at a time. The cap is a counting semaphore whose
+    permits are numbered (an asyncio.Queue of slot ids), so results carry a stable worker id
+    for the utilization report. submit() returns a concurrent.futures.Future, so the
+    dispatcher (AIMD, page budget, leases, manifest) is the same as for the other modes.
+    """
+
+    def __init__(self, max_workers: int, io_threads: int = 32):
+        self._loop = asyncio.new_event_loop()
+        # GCS calls and file writes (asyncio.to_thread) share this small pool; blocking Sarvam
+        # jobs get their own threads (one per slot, started on demand) so they can't starve it
+        self._loop.set_default_executor(ThreadPoolExecutor(max_workers=min(io_threads, max_workers), thread_name_prefix="ocr-io"))
+        self._sarvam_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-sarvam")
+        self._thread = threading.Thread(target=self._loop.run_forever, name="ocr-event-loop", daemon=True)
+        self._thread.start()
+        self._futures = set()
+
+        async def make_slots():
+            slots = asyncio.Queue()
+            for i in range(max_workers):
+                slots.put_nowait(i)
+            return slots
+        self._slots = asyncio.run_coroutine_threadsafe(make_slots(), self._loop).result()
+
+    async def _run(self, fn, args):
+        slot = await self._slots.get()
+        try:
+            return await fn(*args, worker=f"{os.getpid()}/async-{slot}", sarvam_executor=self._sarvam_executor)
+        finally:
+            self._slots.put_nowait(slot)
+
+    def submit(self, fn, *args):
+        fut = asyncio.run_coroutine_threadsafe(self._run(fn, args), self._loop)
+        self._futures.add(fut)
+        fut.add_done_callback(self._futures.discard)
+        return fut
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # like ThreadPoolExecutor: let submitted jobs finish, then stop the loop
+        wait(list(self._futures))
+        asyncio.run_coroutine_threadsafe(close_google_async_clients(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.run_until_complete(self._loop.shutdown_default_executor())
+        self._loop.close()
+        self._sarvam_executor.shutdown()
+        return False
+
+def log_worker_utilization(worker_busy: dict, wall_secs: float, pages_total: int):
+    """Log overall pages/s and, per worker, busy time as a share of the run's wall time."""
+    if not worker_busy or wall_secs <= 0:
+        return
+    logging.info("Run: %d pages in %.1fs (%.2f pages/s) across %d workers",
+                 pages_total, wall_secs, pages_total / wall_secs, len(worker_busy))
+    total_busy = 0.0
+    for worker, (busy, files, pages) in sorted(worker_busy.items()):
+        total_busy += busy
+        logging.info("  worker %-28s %5.1f%% busy  %4d files  %6d pages  %.2f pages/s",
+                     worker, 100 * busy / wall_secs, files, pages, pages / busy if busy else 0.0)
+    logging.info("Mean worker utilization: %.1f%%", 100 * total_busy / (wall_secs * len(worker_busy)))
+
+def _parse_stages(value: str):
+    stages = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [v for v in stages if v not in STAGES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown stage(s) {','.join(unknown)}; choose from {','.join(STAGES)}")
+    return stages
+
+def _parse_shard(value: str):
+    try:
+        i, n = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected I/N, e.g. 0/4")
+    if not 0 <= i < n:
+        raise argparse.ArgumentTypeError("need 0 <= I < N")
+    return i, n
 
 # ---- main runner ----
 def main():
-    p = argparse.ArgumentParser(description="Bulk runner for Google Vision OCR using your ocr_service.run_google_ocr (page-aware)")
+    p = argparse.ArgumentParser(description="Bulk runner for Google Vision / Sarvam OCR using ocr_service (page-aware)")
     p.add_argument("--root", required=True, type=Path, help="Root folder containing subfolders of PDFs")
-    p.add_argument("--workers", type=int, default=10, help="Number of parallel workers")
-    p.add_argument("--mode", choices=("thread", "process"), default="thread",
-                   help="Concurrency mode: 'thread' (lighter) or 'process' (more isolation)")
+    p.add_argument("--workers", type=int, default=10, help="Maximum number of parallel workers")
+    p.add_argument("--initial-workers", type=int, default=4,
+                   help="In-flight jobs to start with; adjusted between 1 and --workers by latency and throttling")
+    p.add_argument("--pages-per-minute", type=float, default=0, help="Provider page quota to stay under (0 = unlimited)")
+    p.add_argument("--burst-pages", type=float, default=0, help="Token-bucket burst size in pages (default: one minute's quota)")
+    p.add_argument("--shard", type=_parse_shard, default=None, metavar="I/N",
+                   help="Process only shard I of N (0-based), by a stable hash of each PDF's path under --root")
+    p.add_argument("--lease-dir", type=Path, default=None,
+                   help="Shared directory for lease files, so several runners/hosts can drain one tree without duplicate OCR")
+    p.add_argument("--lease-ttl", type=float, default=600.0,
+                   help="Seconds after which a lease not renewed (crashed node) may be reclaimed; files leased "
+                        "elsewhere are rechecked this often until they are done or reclaimed")
+    p.add_argument("--order", choices=("largest", "path"), default="largest",
+                   help="Submission order: 'largest' page count first (shortest makespan) or sorted 'path'")
+    p.add_argument("--latency-factor", type=float, default=2.0,
+                   help="Shrink concurrency when recent seconds/page exceeds this multiple of the run's "
+                        "long-term average (EWMA)")
+    p.add_argument("--mode", choices=("thread", "process", "async"), default="thread",
+                   help="Concurrency mode: 'thread' (lighter), 'process' (more isolation) or 'async' "
+                        "(coroutines on one event loop; --workers can then be in the thousands)")
     p.add_argument("--out-dir", type=Path, default=DEFAULT_OUT_DIR, help="Output directory for .txt files")
     p.add_argument("--api-key", default=os.getenv("VISION_API_KEY", ""), help="Vision API key (or leave blank to use ADC)")
+    p.add_argument("--provider", choices=("google", "sarvam"), default="google",
+                   help="OCR provider (ocr_service.run_google_ocr / run_sarvam_ocr); Sarvam needs --api-key")
+    p.add_argument("--filter-headers-footers", action="store_true", help="Sarvam only: drop detected headers/footers")
+    p.add_argument("--pack-pages", type=int, default=0,
+                   help=f"Google only: pack small PDFs into one Vision operation of up to this many pages "
+                        f"(and {GOOGLE_BATCH_MAX_FILES} files); 0 = one operation per PDF")
+    p.add_argument("--pack-file-pages", type=int, default=5, help="Largest PDF (in pages) eligible for packing")
+    p.add_argument("--pipeline", type=_parse_stages, default=None,
+                   help=f"Post-OCR stages run on a process pool as each .txt lands, writing sidecars "
+                        f"(comma-separated subset of {','.join(STAGES)}; see bulk_pipeline.py)")
+    p.add_argument("--pipeline-workers", type=int, default=os.cpu_count() or 1, help="Processes for --pipeline")
+    p.add_argument("--pipeline-from-scheme", default="IAST", help="Scheme of the OCR text when 'detect' is off or inconclusive")
+    p.add_argument("--pipeline-to-scheme", default="IAST", help="Target scheme of the 'transliterate' stage")
+    p.add_argument("--pipeline-resplit", default="resplit_lite_keep_mid", help="resplit_option for the 'meter' stage")
     p.add_argument("--include-page-numbers", action="store_true", help="Insert page separators '=== n ===' where possible")
     p.add_argument("--dry-run", action="store_true", help="List files (with page counts) and exit")
     p.add_argument("--max-retries", type=int, default=3, help="Max retries per file on error")
     p.add_argument("--sleep-base", type=float, default=1.0, help="Base seconds for exponential backoff")
-    p.add_argument("--log-csv", default=LOG_CSV, help="CSV log path for successes/errors")
+    p.add_argument("--log-csv", default=LOG_CSV, help="CSV export of the run manifest, rewritten at the end of each run")
+    p.add_argument("--manifest", type=Path, default=Path(RUN_MANIFEST),
+                   help="SQLite run manifest with per-file state, attempts, timings and errors (resume source)")
+    p.add_argument("--retry-failed", action="store_true", help="Also process files whose last run ended in FAIL")
+    p.add_argument("--only-status", type=lambda v: set(v.upper().split(",")), default=None,
+                   help=f"Process only files in these manifest states (comma-separated: {','.join(STATUSES)})")
     p.add_argument("--show-first", type=int, default=20, help="In dry-run show per-file page counts for the first N files")
+    p.add_argument("--page-manifest", type=Path, default=Path(PAGE_MANIFEST),
+                   help="JSON cache of page counts keyed by path, size and mtime (reused across runs)")
+    p.add_argument("--count-workers", type=int, default=os.cpu_count() or 1, help="Processes used to count pages")
     args = p.parse_args()
 
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
@@ -281,23 +947,28 @@ def main():
     if not root.exists():
         logging.error("Root folder does not exist: %s", root)
         sys.exit(1)
+    if args.provider == "sarvam" and not api_key:
+        logging.error("--provider sarvam needs --api-key")
+        sys.exit(1)
+    if args.provider == "sarvam" and args.pack_pages:
+        logging.error("--pack-pages is only supported with --provider google")
+        sys.exit(1)
 
     pdfs = find_pdfs(root)
     logging.info("Found %d PDF files under %s", len(pdfs), root)
 
-    # Count pages for each PDF (this can take a little time on large sets).
-    logging.info("Counting pages for each PDF (this may take a moment)...")
-    pdfs_with_pages = []
-    total_pages = 0
-    for pth in pdfs:
-        try:
-            pages = pdf_page_count(pth)
-        except Exception:
-            pages = 0
-        pdfs_with_pages.append((pth, pages))
-        total_pages += pages
+    # Static sharding by a stable hash of the root-relative path, before any page counting.
+    if args.shard is not None:
+        shard_i, shard_n = args.shard
+        pdfs = [pth for pth in pdfs if shard_of(pth.relative_to(root).as_posix(), shard_n) == shard_i]
+        logging.info("Shard %d/%d: %d PDF files", shard_i, shard_n, len(pdfs))
+
+    # Count pages for each PDF (in parallel; unchanged files come from the manifest).
+    pdfs_with_pages = count_pages(pdfs, args.page_manifest, args.count_workers)
+    total_pages = sum(pages for _, pages in pdfs_with_pages)
 
     if args.dry_run:
+        manifest = RunManifest(args.manifest, read_only=True)  # a dry run never changes the manifest
         print(f"DRY RUN: {len(pdfs_with_pages)} PDFs found under {root}")
         print(f"Total pages across all PDFs: {total_pages}")
         print(f"Average pages per PDF: {total_pages / max(1, len(pdfs_with_pages)):.2f}")
@@ -305,100 +976,240 @@ def main():
         print(f"\nFirst {show_n} files with page counts:")
         for pth, pages in pdfs_with_pages[:show_n]:
             print(f"  {pth.name}  — {pages} pages")
+        print(f"\nManifest {args.manifest} (all runs):")
+        for status, (n, pages) in sorted(manifest.status_counts().items()):
+            print(f"  {status:10} {n:6} files  {pages:8} pages")
+        manifest.close()
         print("\nDry-run: done.")
         return
 
+    manifest = RunManifest(args.manifest)
+    sole_runner = manifest.claim_run()
+    if not sole_runner:
+        logging.warning("Another runner is using manifest %s; its RUNNING files are left as they are", args.manifest)
+    manifest.sync(((pth, out_dir / pth.relative_to(root).with_suffix(".txt"), pages) for pth, pages in pdfs_with_pages),
+                  reset_running=sole_runner)
+
     # Ensure out_dir exists up front
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    # write header to CSV log (append mode). New header includes start/end/duration.
-    header_needed = not Path(args.log_csv).exists()
-    with open(args.log_csv, "a", newline="", encoding="utf-8") as csvf:
-        writer = csv.writer(csvf)
-        if header_needed:
-            writer.writerow(["timestamp", "pdf_name", "out_name", "pages", "status", "error", "start_ts", "end_ts", "duration_s"])
+    # Select work from the manifest: by default everything not yet done and not failed
+    # (--retry-failed adds FAIL; --only-status picks exact states), and skip any file
+    # that already has .txt output.
+    states = manifest.states()
+    writer = ManifestWriter(args.manifest)
+    writer.start()
+    pipeline = None
+    if args.pipeline:
+        pipeline = PostOcrPipeline(args.pipeline, args.pipeline_workers, args.pipeline_from_scheme,
+                                   args.pipeline_to_scheme, args.pipeline_resplit)
+
+    def pipeline_catch_up(outpath: Path):
+        # outputs from earlier runs go through the pipeline too, unless already processed
+        if pipeline is not None and outpath.exists() and not pipeline.is_done(outpath):
+            pipeline.submit(outpath)
 
-    # Prepare tasks and skip any that already have .txt output.
     tasks = []
     pages_in_total = 0
     skipped_count = 0
-
-    # We'll report total progress over all PDFs (including skipped) so the user sees overall completion.
-    total_files = len(pdfs_with_pages)
-
-    # Use tqdm to track the whole set
-    pbar = tqdm(total=total_files, unit="file", desc="Overall progress")
+    excluded_count = 0
 
     for pth, pages in pdfs_with_pages:
+        status = states[str(pth)].status
+        if args.only_status is not None:
+            if status not in args.only_status:
+                excluded_count += 1
+                continue
+        elif status in DONE_STATUSES or (status == "FAIL" and not args.retry_failed):
+            excluded_count += 1
+            if status in DONE_STATUSES:
+                pipeline_catch_up(ensure_outpath(root, pth, out_dir))
+            continue
         outpath = ensure_outpath(root, pth, out_dir)
         if outpath.exists():
-            # log skip to CSV (use basenames)
-            with open(args.log_csv, "a", newline="", encoding="utf-8") as csvf:
-                writer = csv.writer(csvf)
-                writer.writerow([time.strftime("%Y-%m-%d %H:%M:%S"), pth.name, outpath.name, pages, "SKIPPED", ""])
+            pipeline_catch_up(outpath)
+            writer.mark_skipped(str(pth))
             skipped_count += 1
             logging.info("SKIP (exists): %s -> %s", pth.name, outpath.name)
-            pbar.update(1)
             continue
         # otherwise queue task
-        tasks.append((str(pth), api_key, args.include_page_numbers, str(root), str(out_dir), args.max_retries, args.sleep_base, int(pages)))
+        tasks.append((str(pth), api_key, args.include_page_numbers, str(root), str(out_dir), args.max_retries, args.sleep_base, int(pages),
+                      args.provider, args.filter_headers_footers))
         pages_in_total += int(pages)
 
-    logging.info("Prepared %d tasks (skipped %d) covering %d total pages.", len(tasks), skipped_count, pages_in_total)
-    logging.info("Starting %s executor with %d workers", args.mode, args.workers)
+    # Longest job first: with the big volumes started early, the tail of the run is made
+    # of small files that spread evenly over the workers (minimizes makespan).
+    if args.order == "largest":
+        tasks.sort(key=lambda t: t[7], reverse=True)
+    units = pack_units(tasks, args.pack_pages, args.pack_file_pages)
+    if args.order == "largest":
+        units.sort(key=lambda u: sum(t[7] for t in u), reverse=True)
 
-    executor_cls = ThreadPoolExecutor if args.mode == "thread" else ProcessPoolExecutor
+    # Progress over all PDFs (including skipped) in pages, so rate and ETA are in pages/s;
+    # skipped pages count as the starting point so they don't inflate the rate.
+    pbar = tqdm(total=total_pages, initial=total_pages - pages_in_total, unit="page", desc="Overall progress")
+    files_done = skipped_count + excluded_count
+    pbar.set_postfix(files=f"{files_done}/{len(pdfs_with_pages)}")
 
-    # Submit
-    futures = []
-    with executor_cls(max_workers=args.workers) as ex:
-        for t in tasks:
-            futures.append(ex.submit(worker_task, t))
+    logging.info("Prepared %d tasks in %d units (skipped %d, %d not selected by manifest state) covering %d total pages.",
+                 len(tasks), len(units), skipped_count, excluded_count, pages_in_total)
+    logging.info("Starting %s executor with up to %d workers (%d in flight to start, %s pages/min)",
+                 args.mode, args.workers, min(args.initial_workers, args.workers), args.pages_per_minute or "unlimited")
 
-        # Each time a future completes, update the pbar (skipped files were already counted).
-        for fut in as_completed(futures):
-            try:
-                pdf_path_str, outpath_str, pages, status, error_msg, start_ts, end_ts = fut.result()
-            except Exception:
-                logging.exception("Unexpected worker exception")
-                pbar.update(1)
-                continue
+    executor_cls = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor, "async": AsyncExecutor}[args.mode]
+    unit_fn = run_unit_async if args.mode == "async" else run_unit
 
-            # compute duration safely
-            try:
-                import datetime
-                start_dt = datetime.datetime.fromisoformat(start_ts.replace("Z",""))
-                end_dt = datetime.datetime.fromisoformat(end_ts.replace("Z",""))
-                duration = (end_dt - start_dt).total_seconds()
-            except Exception:
-                duration = None
-
-            # Log to CSV with basenames
-            with open(args.log_csv, "a", newline="", encoding="utf-8") as csvf:
-                writer = csv.writer(csvf)
-                writer.writerow([
-                    time.strftime("%Y-%m-%d %H:%M:%S"),
-                    Path(pdf_path_str).name,
-                    Path(outpath_str).name,
-                    pages,
-                    status,
-                    error_msg.replace("\n","<NL>") if error_msg else "",
-                    start_ts,
-                    end_ts,
-                    f"{duration:.2f}" if duration is not None else ""
-                ])
-
-            if status == "SUCCESS":
-                logging.info("COMPLETED: %s -> %s (%d pages) duration=%.2fs", Path(pdf_path_str).name, Path(outpath_str).name, pages, duration if duration else 0.0)
-            elif status == "FAIL":
-                logging.error("FAILED: %s -> %s (%d pages) duration=%.2fs (see log)", Path(pdf_path_str).name, Path(outpath_str).name, pages, duration if duration else 0.0)
-            else:
-                logging.info("%s: %s -> %s (%d pages) duration=%.2fs", status, Path(pdf_path_str).name, Path(outpath_str).name, pages, duration if duration else 0.0)
+    bucket = TokenBucket(args.pages_per_minute, args.burst_pages)
+    controller = AimdController(args.initial_workers, args.workers, args.latency_factor, args.sleep_base)
+    pending = deque(units)
+    in_flight = {}  # future -> (unit, monotonic submit time)
+    throttled = Counter()
+    worker_busy = {}  # worker id -> [busy seconds, files, pages]
+    run_start = time.monotonic()
+    leases = LeaseDir(args.lease_dir, args.lease_ttl) if args.lease_dir else None
+    lease_key = lambda pdf_path_str: Path(pdf_path_str).relative_to(root).as_posix()
+    deferred = deque()  # (monotonic retry time, task) for files leased by another node
+    held_elsewhere = set()  # lease keys found held by another node
+    reclaimed = 0
+
+    def advance(pages):
+        nonlocal files_done
+        files_done += 1
+        pbar.update(pages)
+        pbar.set_postfix(files=f"{files_done}/{len(pdfs_with_pages)}")
+
+    # Dispatch: submit while the AIMD limit, the throttle cooldown and the page budget allow;
+    # the executor is sized for --workers, the maximum the controller may grow to.
+    try:
+        with executor_cls(max_workers=args.workers) as ex:
+            while pending or in_flight or deferred:
+                wait_secs = None
+                # Retry files leased elsewhere once the TTL has passed: a live holder has renewed
+                # its lease (and is retried again later), a crashed one's lease has expired.
+                while deferred and deferred[0][0] <= time.monotonic():
+                    pending.append([deferred.popleft()[1]])
+                while pending and len(in_flight) < controller.max_in_flight:
+                    # Dynamic claiming: take the next unit's leases before spending budget on it;
+                    # files finished meanwhile are dropped, files leased by another node are deferred.
+                    if leases is not None:
+                        kept = []
+                        for t in pending[0]:
+                            key = lease_key(t[0])
+                            if key in leases.held:
+                                kept.append(t)
+                            elif not leases.claim(key):
+                                held_elsewhere.add(key)
+                                deferred.append((time.monotonic() + leases.ttl, t))
+                            elif ensure_outpath(root, Path(t[0]), out_dir).exists():
+                                leases.release(key)
+                                writer.mark_skipped(t[0])
+                                advance(t[7])
+                            else:
+                                if key in held_elsewhere:
+                                    reclaimed += 1
+                                kept.append(t)
+                        pending[0] = kept
+                        if not kept:
+                            pending.popleft()
+                            continue
+                    wait_secs = controller.cooldown() or bucket.reserve(max(1, sum(t[7] for t in pending[0])))
+                    if wait_secs:
+                        break
+                    unit = pending.popleft()
+                    for t in unit:
+                        writer.mark_running(t[0])
+                    in_flight[ex.submit(unit_fn, unit)] = (unit, time.monotonic())
+
+                if pipeline is not None:
+                    pipeline.reap()
+                if deferred:
+                    next_retry = max(0.0, deferred[0][0] - time.monotonic())
+                    wait_secs = min(wait_secs, next_retry) if wait_secs else next_retry
+                if not in_flight:
+                    time.sleep(wait_secs or 0.1)
+                    continue
+                done, _ = wait(in_flight, timeout=wait_secs, return_when=FIRST_COMPLETED)
+
+                # Each time a unit completes, update the pbar (skipped files were already counted).
+                for fut in done:
+                    unit, submitted = in_flight.pop(fut)
+                    try:
+                        results = fut.result()
+                    except Exception as exc:
+                        logging.exception("Unexpected worker exception")
+                        for t in unit:
+                            writer.record_result(t[0], "FAIL", 1, type(exc).__name__, str(exc), None, None, None, "")
+                            if leases is not None:
+                                leases.release(lease_key(t[0]))
+                            advance(t[7])
+                        continue
+
+                    # compute duration safely (a pack's files share one provider call)
+                    try:
+                        import datetime
+                        start_dt = datetime.datetime.fromisoformat(results[0].start_ts.replace("Z",""))
+                        end_dt = datetime.datetime.fromisoformat(results[0].end_ts.replace("Z",""))
+                        duration = (end_dt - start_dt).total_seconds()
+                    except Exception:
+                        duration = None
+
+                    unit_pages = sum(r.pages for r in results)
+                    if any(r.status == "THROTTLED" for r in results):
+                        controller.on_throttle(submitted)
+                    elif any(r.status == "SUCCESS" for r in results):
+                        controller.on_success(submitted, duration or 0.0, unit_pages)
+                    if duration is not None:
+                        busy = worker_busy.setdefault(results[0].worker, [0.0, 0, 0])
+                        busy[0] += duration
+                        busy[1] += len(results)
+                        busy[2] += unit_pages
+
+                    requeue = []
+                    for t, r in zip(unit, results):
+                        status = r.status
+                        if status == "THROTTLED":
+                            throttled[r.pdf_path] += 1
+                            if throttled[r.pdf_path] <= MAX_THROTTLE_REQUEUES:
+                                writer.record_result(r.pdf_path, status, r.attempts, r.error_class, r.error,
+                                                     r.start_ts, r.end_ts, duration, r.worker)
+                                requeue.append(t)
+                                continue
+                            status = "FAIL"
+
+                        writer.record_result(r.pdf_path, "SKIPPED" if status == "SKIPPED-RACE" else status, r.attempts,
+                                             r.error_class, r.error, r.start_ts, r.end_ts, duration, r.worker)
+                        if leases is not None:
+                            leases.release(lease_key(r.pdf_path))
+
+                        pdf_name, out_name = Path(r.pdf_path).name, Path(r.outpath).name
+                        if status == "SUCCESS" and pipeline is not None:
+                            pipeline.submit(Path(r.outpath))
+                        if status == "SUCCESS":
+                            logging.info("COMPLETED: %s -> %s (%d pages) duration=%.2fs", pdf_name, out_name, r.pages, duration if duration else 0.0)
+                        elif status == "FAIL":
+                            logging.error("FAILED: %s -> %s (%d pages) duration=%.2fs error=%s (see manifest)", pdf_name, out_name, r.pages, duration if duration else 0.0, r.error_class)
+                        else:
+                            logging.info("%s: %s -> %s (%d pages) duration=%.2fs", status, pdf_name, out_name, r.pages, duration if duration else 0.0)
+                        advance(r.pages)
 
-            pbar.update(1)
+                    if requeue:
+                        pending.appendleft(requeue)
+    finally:
+        # flush the writer even on Ctrl-C so the next run resumes from here
+        pbar.close()
+        if leases is not None:
+            leases.close()
+        if pipeline is not None:
+            pipeline.close()
+        writer.close()
+        manifest.export_csv(args.log_csv)
+        manifest.close()
 
-    pbar.close()
-    logging.info("All tasks submitted. Check %s for per-file logs. %d files skipped.", args.log_csv, skipped_count)
+    log_worker_utilization(worker_busy, time.monotonic() - run_start, pages_in_total)
+    if leases is not None:
+        logging.info("%d files were leased by other nodes; %d of them reclaimed from expired leases.",
+                     len(held_elsewhere), reclaimed)
+    logging.info("Run finished. Manifest: %s (CSV export: %s). %d files skipped.", args.manifest, args.log_csv, skipped_count)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,81 @@
+"""
+coalescer.py - micro-batching of concurrent single-verse requests.
+
+/api/identify-meter and /api/scan each handle one verse, so concurrent clients never share
+the work the way a batch does. A Coalescer gathers the verses of requests that arrive
+together: the first request of a batch waits up to max_wait seconds for others with the
+same options (or until max_batch distinct verses have joined), runs the batch with one
+run_batch call, and every waiting request gets its own result. Verses with the same key
+(e.g. the same text up to spacing) are computed once per batch.
+
+Coalescing is per process (gunicorn worker) and costs the first request of each batch up
+to max_wait of extra latency, so flask_app only turns it on when API_COALESCE_MS is set.
+"""
+import threading
+from concurrent.futures import Future
+
+from metrics import metrics
+
+metrics.describe("coalescer_batches_total", "Batches run by a request coalescer", "counter")
+metrics.describe("coalescer_batch_size", "Distinct verses per coalesced batch", "summary")
+metrics.describe("coalescer_duplicates_total", "Requests answered from another request's verse in the same batch", "counter")
+
+class _Gathering:
+
+    def __init__(self):
+        self.items = []
+        self.futures = {}  # key -> Future, in the order of items
+        self.full = threading.Event()
+
+class Coalescer:
+    """Runs run_batch(options, items) -> results (in order) over items submitted close together."""
+
+    def __init__(self, name: str, run_batch, max_wait: float, max_batch: int):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._open = {}  # options -> _Gathering still taking items
+
+    def submit(self, options, item, key=None):
+        """The result for item, computed in a batch with the items submitted around it (blocking)."""
+        key = item if key is None else key
+        with self._lock:
+            batch = self._open.get(options)
+            leader = batch is None
+            if leader:
+                batch = self._open[options] = _Gathering()
+            future = batch.futures.get(key)
+            if future is None:
+                future = batch.futures[key] = Future()
+                batch.items.append(item)
+            else:
+                metrics.inc("coalescer_duplicates_total", endpoint=self.name)
+            if len(batch.futures) >= self.max_batch:
+                del self._open[options]
+                batch.full.set()
+        if leader:
+            batch.full.wait(self.max_wait)
+            with self._lock:
+                if self._open.get(options) is batch:
+                    del self._open[options]
+            self._run(options, batch)
+        return future.result()
+
+    def _run(self, options, batch: _Gathering):
+        metrics.inc("coalescer_batches_total", endpoint=self.name)
+        metrics.observe("coalescer_batch_size", len(batch.items), endpoint=self.name)
+        error = None
+        try:
+            results = self.run_batch(options, batch.items)
+            for future, result in zip(batch.futures.values(), results):
+                future.set_result(result)
+        except Exception as exc:
+            error = exc
+        finally:
+            # also when run_batch raised a BaseException or returned too few results,
+            # so no request of the batch is left blocked in future.result()
+            for future in batch.futures.values():
+                if not future.done():
+                    future.set_exception(error or RuntimeError(f"{self.name} batch did not complete"))
@@ -1,3 +1,4 @@
+import copy
 import logging
 import os
 import re
@@ -9,13 +10,21 @@ from urllib.parse import quote
 from datetime import datetime, date
 from pathlib import Path
 
-from flask import Flask, abort, jsonify, redirect, render_template, request, Request, session, send_from_directory, \
+from flask import Flask, abort, jsonify, redirect, render_template, request, Request, session, \
 	make_response, g, url_for, stream_with_context, Response
 from requests.exceptions import HTTPError
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import BadGateway, RequestEntityTooLarge
 
-from ocr_service import run_google_ocr, run_sarvam_ocr, stream_sarvam_ocr
+from ocr_service import run_google_ocr, run_sarvam_ocr
+from metrics import metrics
+from asset_server import serve_asset
+from coalescer import Coalescer
+from gretil_index import MATCH_MODES as GRETIL_MATCH_MODES, open_index as open_gretil_index
+from meter_pool import identify as identify_on_meter_pool, update_metrics as update_meter_pool_metrics, MeterPoolBusy
+from ocr_jobs import create_job as create_ocr_job, start_job as start_ocr_job, iter_job_events, read_meta as read_ocr_job_meta, \
+	job_exists as ocr_job_exists, job_result_path as ocr_job_result_path, submit as submit_ocr, OcrBusy, \
+	stream_hold as ocr_stream_hold, sync_wait as ocr_sync_wait, OCR_STREAM_RETRY_SECS
 
 if os.environ.get('SKRUTABLE_DEBUG_TIMING'):
 	import skrutable.utils as _skrutable_utils
@@ -24,10 +33,11 @@ if os.environ.get('SKRUTABLE_DEBUG_TIMING'):
 from skrutable import __version__ as BACK_END_VERSION
 from skrutable.transliteration import Transliterator
 from skrutable.scansion import Scanner
-from skrutable.meter_identification import MeterIdentifier
+from skrutable.meter_identification import MeterIdentifier, BATCH_PARALLEL_THRESHOLD
 from skrutable.meter_patterns import meter_melodies
 from skrutable.splitting import Splitter
 from skrutable.scheme_detection import SchemeDetector
+from skrutable.scheme_maps import by_name as SCHEME_MAPS_BY_NAME
 
 # overcome issue with Werkzeug 3.1 where max_form_memory_size default 500 KB causes 413 Request Entity Too Large
 
@@ -47,8 +57,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# large batches go to the host-wide identification pool (meter_pool.py); METER_POOL=0
+# gives every request its own process pool again (MeterIdentifier.identify_meter_batch)
+METER_POOL_ENABLED = os.environ.get('METER_POOL', '1') != '0'
+# concurrent single-verse /api/identify-meter and /api/scan calls arriving within API_COALESCE_MS
+# of each other are run as one batch of up to API_COALESCE_MAX_BATCH verses (coalescer.py); 0 = off
+API_COALESCE_MS = float(os.environ.get('API_COALESCE_MS', '0'))
+API_COALESCE_MAX_BATCH = int(os.environ.get('API_COALESCE_MAX_BATCH', '32'))
+
 # quiet the sarvamai SDK's HTTP client, which logs every request at INFO
-# (including ~2s job-status polls)
+# (including job-status polls; per-chunk stage timings are logged by ocr_service instead)
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("httpcore").setLevel(logging.WARNING)
 
@@ -57,9 +75,45 @@ app.config["DEBUG"] = True
 app.config["SECRET_KEY"] = "asdlkvumnxlapoiqyernxnfjtuzimzjdhryien" # for session, no actual need for secrecy
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH_MB * MB_SIZE
 
+def verse_key(text):
+	"""text with its spacing normalized, "" if blank. Identification and scansion ignore outer
+	whitespace and the width of spaces, but not where the lines break."""
+	return "\n".join(" ".join(line.split()) for line in text.strip().splitlines())
+
+def identify_verses(verses, r_o, r_k_m, from_scheme, progress=False, pool_min=BATCH_PARALLEL_THRESHOLD):
+	"""Verse objects for verses: serially with NO_PARALLEL (with a progress bar if asked),
+	batches of at least pool_min verses on the host's meter pool, otherwise through identify_meter_batch."""
+	if os.environ.get('SKRUTABLE_NO_PARALLEL'):
+		verse_iter = verses
+		if progress:
+			try:
+				from tqdm import tqdm as _tqdm
+				verse_iter = _tqdm(verses, desc='identifying', unit='verse', file=sys.stderr)
+			except ImportError:
+				pass
+		identified = [MI.identify_meter(s, resplit_option=r_o, resplit_keep_midpoint=r_k_m, from_scheme=from_scheme) for s in verse_iter]
+	else:
+		identified = None
+		# profiling needs the per-verse timings that only identify_meter_batch merges back
+		if METER_POOL_ENABLED and len(verses) >= pool_min and not os.environ.get('SKRUTABLE_DEBUG_TIMING'):
+			try:
+				identified = identify_on_meter_pool(verses, r_o, r_k_m, from_scheme)
+			except (ConnectionError, RuntimeError) as e:  # MeterPoolBusy is left to the 503 handler
+				logger.warning("meter pool unavailable (%s); identifying in this process", e)
+		if identified is None:
+			identified = MI.identify_meter_batch(
+				verses,
+				resplit_option=r_o,
+				resplit_keep_midpoint=r_k_m,
+				from_scheme=from_scheme,
+			)
+	return identified
+
 def run_identify_meter_batch(verses, r_o, r_k_m, from_scheme):
 	"""Run identify_meter on a list of verse strings, respecting NO_PARALLEL and DEBUG_TIMING flags.
-	Returns (verse_objects, duration_secs)."""
+	Verses that are equal up to whitespace are identified once, and blank lines share one
+	placeholder result; every input line still gets its own Verse, with its own text_raw.
+	Returns (verse_objects, duration_secs, unique_count)."""
 	if os.environ.get('SKRUTABLE_DEBUG_TIMING'):
 		from skrutable.meter_identification import _category_totals
 		from skrutable.utils import _section_totals
@@ -68,20 +122,29 @@ def run_identify_meter_batch(verses, r_o, r_k_m, from_scheme):
 
 	starting_time = datetime.now().time()
 
-	if os.environ.get('SKRUTABLE_NO_PARALLEL'):
-		try:
-			from tqdm import tqdm as _tqdm
-			verse_iter = _tqdm(verses, desc='identifying', unit='verse', file=sys.stderr)
-		except ImportError:
-			verse_iter = verses
-		verse_objects = [MI.identify_meter(s, resplit_option=r_o, resplit_keep_midpoint=r_k_m, from_scheme=from_scheme) for s in verse_iter]
-	else:
-		verse_objects = MI.identify_meter_batch(
-			verses,
-			resplit_option=r_o,
-			resplit_keep_midpoint=r_k_m,
-			from_scheme=from_scheme,
-		)
+	keys = [verse_key(s) for s in verses]
+	unique_index = {}  # key -> position in unique_verses
+	unique_verses = []
+	for s, key in zip(verses, keys):
+		if key and key not in unique_index:
+			unique_index[key] = len(unique_verses)
+			unique_verses.append(s)
+
+	identified = identify_verses(unique_verses, r_o, r_k_m, from_scheme, progress=True)
+
+	blank = None
+	verse_objects = []
+	for s, key in zip(verses, keys):
+		if key:
+			V = identified[unique_index[key]]
+		else:
+			if blank is None:
+				blank = MI.identify_meter("", resplit_option=r_o, resplit_keep_midpoint=r_k_m, from_scheme=from_scheme)
+			V = blank
+		if V.text_raw != s:
+			V = copy.copy(V)
+			V.text_raw = s
+		verse_objects.append(V)
 
 	ending_time = datetime.now().time()
 	delta = datetime.combine(date.today(), ending_time) - datetime.combine(date.today(), starting_time)
@@ -94,7 +157,7 @@ def run_identify_meter_batch(verses, r_o, r_k_m, from_scheme):
 			parallel_workers=None if os.environ.get('SKRUTABLE_NO_PARALLEL') else BATCH_MAX_WORKERS,
 		)
 
-	return verse_objects, duration_secs
+	return verse_objects, duration_secs, len(unique_verses)
 
 
 # for serving static files from assets folder
@@ -102,7 +165,7 @@ def run_identify_meter_batch(verses, r_o, r_k_m, from_scheme):
 def serve_files(name):
 	if name.endswith('.json'):
 		abort(404)
-	return send_from_directory('assets', name)
+	return serve_asset(name)
 
 # Skrutable main objects
 T = Transliterator()
@@ -111,6 +174,31 @@ MI = MeterIdentifier()
 Spl = Splitter()
 SD = SchemeDetector()
 
+if API_COALESCE_MS > 0:
+	# coalesced batches are far below BATCH_PARALLEL_THRESHOLD, where identify_meter_batch runs
+	# serially on the leader's thread, so they always go to the meter pool
+	IDENTIFY_COALESCER = Coalescer("identify",
+		lambda options, verses: identify_verses(verses, *options, pool_min=1), API_COALESCE_MS / 1000, API_COALESCE_MAX_BATCH)
+	SCAN_COALESCER = Coalescer("scan",
+		lambda from_scheme, verses: [S.scan(v, from_scheme=from_scheme) for v in verses],
+		API_COALESCE_MS / 1000, API_COALESCE_MAX_BATCH)
+else:
+	IDENTIFY_COALESCER = SCAN_COALESCER = None
+
+# GRETIL meter index (assets/meter_analyses/gretil_index.bin), memory-mapped once per worker
+try:
+	GRETIL = open_gretil_index()
+except Exception as e:
+	logger.warning("GRETIL index unavailable: %s", e)
+	GRETIL = None
+GRETIL_MAX_LIMIT = 1000
+
+# POST /api/identify-meter-batch (batch correction mode's "re-run edited")
+BULK_MAX_CARDS = 1000
+RESPLIT_OPTIONS = ("none", "resplit_lite", "resplit_lite_keep_mid", "resplit_max", "resplit_max_keep_mid")
+SCAN_FLAG_NAMES = ("show_weights", "show_morae", "show_gaRas", "show_alignment")
+FROM_SCHEMES = ("Auto",) + tuple(sorted(name[:-len("_SLP")] for name in SCHEME_MAPS_BY_NAME if name.endswith("_SLP")))
+
 # --- Pure helper functions (no session, no g, no Flask) ---
 
 def do_transliterate(input_text, from_scheme, to_scheme, avoid_virama_indic_scripts=True, avoid_virama_non_indic_scripts=False, preserve_anunasika=False):
@@ -123,8 +211,11 @@ def do_transliterate(input_text, from_scheme, to_scheme, avoid_virama_indic_scri
 		preserve_anunasika=preserve_anunasika,
 	)
 
-def do_scan(input_text, from_scheme, show_weights, show_morae, show_gaRas, show_alignment):
-	V = S.scan(input_text, from_scheme=from_scheme)
+def do_scan(input_text, from_scheme, show_weights, show_morae, show_gaRas, show_alignment, coalesce=False):
+	if coalesce and SCAN_COALESCER:
+		V = SCAN_COALESCER.submit(from_scheme, input_text, key=verse_key(input_text))
+	else:
+		V = S.scan(input_text, from_scheme=from_scheme)
 	summary = V.summarize(
 		show_weights=show_weights,
 		show_morae=show_morae,
@@ -134,15 +225,20 @@ def do_scan(input_text, from_scheme, show_weights, show_morae, show_gaRas, show_
 	)
 	return summary, V
 
-def do_identify_meter(input_text, from_scheme, resplit_option, show_weights, show_morae, show_gaRas, show_alignment):
-	"""Returns (summary_text, meter_label_hk, melody_options_list)."""
+def do_identify_meter(input_text, from_scheme, resplit_option, show_weights, show_morae, show_gaRas, show_alignment,
+		coalesce=False):
+	"""Returns (summary_text, meter_label_hk, melody_options_list, V).
+	With coalesce, V may be computed in a batch with concurrent calls (and shared with them)."""
 	r_o, r_k_m = parse_complex_resplit_option(resplit_option)
-	V = MI.identify_meter(
-		input_text,
-		resplit_option=r_o,
-		resplit_keep_midpoint=r_k_m,
-		from_scheme=from_scheme,
-	)
+	if coalesce and IDENTIFY_COALESCER:
+		V = IDENTIFY_COALESCER.submit((r_o, r_k_m, from_scheme), input_text, key=verse_key(input_text))
+	else:
+		V = MI.identify_meter(
+			input_text,
+			resplit_option=r_o,
+			resplit_keep_midpoint=r_k_m,
+			from_scheme=from_scheme,
+		)
 	summary = V.summarize(
 		show_weights=show_weights,
 		show_morae=show_morae,
@@ -357,6 +453,14 @@ def unsupported_media_type(error):
 		return jsonify({"error": "Received neither form nor json input."}), 415
 	return str(error), 415
 
+@app.errorhandler(MeterPoolBusy)
+def meter_pool_busy(error):
+	logger.warning("meter identification rejected: %s", error)
+	headers = {"Retry-After": str(error.retry_after)}
+	if request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'application/json':
+		return jsonify({"error": str(error)}), 503, headers
+	return str(error), 503, headers
+
 @app.errorhandler(500)
 def internal_server_error(error):
 	context = {
@@ -463,7 +567,7 @@ def upload_file():
 
 			verses = input_data.splitlines() # during post \n >> \r\n
 			r_o, r_k_m = parse_complex_resplit_option(session["resplit_option"])
-			verse_objects, duration_secs = run_identify_meter_batch(verses, r_o, r_k_m, resolved_from_scheme)
+			verse_objects, duration_secs, unique_count = run_identify_meter_batch(verses, r_o, r_k_m, resolved_from_scheme)
 
 			if session.get("batch_correction_mode"):
 
@@ -506,6 +610,7 @@ def upload_file():
 							"explanation_language": session.get("explanation_language", "sanskrit"),
 						},
 						"duration_secs": duration_secs,
+						"unique_verses": unique_count,
 					}),
 				)
 
@@ -522,7 +627,7 @@ def upload_file():
 					)
 					output_data += V.text_raw + '\n\n' + summary + '\n'
 
-			output_data += "samāptam: %d padyāni, %f kṣaṇāḥ" % ( len(verses), duration_secs )
+			output_data += "samāptam: %d padyāni (%d bhinnāni), %f kṣaṇāḥ" % ( len(verses), unique_count, duration_secs )
 
 			output_fn_suffix = '_meter_identified'
 
@@ -580,7 +685,7 @@ def upload_file():
 		resolved_from_scheme, _, _ = resolve_from_scheme(input_text, session["from_scheme"])
 
 		r_o, r_k_m = parse_complex_resplit_option(session["resplit_option"])
-		verse_objects, duration_secs = run_identify_meter_batch(verses, r_o, r_k_m, resolved_from_scheme)
+		verse_objects, duration_secs, unique_count = run_identify_meter_batch(verses, r_o, r_k_m, resolved_from_scheme)
 
 		if not session.get("batch_correction_mode"):
 			output_data = ''
@@ -593,7 +698,7 @@ def upload_file():
 					show_label=True,
 				)
 				output_data += V.text_raw + '\n\n' + summary + '\n'
-			output_data += "samāptam: %d padyāni" % len(verses)
+			output_data += "samāptam: %d padyāni (%d bhinnāni)" % ( len(verses), unique_count )
 			response = make_response(output_data)
 			response.headers["Content-Disposition"] = 'attachment; filename="skrutable_meter_identified.txt"'
 			return response
@@ -636,6 +741,7 @@ def upload_file():
 					"explanation_language": session.get("explanation_language", "sanskrit"),
 				},
 				"duration_secs": duration_secs,
+				"unique_verses": unique_count,
 			}),
 		)
 
@@ -689,11 +795,19 @@ def ocr():
 		pdf_path = Path(td) / secure_filename(pdf_file.filename)
 		pdf_file.save(pdf_path)
 
+		# runs on the OCR executor (admission-limited); the web UI uses the
+		# non-blocking job stream instead, this synchronous form is kept for API clients,
+		# and only OCR_MAX_SYNC_WAITS of them per process may block a request thread
 		try:
-			if provider == "sarvam":
-				ocr_text, page_count = run_sarvam_ocr(pdf_path, api_key, include_page_numbers, filter_headers_footers)
-			else:
-				ocr_text, page_count = run_google_ocr(pdf_path, api_key, include_page_numbers)
+			with ocr_sync_wait():
+				if provider == "sarvam":
+					future = submit_ocr(run_sarvam_ocr, pdf_path, api_key, include_page_numbers, filter_headers_footers)
+				else:
+					future = submit_ocr(run_google_ocr, pdf_path, api_key, include_page_numbers)
+				ocr_text, page_count, cached_pages = future.result()
+		except OcrBusy as exc:
+			logger.warning("OCR rejected: %s", exc)
+			return str(exc), 503, {"Retry-After": str(exc.retry_after)}
 		except RuntimeError as exc:
 			logger.error("OCR failed: %s", exc)
 			if str(exc) == "QUOTA_EXHAUSTED":
@@ -706,7 +820,7 @@ def ocr():
 			logger.error("trace: %s", trace)
 			return f"OCR failed: {exc}\n\n{trace}", 500
 
-	logger.info("Pages processed: %d", page_count)
+	logger.info("Pages processed: %d (%d from cache)", page_count, cached_pages)
 
 	inr_to_usd = None
 	if provider == "sarvam":
@@ -719,6 +833,7 @@ def ocr():
 	response = make_response(ocr_text)
 	response.headers["Content-Type"] = "text/plain; charset=utf-8"
 	response.headers["X-Pages-Processed"] = str(page_count)
+	response.headers["X-Pages-Cached"] = str(cached_pages)
 	if inr_to_usd is not None:
 		response.headers["X-INR-To-USD"] = str(inr_to_usd)
 
@@ -735,13 +850,75 @@ def ocr():
 
 	return response
 
+def _sse(payload, event_id=None):
+	import json as _json
+	prefix = f'id: {event_id}\n' if event_id is not None else ''
+	return prefix + 'data: ' + _json.dumps(payload, ensure_ascii=False) + '\n\n'
+
+def _ocr_job_stream(job_id, after=0, announce=False):
+	"""SSE response tailing a checkpointed OCR job from chunk index `after` onward."""
+	start_time = time.time()
+	meta = read_ocr_job_meta(job_id)
+	pdf_stem = Path(meta["filename"]).stem
+	provider_tag = "sarvam-vision" if meta["provider"] == "sarvam" else "cloud-vision"
+
+	def generate():
+		if announce:
+			yield _sse({"type": "job", "job_id": job_id, "provider": meta["provider"]})
+		# only a few streams per process may hold a request thread; the rest
+		# flush what's on disk and answer "pending" straight away
+		with ocr_stream_hold() as hold_secs:
+			for kind, data in iter_job_events(job_id, after=after, max_secs=hold_secs):
+				if kind == "chunk":
+					yield _sse({"type": "chunk", **data}, event_id=data["index"])
+
+				elif kind == "pending":
+					# release this request thread; the client resumes after retry_ms
+					retry_ms = int(OCR_STREAM_RETRY_SECS * 1000)
+					yield f"retry: {retry_ms}\n" + _sse({"type": "pending", "job_id": job_id, "retry_ms": retry_ms})
+
+				elif kind == "done":
+					inr_to_usd = None
+					if meta["provider"] == "sarvam":
+						try:
+							fx = requests.get("https://api.frankfurter.dev/v1/latest?from=INR&to=USD", timeout=5).json()
+							inr_to_usd = fx["rates"]["USD"]
+						except Exception as e:
+							logger.warning("FX lookup failed: %s", e)
+
+					yield _sse({
+						"type":        "done",
+						"job_id":      job_id,
+						"pages":       data["pages"],
+						"cached_pages": data["cached_pages"],
+						"inr_to_usd":  inr_to_usd,
+						"filename":    f"{pdf_stem}-skrutable-{provider_tag}-ocr.txt",
+					})
+
+					logger.info("Pages processed: %d (%d from cache)", data["pages"], data["cached_pages"])
+					logger.info("Total OCR stream time: %.3f seconds", time.time() - start_time)
+
+				elif kind == "error":
+					yield _sse({"type": "error", **data["error"]})
+
+	response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+	response.headers["Cache-Control"] = "no-cache"
+	response.headers["X-Accel-Buffering"] = "no"  # disable nginx proxy buffering
+	return response
+
 @app.route("/ocr/stream", methods=["POST"])
 def ocr_stream():
-	"""Streaming SSE endpoint for Sarvam OCR — yields one event per 10-page chunk."""
-	import json as _json
+	"""Streaming SSE endpoint for OCR — yields one event per 10-page chunk (Sarvam)
+	or a single event with the whole result (Google).
 
-	start_time = _log_ocr_request_stats()
+	The OCR itself runs as a checkpointed job on the OCR executor (see ocr_jobs.py);
+	the first event carries its job_id so the stream can be resumed via
+	GET /ocr/stream/<job_id>, either after a dropped connection or when the
+	server ends the stream early with a "pending" event to free its thread.
+	"""
+	_log_ocr_request_stats()
 
+	provider = request.form.get("ocr_provider", "sarvam")
 	api_key  = request.form.get("api_key", "").strip()
 	pdf_file = request.files.get("pdf_file")
 	include_page_numbers   = request.form.get("include_page_numbers") == "yes"
@@ -749,68 +926,74 @@ def ocr_stream():
 
 	if not api_key or not pdf_file:
 		def _err():
-			yield 'data: ' + _json.dumps({"type": "error", "status": 400, "message": "PDF and API key are required."}) + '\n\n'
+			yield _sse({"type": "error", "status": 400, "message": "PDF and API key are required."})
 		return Response(stream_with_context(_err()), mimetype="text/event-stream")
 
-	td_obj = tempfile.TemporaryDirectory()
-	pdf_path = Path(td_obj.name) / secure_filename(pdf_file.filename)
-	pdf_file.save(pdf_path)
-
-	pdf_stem = pdf_path.stem
-
-	def generate():
-		try:
-			all_page_count = 0
-			for chunk_idx, total_chunks, chunk_texts in stream_sarvam_ocr(pdf_path, api_key, include_page_numbers, filter_headers_footers):
-				all_page_count += len(chunk_texts)
-				payload = {
-					"type":         "chunk",
-					"index":        chunk_idx,
-					"total":        total_chunks,
-					"pages":        all_page_count,
-					"text":         "\n".join(chunk_texts),
-				}
-				yield 'data: ' + _json.dumps(payload, ensure_ascii=False) + '\n\n'
-
-			inr_to_usd = None
-			try:
-				fx = requests.get("https://api.frankfurter.dev/v1/latest?from=INR&to=USD", timeout=5).json()
-				inr_to_usd = fx["rates"]["USD"]
-			except Exception as e:
-				logger.warning("FX lookup failed: %s", e)
-
-			done_payload = {
-				"type":        "done",
-				"pages":       all_page_count,
-				"inr_to_usd":  inr_to_usd,
-				"filename":    f"{pdf_stem}-skrutable-sarvam-vision-ocr.txt",
-			}
-			yield 'data: ' + _json.dumps(done_payload) + '\n\n'
-
-			logger.info("Pages processed: %d", all_page_count)
-			logger.info("Total OCR stream time: %.3f seconds", time.time() - start_time)
-
-		except RuntimeError as exc:
-			logger.error("OCR stream failed: %s", exc)
-			if str(exc) == "QUOTA_EXHAUSTED":
-				msg = "Your Sarvam API key has no credits remaining. Add credits at dashboard.sarvam.ai."
-				status = 402
-			else:
-				msg = f"OCR failed: {exc}"
-				status = 500
-			yield 'data: ' + _json.dumps({"type": "error", "status": status, "message": msg}) + '\n\n'
-
-		except Exception as exc:
-			import traceback
-			logger.error("OCR stream failed: %s\n%s", exc, traceback.format_exc())
-			yield 'data: ' + _json.dumps({"type": "error", "status": 500, "message": f"OCR failed: {exc}"}) + '\n\n'
+	job_id = create_ocr_job(
+		pdf_file,
+		secure_filename(pdf_file.filename),
+		provider="google" if provider == "google" else "sarvam",
+		options={
+			"include_page_numbers": include_page_numbers,
+			"filter_headers_footers": filter_headers_footers,
+		},
+	)
+	try:
+		start_ocr_job(job_id, api_key)
+	except OcrBusy as exc:
+		logger.warning("OCR rejected: %s", exc)
+		return str(exc), 503, {"Retry-After": str(exc.retry_after)}
+	logger.info("Queued %s OCR job %s", provider, job_id)
+
+	return _ocr_job_stream(job_id, announce=True)
+
+@app.route("/ocr/stream/<job_id>", methods=["GET"])
+def ocr_stream_resume(job_id):
+	"""Resume an OCR job's SSE stream after the last chunk the client received.
+
+	The resume point comes from ?after=<chunk index> or the standard
+	Last-Event-ID header; chunks are replayed from the job's checkpoints.
+	"""
+	if not ocr_job_exists(job_id):
+		abort(404)
+	after = request.args.get("after", request.headers.get("Last-Event-ID", "0"))
+	try:
+		after = max(0, int(after))
+	except ValueError:
+		after = 0
+	return _ocr_job_stream(job_id, after=after)
+
+@app.route("/ocr/jobs/<job_id>", methods=["GET"])
+def ocr_job_status(job_id):
+	if not ocr_job_exists(job_id):
+		return jsonify({"error": "Unknown or expired OCR job."}), 404
+	meta = read_ocr_job_meta(job_id)
+	return jsonify({k: meta[k] for k in ("job_id", "status", "total_chunks", "chunks_done", "pages", "cached_pages", "error")})
+
+@app.route("/ocr/jobs/<job_id>/text", methods=["GET"])
+def ocr_job_text(job_id):
+	"""Download the full text of a finished OCR job (kept for OCR_JOB_RETENTION_HOURS)."""
+	if not ocr_job_exists(job_id):
+		return "Unknown or expired OCR job.", 404
+	meta = read_ocr_job_meta(job_id)
+	if meta["status"] != "done":
+		return f"OCR job is not finished (status: {meta['status']}).", 409
+	response = make_response(ocr_job_result_path(job_id).read_text(encoding="utf-8"))
+	response.headers["Content-Type"] = "text/plain; charset=utf-8"
+	response.headers["X-Pages-Processed"] = str(meta["pages"])
+	response.headers["X-Pages-Cached"] = str(meta["cached_pages"])
+	provider_tag = "sarvam-vision" if meta["provider"] == "sarvam" else "cloud-vision"
+	dl_filename = f"{Path(meta['filename']).stem}-skrutable-{provider_tag}-ocr.txt"
+	response.headers["Content-Disposition"] = f"attachment; filename={dl_filename}"
+	return response
 
-		finally:
-			td_obj.cleanup()
 
-	response = Response(stream_with_context(generate()), mimetype="text/event-stream")
-	response.headers["Cache-Control"] = "no-cache"
-	response.headers["X-Accel-Buffering"] = "no"  # disable nginx proxy buffering
+@app.route("/metrics", methods=["GET"])
+def metrics_page():
+	"""Prometheus-format metrics for this worker process (and the host's meter pool)."""
+	update_meter_pool_metrics()
+	response = make_response(metrics.render())
+	response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
 	return response
 
 
@@ -980,6 +1163,7 @@ def api_scan():
 		show_morae=inputs["show_morae"],
 		show_gaRas=inputs["show_gaRas"],
 		show_alignment=inputs["show_alignment"],
+		coalesce=True,
 	)
 
 	return api_response(result, detected_scheme=detected, detection_confidence=confidence,
@@ -1023,6 +1207,7 @@ def api_identify_meter():
 		show_morae=inputs["show_morae"],
 		show_gaRas=inputs["show_gaRas"],
 		show_alignment=inputs["show_alignment"],
+		coalesce=True,
 	)
 
 	return api_response(summary, meter_label=meter_label_hk, melody_options=melody_options_list,
@@ -1039,6 +1224,84 @@ def api_identify_meter():
 	)
 
 
+@app.route('/api/identify-meter-batch', methods=["POST"])
+def api_identify_meter_batch():
+	"""Re-run many (edited) verses in one request, as batch correction mode does (JSON only).
+
+	Body: {"from_scheme", "resplit_option", show flags, "cards": [{"index", "input_text", "mode", ...}]}.
+	mode is "identify" (default) or "scan"; a card's own from_scheme, resplit_option and show
+	flags override the top-level ones; "Auto" is detected per card. Identify cards go through
+	run_identify_meter_batch once per (resolved scheme, resplit option), so duplicates are
+	identified once and large sets in parallel.
+	Returns one compact update per card, in request order, with the fields the page refreshes.
+	"""
+	body = request.get_json(silent=True)
+	cards = body.get("cards") if isinstance(body, dict) else None
+	if not isinstance(cards, list) or not cards:
+		return jsonify({"error": "Expected a JSON body with a non-empty list of cards."}), 400
+	if len(cards) > BULK_MAX_CARDS:
+		return jsonify({"error": f"At most {BULK_MAX_CARDS} cards per request."}), 400
+
+	jobs = []  # (card index, text, mode, resolved from_scheme, resplit_option, show flags)
+	detected = {}  # text -> scheme, for the cards with from_scheme "Auto"
+	for i, card in enumerate(cards):
+		if not isinstance(card, dict) or not isinstance(card.get("input_text"), str) or "index" not in card:
+			return jsonify({"error": f"Card {i} needs an index and an input_text."}), 400
+		options = {**body, **card}
+		mode = options.get("mode", "identify")
+		resplit_option = options.get("resplit_option", "resplit_lite_keep_mid")
+		from_scheme = options.get("from_scheme", "IAST")
+		if mode not in ("identify", "scan"):
+			return jsonify({"error": f"Card {i}: mode must be identify or scan."}), 400
+		if from_scheme not in FROM_SCHEMES:
+			return jsonify({"error": f"Card {i}: from_scheme must be one of {', '.join(FROM_SCHEMES)}."}), 400
+		if mode == "identify" and resplit_option not in RESPLIT_OPTIONS:
+			return jsonify({"error": f"Card {i}: resplit_option must be one of {', '.join(RESPLIT_OPTIONS)}."}), 400
+		flags = {name: bool(_coerce_bool(options.get(name, False))) for name in SCAN_FLAG_NAMES}
+		text = card["input_text"]
+		if from_scheme == "Auto":
+			if text not in detected:
+				detected[text] = resolve_from_scheme(text, from_scheme)[0]
+			from_scheme = detected[text]
+		jobs.append((card["index"], text, mode, from_scheme, resplit_option, flags))
+
+	groups = {}  # (resolved scheme, resplit option) -> positions of identify jobs
+	for pos, job in enumerate(jobs):
+		if job[2] == "identify":
+			groups.setdefault((job[3], job[4]), []).append(pos)
+	verse_objects, duration_secs, unique_verses = {}, 0.0, 0
+	for (resolved, resplit_option), positions in groups.items():
+		r_o, r_k_m = parse_complex_resplit_option(resplit_option)
+		vs, secs, unique = run_identify_meter_batch([jobs[pos][1] for pos in positions], r_o, r_k_m, resolved)
+		verse_objects.update(zip(positions, vs))
+		duration_secs += secs
+		unique_verses += unique
+
+	updates = []
+	for pos, (index, text, mode, from_scheme, _, flags) in enumerate(jobs):
+		if mode == "scan":
+			summary, V = do_scan(text, from_scheme=from_scheme, **flags)
+			update = {"index": index, "result": summary}
+		else:
+			V = verse_objects[pos]
+			update = {
+				"index": index,
+				"result": V.summarize(**flags, show_label=True),
+				"meter_label_full": V.meter_label,
+				"identification_score": V.identification_score,
+				"diagnostic": serialize_diagnostic(V.diagnostic),
+			}
+		update.update(
+			text_syllabified=V.text_syllabified,
+			syllable_weights=V.syllable_weights,
+			morae_per_line=V.morae_per_line,
+			gaRa_abbreviations=V.gaRa_abbreviations,
+			mAtragaNa_abbreviations=V.mAtragaNa_abbreviations,
+		)
+		updates.append(update)
+
+	return jsonify({"cards": updates, "unique_verses": unique_verses, "duration_secs": duration_secs})
+
 @app.route('/api/split', methods=["GET", "POST"])
 def api_split():
 
@@ -1086,6 +1349,56 @@ def api_split():
 	return api_response(result, detected_scheme=detected, detection_confidence=confidence)
 
 
+@app.route('/api/gretil', methods=["GET", "POST"])
+def api_gretil():
+	"""Meter frequencies and verse lookups over the precomputed GRETIL analyses (JSON only).
+
+	text + id       the verse(s) of text with that id
+	meter [+ text]  verses whose label matches meter (match: family, label, prefix), paged
+	text            frequency table of text (group: label or family)
+	(nothing)       the texts, then the corpus frequency table
+	"""
+	if GRETIL is None:
+		return jsonify({"error": "The GRETIL index is not available."}), 503
+
+	body = request.get_json(silent=True)
+	if body is not None and not isinstance(body, dict):
+		return jsonify({"error": "Expected a JSON object."}), 400
+	params = dict(request.values)
+	params.update(body or {})
+	not_strings = [name for name in ("text", "id", "meter", "match", "group")
+		if params.get(name) is not None and not isinstance(params[name], str)]
+	if not_strings:
+		return jsonify({"error": "text, id, meter, match and group must be strings."}), 400
+	text = params.get("text") or None
+	if text is not None and text not in GRETIL.texts:
+		return jsonify({"error": f"Unknown text {text}. Known texts: {', '.join(GRETIL.texts)}"}), 404
+	try:
+		offset = max(0, int(params.get("offset", 0)))
+		limit = min(max(0, int(params.get("limit", 100))), GRETIL_MAX_LIMIT)
+	except (TypeError, ValueError):
+		return jsonify({"error": "offset and limit must be integers."}), 400
+
+	if params.get("id"):
+		if text is None:
+			return jsonify({"error": "Looking up a verse id needs a text."}), 400
+		return jsonify(GRETIL.lookup(text, params["id"]))
+
+	if params.get("meter"):
+		match = params.get("match", "family")
+		if match not in GRETIL_MATCH_MODES:
+			return jsonify({"error": f"match must be one of {', '.join(GRETIL_MATCH_MODES)}."}), 400
+		return jsonify(GRETIL.verses(params["meter"].strip(), text=text, match=match, offset=offset, limit=limit))
+
+	group = params.get("group", "label")
+	if group not in ("label", "family"):
+		return jsonify({"error": "group must be label or family."}), 400
+	result = GRETIL.frequencies(text, group=group)
+	if text is None:
+		result = {**GRETIL.summary(), **result}
+	return jsonify(result)
+
+
 @app.route('/reset')
 def reset_variables():
 	session.clear()
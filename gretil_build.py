@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+gretil_build.py - incremental rebuild of the GRETIL meter analyses in assets/meter_analyses.
+
+For every cleaned input 2_input_cleaned/<text>_input_cleaned.txt (one verse per line)
+this writes, in the formats already published:
+
+  3_output_raw/<text>_output_raw.txt          "<verse>\\t<label>" per verse, then "samāptam: <secs>s"
+  4_output_cleaned/<text>_output_cleaned.txt  "<verse id>\\t<label>" per verse, same footer
+  5_tallies/<text>_tallies.tsv                "<label>\\t<count>", most frequent first; the tab
+                                              indentation hand-added to a label is kept
+
+then refreshes all.zip in each of those directories and in 2_input_cleaned,
+concise_freq_summary.tsv (the per-text meter-family percentages that
+concise_freq_summary.pdf is made from) and the query index gretil_index.bin (see
+gretil_index.py). Texts without a cleaned input (MBh) keep their outputs and still
+count in the bundles, the summary and the index.
+
+The build is incremental. Per-text state in assets/meter_analyses/.gretil_build/ records
+the SHA-256 of the input and the label of every verse (by content hash). All of it is
+keyed by skrutable's version (BACK_END_VERSION) and the resplit option:
+
+  - a text whose input, key and outputs are unchanged is skipped
+  - an edited input re-identifies only the verses that have no label yet
+  - a new skrutable version or --resplit re-identifies everything (as does --force)
+
+Verses to identify are cut into chunks and run on a process pool, largest texts first,
+so texts are identified in parallel. Outputs, bundles and the summary are rewritten only
+when their content changes. Bundles are deterministic, so a rebuild leaves an unchanged
+tree byte-identical. The samāptam footer is the identification time of the verses'
+labels, summed over the runs that produced them.
+
+Usage:
+  python gretil_build.py                          # rebuild whatever changed
+  python gretil_build.py --texts BhG,MgD --workers 4
+  python gretil_build.py --dry-run                # show what would be re-identified
+  python gretil_build.py --force                  # re-identify everything
+  python gretil_build.py --check-ids              # compare verse ids with 4_output_cleaned
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from skrutable import __version__ as BACK_END_VERSION
+
+from gretil_index import build_index, index_is_current, meter_family
+
+CORPUS = Path(__file__).resolve().parent / "assets" / "meter_analyses"
+INPUT_DIR = CORPUS / "2_input_cleaned"
+RAW_DIR = CORPUS / "3_output_raw"
+CLEAN_DIR = CORPUS / "4_output_cleaned"
+TALLY_DIR = CORPUS / "5_tallies"
+ZIP_DIRS = (INPUT_DIR, RAW_DIR, CLEAN_DIR, TALLY_DIR)
+SUMMARY = CORPUS / "concise_freq_summary.tsv"
+STATE_DIR = CORPUS / ".gretil_build"
+
+# help-page excerpts of BhG, not texts of the corpus
+EXCERPTS = ("BhG_1-10", "BhG_1-100")
+CHUNK_VERSES = 500
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+# "... // 1.2.3", "... // 12 //", "...// 464"; anything else is its own id
+VERSE_ID = re.compile(r"// ?(\d[\d., /]*?)(?: //)?$")
+
+# per-process skrutable object, built once by _init_worker
+_MI = None
+
+def _init_worker():
+    global _MI
+    from skrutable.meter_identification import MeterIdentifier
+    _MI = MeterIdentifier()
+
+def identify_chunk(verses: list, resplit_option: str, resplit_keep_midpoint: bool) -> tuple:
+    """Labels of a chunk of verses and the seconds it took; runs in a pool process."""
+    t0 = time.perf_counter()
+    labels = [_MI.identify_meter(v, resplit_option=resplit_option, resplit_keep_midpoint=resplit_keep_midpoint,
+                                 from_scheme="IAST").meter_label
+              for v in verses]
+    return labels, time.perf_counter() - t0
+
+def verse_hash(verse: str) -> str:
+    return hashlib.sha256(verse.encode("utf-8")).hexdigest()[:20]
+
+def verse_id(verse: str) -> str:
+    m = VERSE_ID.search(verse)
+    return m.group(1) if m else verse
+
+def _parse_resplit(option: str) -> tuple:
+    if option.endswith("_keep_mid"):
+        return option[:-len("_keep_mid")], True
+    return option, False
+
+def _write_if_changed(path: Path, text: str) -> bool:
+    data = text.encode("utf-8")
+    try:
+        if path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    tmp = path.with_name(path.name + f".tmp-{os.getpid()}")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return True
+
+def output_paths(text: str) -> tuple:
+    return (RAW_DIR / f"{text}_output_raw.txt", CLEAN_DIR / f"{text}_output_cleaned.txt",
+            TALLY_DIR / f"{text}_tallies.tsv")
+
+def corpus_texts() -> list:
+    names = [p.name[:-len("_input_cleaned.txt")] for p in sorted(INPUT_DIR.glob("*_input_cleaned.txt"))]
+    return [n for n in names if n not in EXCERPTS]
+
+class TextState:
+    """Input digest and verse labels of one text, stored in STATE_DIR/<text>.json."""
+
+    def __init__(self, text: str, key: str, force: bool):
+        self.text = text
+        self.path = STATE_DIR / f"{text}.json"
+        try:
+            saved = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            saved = {}
+        if force or saved.get("key") != key:
+            saved = {}
+        self.key = key
+        self.input_sha256 = saved.get("input_sha256")
+        self.labels = saved.get("labels", {})  # verse hash -> [label, seconds]
+
+        data = (INPUT_DIR / f"{text}_input_cleaned.txt").read_bytes()
+        self.new_sha256 = hashlib.sha256(data).hexdigest()
+        # split on "\n" alone (not splitlines(), which also breaks at \x1c, \u2028, ...), but
+        # drop the "\r" of CRLF inputs (Ram), which would defeat VERSE_ID's "$" and leak into 3_output_raw
+        self.verses = [line.rstrip("\r") for line in data.decode("utf-8").rstrip("\r\n").split("\n")]
+        self.hashes = [verse_hash(v) for v in self.verses]
+        unique = dict(zip(self.hashes, self.verses))
+        self.missing = [(h, v) for h, v in unique.items() if h not in self.labels]
+
+    def up_to_date(self) -> bool:
+        return (self.input_sha256 == self.new_sha256 and not self.missing
+                and all(p.exists() for p in output_paths(self.text)))
+
+    def save(self):
+        STATE_DIR.mkdir(exist_ok=True)
+        labels = {h: self.labels[h] for h in self.hashes}  # drops verses no longer in the input
+        _write_if_changed(self.path, json.dumps({"key": self.key, "input_sha256": self.new_sha256,
+                                                 "labels": labels}, ensure_ascii=False))
+
+def id_mismatches(state: TextState) -> list:
+    """(line, regenerated id, published id) wherever verse_id disagrees with 4_output_cleaned."""
+    published = output_paths(state.text)[1].read_text(encoding="utf-8").split("\n")[:-1]  # last is the footer
+    ids = [verse_id(v) for v in state.verses]
+    if len(published) != len(ids):
+        return [(0, f"{len(ids)} verses", f"{len(published)} lines")]
+    return [(i + 1, new, old.split("\t", 1)[0]) for i, (new, old) in enumerate(zip(ids, published))
+            if new != old.split("\t", 1)[0]]
+
+def tallies_text(labels: list, old_path: Path) -> str:
+    """Tallies in most_common order, keeping the indentation already given to a label."""
+    marks = {}
+    if old_path.exists():
+        for line in old_path.read_text(encoding="utf-8").splitlines():
+            label = line.lstrip("\t").rsplit("\t", 1)[0]
+            marks[label] = line[:len(line) - len(line.lstrip("\t"))]
+    return "".join(f"{marks.get(label, '')}{label}\t{n}\n" for label, n in Counter(labels).most_common())
+
+def write_outputs(state: TextState) -> list:
+    """Write the three output files of a fully labelled text; returns those that changed."""
+    labels = [state.labels[h][0] for h in state.hashes]
+    footer = "samāptam: %fs" % sum(state.labels[h][1] for h in set(state.hashes))
+    raw_path, clean_path, tally_path = output_paths(state.text)
+    contents = (
+        (raw_path, "".join(f"{v}\t{label}\n" for v, label in zip(state.verses, labels)) + footer),
+        (clean_path, "".join(f"{verse_id(v)}\t{label}\n" for v, label in zip(state.verses, labels)) + footer),
+        (tally_path, tallies_text(labels, tally_path)),
+    )
+    return [path for path, text in contents if _write_if_changed(path, text)]
+
+def refresh_zip(directory: Path, digests: dict) -> bool:
+    """Rebuild directory/all.zip if any member changed since the digest recorded in `digests`."""
+    zip_path = directory / "all.zip"
+    members = sorted(p for p in directory.iterdir() if p.suffix in (".txt", ".tsv"))
+    h = hashlib.sha256()
+    for p in members:
+        h.update(p.name.encode("utf-8") + b"\0" + hashlib.sha256(p.read_bytes()).digest())
+    digest = h.hexdigest()
+    if zip_path.exists() and digests.get(directory.name) == digest:
+        return False
+    tmp = zip_path.with_name(f"all.zip.tmp-{os.getpid()}")
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for p in members:
+            info = zipfile.ZipInfo(p.name, date_time=ZIP_DATE)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            zf.writestr(info, p.read_bytes())
+    os.replace(tmp, zip_path)
+    digests[directory.name] = digest
+    return True
+
+def summary_text() -> str:
+    """Meter-family share (%) per text and over the corpus, from the tallies."""
+    per_text = {}
+    for path in sorted(TALLY_DIR.glob("*_tallies.tsv")):
+        families = Counter()
+        for line in path.read_text(encoding="utf-8").splitlines():
+            label, n = line.lstrip("\t").rsplit("\t", 1)
+            families[meter_family(label)] += int(n)
+        per_text[path.name[:-len("_tallies.tsv")]] = families
+    corpus = sum(per_text.values(), Counter())
+    columns = [("all", corpus)] + list(per_text.items())
+    totals = [sum(c.values()) for _, c in columns]
+    lines = ["meter\t" + "\t".join(name for name, _ in columns),
+             "verses\t" + "\t".join(str(t) for t in totals)]
+    for family, _ in corpus.most_common():
+        lines.append(family + "\t" + "\t".join("%.1f" % (100 * c[family] / t) if t else "0.0"
+                                               for (_, c), t in zip(columns, totals)))
+    return "\n".join(lines) + "\n"
+
+def main():
+    p = argparse.ArgumentParser(description="Incremental rebuild of the GRETIL meter analyses")
+    p.add_argument("--texts", default=None, help="Comma-separated text names (default: every cleaned input)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Identification processes")
+    p.add_argument("--resplit", default="resplit_lite_keep_mid", help="resplit_option, as in the web form")
+    p.add_argument("--chunk", type=int, default=CHUNK_VERSES, help="Verses per pool task")
+    p.add_argument("--force", action="store_true", help="Ignore saved labels and re-identify everything")
+    p.add_argument("--dry-run", action="store_true", help="Report what would be re-identified and exit")
+    p.add_argument("--check-ids", action="store_true",
+                   help="Check that the verse ids of the inputs match the published 4_output_cleaned files and exit")
+    args = p.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    key = f"skrutable {BACK_END_VERSION}, {args.resplit}"
+    texts = args.texts.split(",") if args.texts else corpus_texts()
+    states = [TextState(t, key, args.force) for t in texts]
+    if args.check_ids:
+        bad = 0
+        for s in states:
+            mismatches = id_mismatches(s)
+            for line, new, old in mismatches[:5]:
+                logging.error("%-10s line %d: id %r, published %r", s.text, line, new, old)
+            bad += bool(mismatches)
+        logging.info("verse ids: %d of %d texts differ from 4_output_cleaned", bad, len(states))
+        raise SystemExit(1 if bad else 0)
+    stale = [s for s in states if not s.up_to_date()]
+    for s in stale:
+        logging.info("%-10s %6d verses, %6d to identify", s.text, len(s.verses), len(s.missing))
+    logging.info("%s: %d of %d texts to rebuild, %d verses to identify", key, len(stale), len(states),
+                 sum(len(s.missing) for s in stale))
+    if args.dry_run:
+        return
+
+    changed = []
+    def finish(state):
+        state.save()
+        changed.extend(write_outputs(state))
+
+    # chunks of the largest texts first, so the pool's tail is short
+    chunks = [(s, s.missing[i:i + args.chunk]) for s in sorted(stale, key=lambda s: -len(s.missing))
+              for i in range(0, len(s.missing), args.chunk)]
+    remaining = Counter(s.text for s, _ in chunks)
+    for s in stale:
+        if not remaining[s.text]:
+            finish(s)
+    if chunks:
+        t0 = time.perf_counter()
+        r_o, r_k_m = _parse_resplit(args.resplit)
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as ex:
+            futures = {ex.submit(identify_chunk, [v for _, v in chunk], r_o, r_k_m): (s, chunk) for s, chunk in chunks}
+            done_verses = 0
+            for fut in as_completed(futures):
+                s, chunk = futures[fut]
+                labels, secs = fut.result()
+                for (h, _), label in zip(chunk, labels):
+                    s.labels[h] = [label, round(secs / len(chunk), 6)]
+                done_verses += len(chunk)
+                remaining[s.text] -= 1
+                if not remaining[s.text]:
+                    finish(s)
+                    logging.info("%-10s done (%d verses identified so far)", s.text, done_verses)
+        wall = time.perf_counter() - t0
+        logging.info("identified %d verses in %.1f s (%.0f verses/s, %d workers)", done_verses, wall,
+                     done_verses / wall, args.workers)
+
+    zip_state = STATE_DIR / "zips.json"
+    try:
+        digests = json.loads(zip_state.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        digests = {}
+    for directory in ZIP_DIRS:
+        if refresh_zip(directory, digests):
+            changed.append(directory / "all.zip")
+    STATE_DIR.mkdir(exist_ok=True)
+    _write_if_changed(zip_state, json.dumps(digests, indent=1))
+    if _write_if_changed(SUMMARY, summary_text()):
+        changed.append(SUMMARY)
+    if not index_is_current():
+        changed.append(build_index())
+
+    for path in changed:
+        logging.info("wrote %s", path.relative_to(CORPUS))
+    logging.info("%d files changed", len(changed))
+
+if __name__ == "__main__":
+    main()
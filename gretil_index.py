@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+gretil_index.py - compact, memory-mapped index of the GRETIL meter analyses.
+
+Compiles assets/meter_analyses/4_output_cleaned ("<verse id>\\t<label>" per verse) and
+5_tallies (label counts per text) into one file, gretil_index.bin:
+
+  header    magic, length, then JSON: texts with their verse range and frequency
+            table, section offsets, and a digest of the source files
+  labels    every distinct label, sorted (uint32 offsets + UTF-8 blob)
+  postings  verse numbers grouped by label, in corpus order (uint32), with per-label starts
+  verses    label of each verse (uint32); verse ids (uint32 offsets + UTF-8 blob)
+  by_id     each text's verse numbers sorted by id, for id lookups
+
+Verses are numbered across the corpus text by text, so a text is a contiguous range and
+its verses under a label are a contiguous run of that label's postings, found by
+bisection. Only the header and the labels are decoded on open; the arrays are read
+straight from the mapping, which the page cache shares between gunicorn workers.
+
+open_index() rebuilds the file first if it is missing or its sources changed, and
+gretil_build.py rebuilds it after regenerating outputs.
+
+Usage:
+  python gretil_index.py        # (re)build assets/meter_analyses/gretil_index.bin
+"""
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from itertools import islice
+from pathlib import Path
+
+CORPUS = Path(__file__).resolve().parent / "assets" / "meter_analyses"
+INDEX_PATH = CORPUS / "gretil_index.bin"
+
+MAGIC = b"GRETILIX"
+FORMAT_VERSION = 1
+MATCH_MODES = ("family", "label", "prefix")
+
+# meter family: the label up to its first bracket, colon or "=" (the "=" of ardhasama labels)
+METER_FAMILY = re.compile(r" ?[(\[:=]")
+
+def meter_family(label: str) -> str:
+    """
+    >>> meter_family("anuṣṭubh (1,2: pathyā, 3,4: pathyā)")
+    'anuṣṭubh'
+    >>> meter_family("upajāti triṣṭubh: śālinī [11: mttgg], indravajrā [11: ttjgg]")
+    'upajāti triṣṭubh'
+    >>> meter_family("puṣpitāgrā = [12: nnry] 1,3 + [12: njjrg] 2,4")
+    'puṣpitāgrā'
+    """
+    return METER_FAMILY.split(label.strip(), maxsplit=1)[0]
+
+def _sources(corpus: Path) -> list:
+    return (sorted((corpus / "4_output_cleaned").glob("*_output_cleaned.txt"))
+            + sorted((corpus / "5_tallies").glob("*_tallies.tsv")))
+
+def sources_digest(corpus: Path = CORPUS) -> str:
+    h = hashlib.sha256()
+    for p in _sources(corpus):
+        h.update(p.name.encode("utf-8") + b"\0" + hashlib.sha256(p.read_bytes()).digest())
+    return h.hexdigest()
+
+def _read_tallies(path: Path) -> Counter:
+    tallies = Counter()
+    for line in path.read_text(encoding="utf-8").splitlines():
+        label, n = line.lstrip("\t").rsplit("\t", 1)
+        tallies[label] += int(n)
+    return tallies
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+def _string_table(strings: list) -> tuple:
+    blob = bytearray()
+    offsets = array("I", [0])
+    for s in strings:
+        blob += s.encode("utf-8")
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+def build_index(corpus: Path = CORPUS, path: Path = INDEX_PATH) -> Path:
+    """Compile the outputs and tallies under corpus into path (written atomically)."""
+    digest = sources_digest(corpus)
+    texts, ids, verse_labels = [], [], []
+    for clean in sorted((corpus / "4_output_cleaned").glob("*_output_cleaned.txt")):
+        name = clean.name[:-len("_output_cleaned.txt")]
+        start = len(ids)
+        for line in clean.read_text(encoding="utf-8").split("\n"):
+            if "\t" in line:  # the samāptam footer has none
+                verse_id, label = line.split("\t", 1)
+                ids.append(verse_id)
+                verse_labels.append(label)
+        tally_path = corpus / "5_tallies" / f"{name}_tallies.tsv"
+        tallies = _read_tallies(tally_path) if tally_path.exists() else Counter(verse_labels[start:])
+        texts.append({"name": name, "start": start, "end": len(ids), "tallies": tallies})
+
+    labels = sorted(set(verse_labels).union(*(t["tallies"] for t in texts)))
+    label_idx = {label: i for i, label in enumerate(labels)}
+    verse_label = array("I", (label_idx[label] for label in verse_labels))
+    postings = array("I", sorted(range(len(ids)), key=verse_label.__getitem__))  # stable: corpus order per label
+    posting_starts = array("I", [0] * (len(labels) + 1))
+    for i in verse_label:
+        posting_starts[i + 1] += 1
+    for i in range(len(labels)):
+        posting_starts[i + 1] += posting_starts[i]
+    by_id = array("I")
+    for t in texts:
+        by_id.extend(sorted(range(t["start"], t["end"]), key=ids.__getitem__))
+    label_offsets, label_blob = _string_table(labels)
+    id_offsets, id_blob = _string_table(ids)
+
+    sections, data = {}, bytearray()
+    for name, payload in (("label_offsets", label_offsets), ("labels", label_blob), ("postings", postings),
+                          ("posting_starts", posting_starts), ("verse_label", verse_label),
+                          ("id_offsets", id_offsets), ("ids", id_blob), ("by_id", by_id)):
+        raw = payload.tobytes() if isinstance(payload, array) else payload
+        data += b"\0" * (_align(len(data)) - len(data))
+        sections[name] = [len(data), len(raw)]
+        data += raw
+    header = json.dumps({
+        "format": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "sources": digest,
+        "verses": len(ids),
+        "texts": [{"name": t["name"], "start": t["start"], "end": t["end"],
+                   "tallies": [[label_idx[label], n] for label, n in t["tallies"].most_common()]} for t in texts],
+        "sections": sections,
+    }, ensure_ascii=False).encode("utf-8")
+    prefix = MAGIC + struct.pack("<I", len(header)) + header
+    prefix += b"\0" * (_align(len(prefix)) - len(prefix))
+
+    tmp = path.with_name(path.name + f".tmp-{os.getpid()}")
+    tmp.write_bytes(prefix + data)
+    os.replace(tmp, path)
+    return path
+
+def _read_header(mm) -> tuple:
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a GRETIL index")
+    (length,) = struct.unpack_from("<I", mm, len(MAGIC))
+    start = len(MAGIC) + 4
+    return json.loads(bytes(mm[start:start + length])), _align(start + length)
+
+def index_is_current(path: Path = INDEX_PATH, corpus: Path = CORPUS) -> bool:
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header, _ = _read_header(mm)
+    except (OSError, ValueError):
+        return False
+    return (header.get("format") == FORMAT_VERSION and header.get("byteorder") == sys.byteorder
+            and header.get("sources") == sources_digest(corpus))
+
+def open_index(path: Path = INDEX_PATH, corpus: Path = CORPUS) -> "GretilIndex":
+    """The index at path, rebuilt from corpus first if missing or out of date."""
+    if not index_is_current(path, corpus):
+        build_index(corpus, path)
+    return GretilIndex(path)
+
+class GretilIndex:
+    """Read-only queries over a memory-mapped gretil_index.bin."""
+
+    def __init__(self, path: Path = INDEX_PATH):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header, data_start = _read_header(self._mm)
+        view = memoryview(self._mm)
+
+        def section(name, fmt="I"):
+            offset, length = header["sections"][name]
+            raw = view[data_start + offset:data_start + offset + length]
+            return raw.cast(fmt) if fmt else raw
+
+        self._postings, self._posting_starts = section("postings"), section("posting_starts")
+        self._verse_label, self._by_id = section("verse_label"), section("by_id")
+        self._id_offsets, self._ids = section("id_offsets"), section("ids", None)
+        label_offsets, label_blob = section("label_offsets"), section("labels", None)
+        self.labels = [str(label_blob[label_offsets[i]:label_offsets[i + 1]], "utf-8")
+                       for i in range(len(label_offsets) - 1)]
+        self._label_idx = {label: i for i, label in enumerate(self.labels)}
+        self._families = defaultdict(list)
+        for i, label in enumerate(self.labels):
+            self._families[meter_family(label)].append(i)
+        self.verse_count = header["verses"]
+        self.texts = {t["name"]: t for t in header["texts"]}
+        self._text_starts = [t["start"] for t in header["texts"]]
+        self._text_names = [t["name"] for t in header["texts"]]
+
+    def verse_id(self, n: int) -> str:
+        return str(self._ids[self._id_offsets[n]:self._id_offsets[n + 1]], "utf-8")
+
+    def _text_of(self, n: int) -> str:
+        return self._text_names[bisect_right(self._text_starts, n) - 1]
+
+    def _verse(self, n: int) -> dict:
+        return {"text": self._text_of(n), "id": self.verse_id(n), "label": self.labels[self._verse_label[n]]}
+
+    def summary(self) -> dict:
+        return {"verses": self.verse_count, "labels": len(self.labels),
+                "texts": [{"text": name, "verses": t["end"] - t["start"]} for name, t in self.texts.items()]}
+
+    def frequencies(self, text: str = None, group: str = "label") -> dict:
+        """Verse counts per label (or per meter family), of one text or of the corpus."""
+        counts = Counter()
+        for t in [self.texts[text]] if text else self.texts.values():
+            for i, n in t["tallies"]:
+                counts[self.labels[i]] += n
+        if group == "family":
+            families = Counter()
+            for label, n in counts.items():
+                families[meter_family(label)] += n
+            counts = families
+        return {"text": text, "group": group, "verses": sum(counts.values()),
+                "frequencies": counts.most_common()}
+
+    def matching_labels(self, meter: str, match: str = "family") -> list:
+        if match == "label":
+            return [self._label_idx[meter]] if meter in self._label_idx else []
+        if match == "family":
+            return self._families.get(meter, [])
+        return [i for i, label in enumerate(self.labels) if label.startswith(meter)]
+
+    def verses(self, meter: str, text: str = None, match: str = "family", offset: int = 0, limit: int = 100) -> dict:
+        """Verses whose label matches meter, in corpus order, paged by offset/limit."""
+        runs = []
+        for i in self.matching_labels(meter, match):
+            lo, hi = self._posting_starts[i], self._posting_starts[i + 1]
+            if text:
+                t = self.texts[text]
+                lo, hi = (bisect_left(self._postings, t["start"], lo, hi),
+                          bisect_left(self._postings, t["end"], lo, hi))
+            if lo < hi:
+                runs.append(self._postings[lo:hi])
+        page = islice(heapq.merge(*runs), offset, offset + limit)
+        return {"meter": meter, "match": match, "text": text, "total": sum(len(r) for r in runs),
+                "offset": offset, "limit": limit, "verses": [self._verse(n) for n in page]}
+
+    def lookup(self, text: str, verse_id: str) -> dict:
+        """The verse(s) of text with the given id."""
+        t = self.texts[text]  # by_id holds a text's verses at the same positions as its verse range
+        lo, hi = t["start"], t["end"]
+        lo = bisect_left(self._by_id, verse_id, lo, hi, key=self.verse_id)
+        found = []
+        while lo < hi and self.verse_id(self._by_id[lo]) == verse_id:
+            found.append(self._verse(self._by_id[lo]))
+            lo += 1
+        return {"text": text, "id": verse_id, "verses": found}
+
+if __name__ == "__main__":
+    path = build_index()
+    index = GretilIndex(path)
+    print(f"{path}: {index.verse_count} verses, {len(index.labels)} labels, {len(index.texts)} texts, "
+          f"{path.stat().st_size / 1e6:.1f} MB")
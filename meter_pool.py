@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+meter_pool.py - one long-lived, host-wide process pool for batch meter identification.
+
+MeterIdentifier.identify_meter_batch starts a pool of BATCH_MAX_WORKERS processes for
+every large batch, so under gunicorn (4 workers x 4 threads) two concurrent uploads ask
+for twice that many processes whatever the core count. Large batches are sent to a single
+pool server per host instead:
+
+  - the server owns METER_POOL_PROCESSES identification processes, the cap on CPU
+    parallelism for batch identification on this host, each with one MeterIdentifier
+  - a batch is cut into chunks of METER_POOL_CHUNK verses, and chunks are dispatched
+    round-robin across the waiting batches, never more at a time than there are processes,
+    so a small upload is not queued behind the whole of a large one
+  - while more than METER_POOL_MAX_BACKLOG verses are queued, new batches are refused
+    with MeterPoolBusy (503 + Retry-After in flask_app), the wait estimated from the
+    recent time per verse
+
+The first web worker that needs the server starts it (serialized by a file lock). It
+listens on a Unix socket in a directory private to the user (one that another user owns
+or can open is refused), and both ends prove they know the random key in that directory's
+0600 authkey file before any pickle is exchanged. The server exits once idle for
+METER_POOL_IDLE_SECS; the next batch starts it again. identify() is the client side,
+update_metrics() copies the server's queue state into this process's /metrics.
+
+Usage:
+  python meter_pool.py --serve      # run the server in the foreground (normally started on demand)
+  python meter_pool.py --stats      # print the running server's queue state
+"""
+import argparse
+import fcntl
+import functools
+import json
+import logging
+import math
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import AuthenticationError, get_context
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+METER_POOL_DIR = Path(os.getenv("METER_POOL_DIR", Path(tempfile.gettempdir()) / f"skrutable_meter_pool_{os.getuid()}"))
+METER_POOL_PROCESSES = int(os.getenv("METER_POOL_PROCESSES", str(os.cpu_count() or 1)))
+METER_POOL_CHUNK = int(os.getenv("METER_POOL_CHUNK", "50"))
+METER_POOL_MAX_BACKLOG = int(os.getenv("METER_POOL_MAX_BACKLOG", "20000"))
+METER_POOL_MAX_RETRY_AFTER_SECS = int(os.getenv("METER_POOL_MAX_RETRY_AFTER_SECS", "120"))
+METER_POOL_IDLE_SECS = float(os.getenv("METER_POOL_IDLE_SECS", "900"))
+METER_POOL_START_SECS = float(os.getenv("METER_POOL_START_SECS", "30"))
+
+SOCKET_PATH = METER_POOL_DIR / "pool.sock"
+AUTHKEY_PATH = METER_POOL_DIR / "authkey"
+# server's state reported by update_metrics(), as meter_pool_<key> gauges
+STATS_GAUGES = ("processes", "batches", "queued_verses", "queued_chunks", "running_chunks")
+
+metrics.describe("meter_pool_batches", "Batches on the host's meter pool, queued or running (host-wide)", "gauge")
+metrics.describe("meter_pool_queued_verses", "Verses waiting for a meter pool process (host-wide)", "gauge")
+metrics.describe("meter_pool_queued_chunks", "Chunks waiting for a meter pool process (host-wide)", "gauge")
+metrics.describe("meter_pool_running_chunks", "Chunks being identified by meter pool processes (host-wide)", "gauge")
+metrics.describe("meter_pool_processes", "Identification processes of the host's meter pool", "gauge")
+metrics.describe("meter_pool_rejected_total", "Batches this worker had refused because the meter pool backlog was full", "counter")
+metrics.describe("meter_pool_batch_seconds", "Seconds this worker's batches spent on the meter pool, queueing included", "summary")
+
+class MeterPoolBusy(Exception):
+    """Raised when the pool's backlog is past METER_POOL_MAX_BACKLOG verses."""
+
+    def __init__(self, queued_verses: int, retry_after: int):
+        super().__init__(f"Meter identification is at capacity ({queued_verses} verses queued); "
+                         f"retry in {retry_after} s")
+        self.retry_after = retry_after
+
+# --- pool processes ---
+
+_MI = None
+
+def _init_worker():
+    global _MI
+    from skrutable.meter_identification import MeterIdentifier
+    _MI = MeterIdentifier()
+
+def _identify_chunk(verses, resplit_option, resplit_keep_midpoint, from_scheme):
+    return [_MI.identify_meter(s, resplit_option=resplit_option, resplit_keep_midpoint=resplit_keep_midpoint,
+                               from_scheme=from_scheme) for s in verses]
+
+# --- socket directory ---
+
+def _private_dir() -> Path:
+    """METER_POOL_DIR, created if missing; ConnectionError unless only this user can use it."""
+    METER_POOL_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    st = METER_POOL_DIR.lstat()
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise ConnectionError(f"refusing to use {METER_POOL_DIR}: not a directory private to uid {os.getuid()} "
+                              f"(owner {st.st_uid}, mode {stat.filemode(st.st_mode)})")
+    return METER_POOL_DIR
+
+def _authkey() -> bytes:
+    """The key server and clients authenticate each other with, made on first use (0600)."""
+    _private_dir()
+    if not AUTHKEY_PATH.exists():
+        tmp = AUTHKEY_PATH.with_name(f"authkey.{os.getpid()}.{threading.get_ident()}.tmp")
+        fd = os.open(tmp, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(os.urandom(32))
+        try:
+            os.link(tmp, AUTHKEY_PATH)  # the first writer wins; the others read its key
+        except FileExistsError:
+            pass
+        finally:
+            tmp.unlink()
+    fd = os.open(AUTHKEY_PATH, os.O_RDONLY | os.O_NOFOLLOW)
+    with os.fdopen(fd, "rb") as fh:
+        st = os.fstat(fh.fileno())
+        if not stat.S_ISREG(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+            raise ConnectionError(f"refusing to use {AUTHKEY_PATH}: not a 0600 file of uid {os.getuid()}")
+        return fh.read()
+
+# --- server ---
+
+class _Batch:
+
+    def __init__(self, verses: list, options: tuple):
+        self.options = options
+        self.chunks = deque((start, verses[start:start + METER_POOL_CHUNK])
+                            for start in range(0, len(verses), METER_POOL_CHUNK))
+        self.results = [None] * len(verses)
+        self.remaining = len(self.chunks)
+        self.error = None
+        self.done = threading.Event()
+        if not self.remaining:
+            self.done.set()
+
+class PoolServer:
+    """Round-robin chunk scheduling over a fixed set of identification processes."""
+
+    def __init__(self, processes: int = METER_POOL_PROCESSES, max_backlog: int = METER_POOL_MAX_BACKLOG):
+        self.processes = processes
+        self.max_backlog = max_backlog
+        self._executor = self._new_executor()
+        self._lock = threading.RLock()  # chunk callbacks may run inside _pump
+        self._waiting = deque()  # batches with undispatched chunks, in turn order
+        self._batches = 0
+        self._clients = 0
+        self._queued_verses = 0
+        self._running = 0
+        self._verses_done = 0
+        self._rejected = 0
+        self._secs_per_verse = 0.005  # moving average over chunks, for Retry-After
+        self.last_active = time.monotonic()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(self.processes, mp_context=get_context("spawn"), initializer=_init_worker)
+
+    def _retry_after(self) -> int:
+        wait = self._queued_verses * self._secs_per_verse / self.processes
+        return max(1, min(METER_POOL_MAX_RETRY_AFTER_SECS, math.ceil(wait)))
+
+    def submit(self, verses: list, options: tuple):
+        """A _Batch for verses, or (None, retry_after) if the backlog is full."""
+        with self._lock:
+            if self._queued_verses >= self.max_backlog:
+                self._rejected += 1
+                return None, self._retry_after()
+            batch = _Batch(verses, options)
+            if batch.remaining:
+                self._batches += 1
+                self._queued_verses += len(verses)
+                self._waiting.append(batch)
+                self._pump()
+            return batch, 0
+
+    def _pump(self):
+        """Start chunks, one per waiting batch in turn, while processes are free (lock held)."""
+        while self._running < self.processes and self._waiting:
+            batch = self._waiting.popleft()
+            start, chunk = batch.chunks.popleft()
+            if batch.chunks:
+                self._waiting.append(batch)
+            self._running += 1
+            self._queued_verses -= len(chunk)
+            try:
+                future = self._executor.submit(_identify_chunk, chunk, *batch.options)
+            except BrokenProcessPool:  # a process died (e.g. OOM); replace the pool
+                logger.warning("meter pool processes broken; restarting them")
+                self._executor = self._new_executor()
+                future = self._executor.submit(_identify_chunk, chunk, *batch.options)
+            future.add_done_callback(functools.partial(self._chunk_done, batch, start, len(chunk), time.perf_counter()))
+
+    def _chunk_done(self, batch, start, size, started, future):
+        secs = time.perf_counter() - started
+        with self._lock:
+            self._running -= 1
+            self._verses_done += size
+            self._secs_per_verse = 0.8 * self._secs_per_verse + 0.2 * secs / size
+            try:
+                batch.results[start:start + size] = future.result()
+            except Exception as exc:
+                batch.error = batch.error or f"{type(exc).__name__}: {exc}"
+            batch.remaining -= 1
+            if not batch.remaining:
+                self._batches -= 1
+                self.last_active = time.monotonic()
+                batch.done.set()
+            self._pump()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "batches": self._batches,
+                "queued_verses": self._queued_verses,
+                "queued_chunks": sum(len(b.chunks) for b in self._waiting),
+                "running_chunks": self._running,
+                "verses_done": self._verses_done,
+                "rejected": self._rejected,
+                "max_backlog": self.max_backlog,
+                "secs_per_verse": round(self._secs_per_verse, 6),
+                "pid": os.getpid(),
+            }
+
+    def idle(self) -> bool:
+        with self._lock:
+            return not (self._batches or self._clients) and time.monotonic() - self.last_active > METER_POOL_IDLE_SECS
+
+    def connected(self):
+        with self._lock:
+            self._clients += 1
+
+    def handle(self, conn):
+        """Answer one client message: ("stats",) or ("identify", verses, options)."""
+        with conn:
+            try:
+                kind, *payload = conn.recv()
+                if kind == "stats":
+                    conn.send(("ok", self.stats()))
+                    return
+                verses, options = payload
+                batch, retry_after = self.submit(verses, tuple(options))
+                if batch is None:
+                    conn.send(("busy", retry_after, self.stats()["queued_verses"]))
+                    return
+                batch.done.wait()
+                conn.send(("error", batch.error) if batch.error else ("ok", batch.results))
+            except (EOFError, OSError):
+                pass  # client went away (or only probed the socket)
+            finally:
+                with self._lock:
+                    self._clients -= 1
+                    self.last_active = time.monotonic()
+
+    def shutdown(self):
+        self._executor.shutdown(cancel_futures=True)
+
+def serve():
+    """Run the host's pool server until it has been idle for METER_POOL_IDLE_SECS."""
+    with open(_private_dir() / "server.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # waits for a predecessor that is still shutting down
+        SOCKET_PATH.unlink(missing_ok=True)
+        server = PoolServer()
+        listener = Listener(str(SOCKET_PATH), family="AF_UNIX", authkey=_authkey())
+        logger.info("meter pool serving on %s with %d processes", SOCKET_PATH, server.processes)
+
+        closing = threading.Event()
+
+        def accept_forever():
+            while True:
+                try:
+                    conn = listener.accept()
+                except AuthenticationError:
+                    logger.warning("meter pool: refused a client without the authkey")
+                    continue
+                except (OSError, EOFError) as exc:
+                    if closing.is_set():
+                        return
+                    logger.warning("meter pool: client handshake failed (%s)", exc)
+                    continue
+                server.connected()
+                threading.Thread(target=server.handle, args=(conn,), daemon=True).start()
+
+        threading.Thread(target=accept_forever, daemon=True).start()
+        while not server.idle():
+            time.sleep(min(5.0, METER_POOL_IDLE_SECS))
+        closing.set()
+        listener.close()  # removes the socket: new clients start a new server from here on
+        server.shutdown()
+        logger.info("meter pool idle for %.0f s; exiting", METER_POOL_IDLE_SECS)
+
+# --- client ---
+
+_start_lock = threading.Lock()
+
+def _start_server():
+    """Start the pool server unless one is already listening (one starter per host at a time)."""
+    with _start_lock, open(_private_dir() / "start.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if _request(("stats",), start=False):
+            return
+        logger.info("starting meter pool server")
+        subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "--serve"],
+                         cwd=Path(__file__).resolve().parent, stdin=subprocess.DEVNULL,
+                         stdout=subprocess.DEVNULL, start_new_session=True)
+        deadline = time.monotonic() + METER_POOL_START_SECS
+        while not _request(("stats",), start=False):
+            if time.monotonic() > deadline:
+                raise ConnectionError(f"meter pool server did not start within {METER_POOL_START_SECS:.0f} s")
+            time.sleep(0.05)
+
+def _request(message: tuple, start: bool = True):
+    """Send message to the pool server and return its reply; without start, None if none is running."""
+    for attempt in range(3):
+        try:
+            with Client(str(SOCKET_PATH), family="AF_UNIX", authkey=_authkey()) as conn:
+                conn.send(message)
+                return conn.recv()
+        except AuthenticationError as exc:
+            raise ConnectionError(f"meter pool server failed authentication: {exc}") from None
+        except (FileNotFoundError, ConnectionRefusedError):
+            if not start:
+                return None
+            _start_server()
+        except (EOFError, ConnectionResetError, BrokenPipeError):  # server exited mid-request
+            if not start:
+                return None
+    raise ConnectionError("meter pool server unavailable")
+
+def identify(verses: list, resplit_option, resplit_keep_midpoint, from_scheme) -> list:
+    """Verse objects for verses, identified on the host's pool (raises MeterPoolBusy when it is full)."""
+    started = time.perf_counter()
+    reply = _request(("identify", list(verses), (resplit_option, resplit_keep_midpoint, from_scheme)))
+    if reply[0] == "busy":
+        metrics.inc("meter_pool_rejected_total")
+        raise MeterPoolBusy(reply[2], reply[1])
+    if reply[0] == "error":
+        raise RuntimeError(f"meter pool: {reply[1]}")
+    metrics.observe("meter_pool_batch_seconds", time.perf_counter() - started)
+    return reply[1]
+
+def stats() -> dict:
+    """The pool server's queue state, or None if it is not running (or can't be used safely)."""
+    try:
+        reply = _request(("stats",), start=False)
+    except ConnectionError as exc:
+        logger.warning("%s", exc)
+        return None
+    return reply[1] if reply else None
+
+def update_metrics():
+    """Copy the server's queue state into this process's meter_pool_* gauges."""
+    state = stats() or {}
+    for key in STATS_GAUGES:
+        metrics.set(f"meter_pool_{key}", state.get(key, 0))
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Host-wide meter identification pool")
+    p.add_argument("--serve", action="store_true", help="Run the pool server in the foreground")
+    p.add_argument("--stats", action="store_true", help="Print the running server's queue state")
+    args = p.parse_args()
+    if args.serve:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s meter_pool %(levelname)s %(message)s")
+        serve()
+    elif args.stats:
+        print(json.dumps(stats(), indent=1))
+    else:
+        p.error("nothing to do (use --serve or --stats)")
@@ -0,0 +1,82 @@
+"""Minimal in-process metrics, exposed in Prometheus text format at /metrics.
+
+Counters, gauges and summaries (count + sum) with optional labels. Values are
+per process: under gunicorn each worker reports its own, so scrape each
+worker or aggregate downstream (the `pid` label tells them apart).
+"""
+import os
+import threading
+
+class Metrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._summaries = {}
+        self._help = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict):
+        return name, tuple(sorted(labels.items()))
+
+    def describe(self, name: str, help_text: str, kind: str):
+        self._help[name] = (help_text, kind)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            k = self._key(name, labels)
+            self._counters[k] = self._counters.get(k, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def add(self, name: str, delta: float, **labels):
+        """Adjust a gauge up or down (e.g. in-flight or queued work)."""
+        with self._lock:
+            k = self._key(name, labels)
+            self._gauges[k] = self._gauges.get(k, 0) + delta
+
+    def observe(self, name: str, value: float, **labels):
+        with self._lock:
+            k = self._key(name, labels)
+            count, total = self._summaries.get(k, (0, 0.0))
+            self._summaries[k] = (count + 1, total + value)
+
+    def get(self, name: str, **labels) -> float:
+        k = self._key(name, labels)
+        with self._lock:
+            return self._gauges.get(k, self._counters.get(k, 0))
+
+    def render(self) -> str:
+        pid = str(os.getpid())
+
+        def fmt(name, labels, value):
+            label_str = ",".join(f'{k}="{v}"' for k, v in (*labels, ("pid", pid)))
+            return f"{name}{{{label_str}}} {value}"
+
+        lines = []
+        with self._lock:
+            series = (
+                [(name, "counter", labels, v) for (name, labels), v in self._counters.items()] +
+                [(name, "gauge", labels, v) for (name, labels), v in self._gauges.items()] +
+                [(name, "summary", labels, v) for (name, labels), v in self._summaries.items()]
+            )
+        seen = set()
+        for name, kind, labels, value in sorted(series, key=lambda s: (s[0], s[2])):
+            if name not in seen:
+                seen.add(name)
+                help_text, _ = self._help.get(name, ("", kind))
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            if kind == "summary":
+                count, total = value
+                lines.append(fmt(f"{name}_count", labels, count))
+                lines.append(fmt(f"{name}_sum", labels, round(total, 6)))
+            else:
+                lines.append(fmt(name, labels, value))
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
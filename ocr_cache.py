@@ -0,0 +1,114 @@
+"""Content-addressed, page-level OCR cache on local disk.
+
+Each entry is the raw OCR text of one PDF page, keyed by
+sha256(provider, options, single-page PDF bytes), so re-uploads of the same
+scan (or overlapping page ranges of it) are served without paying the
+provider again. Total size is capped; least recently used entries are evicted.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+OCR_CACHE_DIR = Path(os.getenv("OCR_CACHE_DIR", Path(tempfile.gettempdir()) / "skrutable_ocr_cache"))
+OCR_CACHE_MAX_MB = float(os.getenv("OCR_CACHE_MAX_MB", "256"))  # 0 disables the cache
+
+class OcrPageCache:
+    """Directory of <key[:2]>/<key>.txt files; mtime doubles as last-access time for LRU eviction."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._size = None  # lazily measured; other processes may write too, so re-measured on overflow
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(provider: str, options: dict, page_bytes: bytes) -> str:
+        h = hashlib.sha256()
+        h.update(provider.encode())
+        h.update(b"\0")
+        h.update(json.dumps(options, sort_keys=True).encode())
+        h.update(b"\0")
+        h.update(page_bytes)
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.txt"
+
+    def get(self, key: str):
+        """Return cached page text, or None on miss."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            text = path.read_text(encoding="utf-8")
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return text
+
+    def put(self, key: str, text: str):
+        if not self.enabled:
+            return
+        path = self._path(key)
+        data = text.encode("utf-8")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("OCR cache write failed: %s", e)
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = self._measure()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        for path in self.root.glob("*/*.txt"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _measure(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is at 90% of its cap."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        self._size = total
+        logger.info("OCR cache evicted %d pages (%.1f MB remain)", evicted, total / (1024 * 1024))
+
+page_cache = OcrPageCache(OCR_CACHE_DIR, OCR_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,319 @@
+"""Server-side OCR jobs whose per-chunk results are checkpointed to local disk.
+
+A job runs on a dedicated OCR executor, independently of the HTTP connection
+that started it, so a dropped SSE stream doesn't lose completed chunks: a
+client can reconnect and resume from the last chunk it received, and the full
+text of a finished job stays downloadable until the retention window expires.
+
+The executor is sized separately from gunicorn's request threads
+(OCR_MAX_WORKERS), and admission is capped (OCR_MAX_PENDING running + queued
+jobs per process), so long provider waits never occupy request threads and a
+burst of OCR users can't starve meter identification traffic. At most
+OCR_MAX_STREAMS streams per process hold a request thread, each for at most
+OCR_STREAM_HOLD_SECS, before telling the client to reconnect later, and at most
+OCR_MAX_SYNC_WAITS synchronous POST /ocr requests per process block a request thread
+until their job finishes; further ones are refused with OcrBusy.
+
+Layout of a job directory (<OCR_JOBS_DIR>/<job_id>/):
+  input.pdf          uploaded PDF (deleted once the job finishes)
+  meta.json          status, options, progress, error
+  chunk_0001.json    one file per completed chunk (the SSE chunk payload)
+  result.txt         full text, written when the job is done
+
+API keys are only ever held in memory by the job thread, never written to disk.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from metrics import metrics
+from ocr_service import run_google_ocr, stream_sarvam_ocr
+
+logger = logging.getLogger(__name__)
+
+OCR_JOBS_DIR = Path(os.getenv("OCR_JOBS_DIR", Path(tempfile.gettempdir()) / "skrutable_ocr_jobs"))
+OCR_JOB_RETENTION_HOURS = float(os.getenv("OCR_JOB_RETENTION_HOURS", "24"))
+# a tailing stream gives up if a running job makes no progress for this long
+# (e.g. the worker process that owned it was restarted)
+OCR_JOB_STALL_SECS = float(os.getenv("OCR_JOB_STALL_SECS", "1800"))
+
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "8"))
+OCR_MAX_PENDING = int(os.getenv("OCR_MAX_PENDING", "32"))
+OCR_RETRY_AFTER_SECS = int(os.getenv("OCR_RETRY_AFTER_SECS", "30"))
+OCR_STREAM_HOLD_SECS = float(os.getenv("OCR_STREAM_HOLD_SECS", "5"))
+OCR_STREAM_RETRY_SECS = float(os.getenv("OCR_STREAM_RETRY_SECS", "5"))
+# request threads per process that may be held open tailing a job; other
+# streams only flush the chunks already on disk and return "pending" at once
+OCR_MAX_STREAMS = int(os.getenv("OCR_MAX_STREAMS", "2"))
+# request threads per process that may block on a synchronous POST /ocr; with the
+# stream slots this must stay well below gunicorn's threads per worker
+OCR_MAX_SYNC_WAITS = int(os.getenv("OCR_MAX_SYNC_WAITS", "1"))
+
+JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+metrics.describe("ocr_jobs_running", "OCR jobs executing on the OCR executor", "gauge")
+metrics.describe("ocr_jobs_queued", "OCR jobs admitted but waiting for an OCR executor thread", "gauge")
+metrics.describe("ocr_jobs_rejected_total", "OCR jobs refused because the admission limit was reached", "counter")
+metrics.describe("ocr_job_queue_wait_seconds", "Seconds admitted OCR jobs waited for an executor thread", "summary")
+metrics.describe("ocr_streams_held", "Request threads currently held open by OCR job streams", "gauge")
+metrics.describe("ocr_sync_waits_held", "Request threads currently blocked on a synchronous OCR call", "gauge")
+metrics.describe("ocr_sync_rejected_total", "Synchronous OCR calls refused because every wait slot was taken", "counter")
+
+class OcrBusy(Exception):
+    """Raised when the OCR executor's admission limit is reached."""
+
+    def __init__(self, retry_after: int = OCR_RETRY_AFTER_SECS, capacity: str = f"{OCR_MAX_PENDING} jobs"):
+        super().__init__(f"OCR is at capacity ({capacity}); retry in {retry_after} s")
+        self.retry_after = retry_after
+
+_executor = ThreadPoolExecutor(max_workers=OCR_MAX_WORKERS, thread_name_prefix="ocr")
+_pending = 0
+_pending_lock = threading.Lock()
+
+def submit(fn, *args):
+    """Run fn(*args) on the OCR executor, or raise OcrBusy if too many jobs are pending."""
+    global _pending
+    with _pending_lock:
+        if _pending >= OCR_MAX_PENDING:
+            metrics.inc("ocr_jobs_rejected_total")
+            raise OcrBusy()
+        _pending += 1
+    metrics.add("ocr_jobs_queued", 1)
+    submitted = time.perf_counter()
+
+    def run():
+        global _pending
+        metrics.add("ocr_jobs_queued", -1)
+        metrics.add("ocr_jobs_running", 1)
+        metrics.observe("ocr_job_queue_wait_seconds", time.perf_counter() - submitted)
+        try:
+            return fn(*args)
+        finally:
+            metrics.add("ocr_jobs_running", -1)
+            with _pending_lock:
+                _pending -= 1
+
+    return _executor.submit(run)
+
+_stream_slots = threading.BoundedSemaphore(OCR_MAX_STREAMS)
+
+@contextmanager
+def stream_hold():
+    """Yield how long a job stream may hold its request thread (0 if all slots are taken)."""
+    held = _stream_slots.acquire(blocking=False)
+    if held:
+        metrics.add("ocr_streams_held", 1)
+    try:
+        yield OCR_STREAM_HOLD_SECS if held else 0
+    finally:
+        if held:
+            metrics.add("ocr_streams_held", -1)
+            _stream_slots.release()
+
+_sync_slots = threading.BoundedSemaphore(OCR_MAX_SYNC_WAITS)
+
+@contextmanager
+def sync_wait():
+    """Hold a slot for a request thread blocking on a synchronous OCR call, or raise OcrBusy."""
+    if not _sync_slots.acquire(blocking=False):
+        metrics.inc("ocr_sync_rejected_total")
+        raise OcrBusy(capacity=f"synchronous /ocr calls: {OCR_MAX_SYNC_WAITS}, use /ocr/stream")
+    metrics.add("ocr_sync_waits_held", 1)
+    try:
+        yield
+    finally:
+        metrics.add("ocr_sync_waits_held", -1)
+        _sync_slots.release()
+
+def _job_dir(job_id: str) -> Path:
+    if not JOB_ID_RE.match(job_id or ""):
+        raise KeyError(job_id)
+    return OCR_JOBS_DIR / job_id
+
+def _write_json(path: Path, obj):
+    tmp = path.with_suffix(path.suffix + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(obj, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+def _chunk_path(job_dir: Path, index: int) -> Path:
+    return job_dir / f"chunk_{index:04d}.json"
+
+def job_exists(job_id: str) -> bool:
+    try:
+        return (_job_dir(job_id) / "meta.json").exists()
+    except KeyError:
+        return False
+
+def read_meta(job_id: str) -> dict:
+    return json.loads((_job_dir(job_id) / "meta.json").read_text(encoding="utf-8"))
+
+def _update_meta(job_id: str, **fields):
+    meta = read_meta(job_id)
+    meta.update(fields, updated=time.time())
+    _write_json(_job_dir(job_id) / "meta.json", meta)
+    return meta
+
+def cleanup_expired_jobs():
+    """Delete job directories not touched within the retention window."""
+    if not OCR_JOBS_DIR.exists():
+        return
+    cutoff = time.time() - OCR_JOB_RETENTION_HOURS * 3600
+    for job_dir in OCR_JOBS_DIR.iterdir():
+        try:
+            if job_dir.is_dir() and (job_dir / "meta.json").stat().st_mtime < cutoff:
+                shutil.rmtree(job_dir, ignore_errors=True)
+        except FileNotFoundError:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+def create_job(pdf_file, filename: str, provider: str, options: dict) -> str:
+    """Save the uploaded PDF (a werkzeug FileStorage) into a new job directory; return job_id."""
+    cleanup_expired_jobs()
+    job_id = uuid.uuid4().hex
+    job_dir = _job_dir(job_id)
+    job_dir.mkdir(parents=True)
+    pdf_file.save(job_dir / "input.pdf")
+    now = time.time()
+    _write_json(job_dir / "meta.json", {
+        "job_id":       job_id,
+        "provider":     provider,
+        "filename":     filename,
+        "options":      options,
+        "status":       "queued",
+        "total_chunks": None,
+        "chunks_done":  0,
+        "pages":        0,
+        "cached_pages": 0,
+        "error":        None,
+        "created":      now,
+        "updated":      now,
+    })
+    return job_id
+
+def delete_job(job_id: str):
+    shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+
+def _job_error(exc: Exception) -> dict:
+    if isinstance(exc, RuntimeError) and str(exc) == "QUOTA_EXHAUSTED":
+        return {"status": 402, "message": "Your Sarvam API key has no credits remaining. Add credits at dashboard.sarvam.ai."}
+    return {"status": 500, "message": f"OCR failed: {exc}"}
+
+def run_google_job(job_id: str, api_key: str):
+    """Run a Google Vision job to completion; its whole result is a single chunk (blocking)."""
+    job_dir = _job_dir(job_id)
+    options = read_meta(job_id)["options"]
+    _update_meta(job_id, status="running", total_chunks=1)
+    try:
+        text, pages, cached_pages = run_google_ocr(job_dir / "input.pdf", api_key, options.get("include_page_numbers", True))
+        _write_json(_chunk_path(job_dir, 1), {
+            "index":        1,
+            "total":        1,
+            "pages":        pages,
+            "cached_pages": cached_pages,
+            "timings":      {},
+            "text":         text,
+        })
+        (job_dir / "result.txt").write_text(text, encoding="utf-8")
+        _update_meta(job_id, status="done", chunks_done=1, pages=pages, cached_pages=cached_pages)
+    except Exception as exc:
+        import traceback
+        logger.error("OCR job %s failed: %s\n%s", job_id, exc, traceback.format_exc())
+        _update_meta(job_id, status="error", error=_job_error(exc))
+    finally:
+        (job_dir / "input.pdf").unlink(missing_ok=True)
+
+def run_sarvam_job(job_id: str, api_key: str):
+    """Run a Sarvam job to completion, checkpointing each chunk (blocking)."""
+    job_dir = _job_dir(job_id)
+    options = read_meta(job_id)["options"]
+    _update_meta(job_id, status="running")
+    pages = cached_pages = 0
+    texts = []
+    try:
+        for chunk in stream_sarvam_ocr(
+            job_dir / "input.pdf", api_key,
+            options.get("include_page_numbers", True),
+            options.get("filter_headers_footers", True),
+        ):
+            pages += len(chunk.texts)
+            cached_pages += chunk.cached_pages
+            text = "\n".join(chunk.texts)
+            texts.append(text)
+            _write_json(_chunk_path(job_dir, chunk.index), {
+                "index":        chunk.index,
+                "total":        chunk.total,
+                "pages":        pages,
+                "cached_pages": cached_pages,
+                "timings":      chunk.timings or {},
+                "text":         text,
+            })
+            _update_meta(job_id, total_chunks=chunk.total, chunks_done=chunk.index, pages=pages, cached_pages=cached_pages)
+        (job_dir / "result.txt").write_text("\n".join(texts), encoding="utf-8")
+        _update_meta(job_id, status="done", total_chunks=len(texts), chunks_done=len(texts))
+    except RuntimeError as exc:
+        logger.error("OCR job %s failed: %s", job_id, exc)
+        _update_meta(job_id, status="error", error=_job_error(exc))
+    except Exception as exc:
+        import traceback
+        logger.error("OCR job %s failed: %s\n%s", job_id, exc, traceback.format_exc())
+        _update_meta(job_id, status="error", error=_job_error(exc))
+    finally:
+        (job_dir / "input.pdf").unlink(missing_ok=True)
+
+def start_job(job_id: str, api_key: str):
+    """Queue the job on the OCR executor so it outlives the request that started it.
+
+    Raises OcrBusy (and discards the job) if the admission limit is reached.
+    """
+    provider = read_meta(job_id)["provider"]
+    runner = run_google_job if provider == "google" else run_sarvam_job
+    try:
+        return submit(runner, job_id, api_key)
+    except OcrBusy:
+        delete_job(job_id)
+        raise
+
+def iter_job_events(job_id: str, after: int = 0, poll_interval: float = 1.0, max_secs: float = None):
+    """Generator over a job's events, starting with the first chunk after index `after`.
+
+    Yields ("chunk", payload) for each checkpointed chunk as it appears, then a
+    final ("done", meta) or ("error", meta). If max_secs passes first, yields
+    ("pending", meta) instead and stops, so the caller can release its request
+    thread and have the client resume later. Safe to call from any worker
+    process, since all state is read from disk.
+    """
+    job_dir = _job_dir(job_id)
+    next_index = after + 1
+    started = last_progress = time.time()
+    while True:
+        path = _chunk_path(job_dir, next_index)
+        if path.exists():
+            yield "chunk", json.loads(path.read_text(encoding="utf-8"))
+            next_index += 1
+            last_progress = time.time()
+            continue
+        meta = read_meta(job_id)
+        if meta["status"] == "done" and next_index > meta["chunks_done"]:
+            yield "done", meta
+            return
+        if meta["status"] == "error":
+            yield "error", meta
+            return
+        if time.time() - max(last_progress, meta["updated"]) > OCR_JOB_STALL_SECS:
+            yield "error", {**meta, "error": {"status": 504, "message": "OCR job stalled; please start it again."}}
+            return
+        if max_secs is not None and time.time() - started >= max_secs:
+            yield "pending", meta
+            return
+        time.sleep(poll_interval)
+
+def job_result_path(job_id: str) -> Path:
+    return _job_dir(job_id) / "result.txt"
@@ -1,125 +1,469 @@
 from natsort import natsorted
 from pathlib import Path
-import uuid, json, os, zipfile, tempfile
+from typing import NamedTuple
+import asyncio, io, uuid, json, logging, os, threading, time, zipfile
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 from google.cloud import storage, vision
 from sarvamai import SarvamAI
 from sarvamai.errors import TooManyRequestsError
 from pypdf import PdfReader, PdfWriter
 
+from ocr_cache import page_cache
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
 BUCKET = os.getenv("GCS_BUCKET", "vision_multilang_ocr")   # set via env
 PROJECT = os.getenv("GCP_PROJECT", "sanskrit-ocr-219110") # set via env
 
-def run_google_ocr(pdf_path: Path, api_key: str, include_page_numbers: bool = True) -> tuple:
-    """Upload PDF, run async Vision OCR, return (text, page_count).
+GOOGLE_CACHE_OPTIONS = {"feature": "DOCUMENT_TEXT_DETECTION"}
 
-    Note: Google Vision's block_type enum has no HEADER/FOOTER values (only TEXT, TABLE,
-    PICTURE, RULER, BARCODE), so header/footer filtering is not possible here.
+class SarvamRateLimitError(RuntimeError):
+    """Sarvam answered 429 while credits remain: a rate limit, worth retrying later."""
+
+def _pdf_bytes(reader: PdfReader, page_indices) -> bytes:
+    """Write the given pages of reader into a new in-memory PDF."""
+    writer = PdfWriter()
+    for p in page_indices:
+        writer.add_page(reader.pages[p])
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+def _page_cache_keys(reader: PdfReader, page_indices, provider: str, options: dict) -> list:
+    """Cache keys for each page (hash of its single-page PDF), or all None if the cache is off."""
+    if not page_cache.enabled:
+        return [None for _ in page_indices]
+    return [page_cache.key(provider, options, _pdf_bytes(reader, [p])) for p in page_indices]
+
+def _cached_texts(keys: list) -> list:
+    return [page_cache.get(k) if k else None for k in keys]
+
+def _store_texts(keys: list, page_indices: list, texts: list):
+    for i, text in zip(page_indices, texts):
+        if keys[i]:
+            page_cache.put(keys[i], text)
+
+def _number_pages(texts: list, page_offset: int, include_page_numbers: bool) -> list:
+    if not include_page_numbers:
+        return list(texts)
+    return [f"\n=== {page_offset + i} ===\n{t}" for i, t in enumerate(texts, start=1)]
+
+GOOGLE_BATCH_MAX_FILES = 20  # AsyncAnnotateFileRequests per async_batch_annotate_files call
+
+def _google_batch_upload(bucket, job_id: str, items: list) -> list:
+    """Upload each (pdf_name, pdf_source) under job_id/<i>/; return the Vision requests."""
+    requests = []
+    for i, (pdf_name, pdf_source) in enumerate(items):
+        blob_in = bucket.blob(f"{job_id}/{i}/{pdf_name}")
+        if isinstance(pdf_source, bytes):
+            blob_in.upload_from_string(pdf_source, content_type="application/pdf")
+        else:
+            blob_in.upload_from_filename(pdf_source)
+        blob_in.make_public()
+
+        requests.append(vision.AsyncAnnotateFileRequest(
+            input_config = vision.InputConfig(
+                gcs_source = vision.GcsSource(uri=f"gs://{BUCKET}/{job_id}/{i}/{pdf_name}"),
+                mime_type  = "application/pdf",
+            ),
+            features      = [vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
+            output_config = vision.OutputConfig(
+                gcs_destination = vision.GcsDestination(uri=f"gs://{BUCKET}/{job_id}/ocr/{i}/"),
+                batch_size      = 1,
+            ),
+        ))
+    return requests
+
+def _google_batch_collect(bucket, job_id: str, n_items: int) -> list:
+    """Download the per-item Vision output written under job_id/ocr/<i>/."""
+    results = []
+    for i in range(n_items):
+        # Avoid e.g. 1, 10, 11, sorting problem
+        blobs = natsorted(bucket.list_blobs(prefix=f"{job_id}/ocr/{i}/"), key=lambda b: b.name)
+        texts = []
+        for blob in blobs:
+            data = json.loads(blob.download_as_text())["responses"][0]
+            texts.append(data.get("fullTextAnnotation", {}).get("text", ""))
+        results.append(texts)
+    return results
+
+def _google_batch_cleanup(bucket, job_id: str):
+    bucket.delete_blobs(list(bucket.list_blobs(prefix=job_id)))
+
+def _google_ocr_batch(client_vis, bucket, items: list) -> list:
+    """Run async Vision OCR on several PDFs in one operation.
+
+    items is a list of (pdf_name, pdf_source) where pdf_source is a Path or bytes;
+    returns one list of raw page texts per item. All files share one GCS job prefix,
+    one operation and one cleanup, so small PDFs don't each pay that overhead.
     """
+    job_id = uuid.uuid4().hex
+    try:
+        requests = _google_batch_upload(bucket, job_id, items)
+        operation = client_vis.async_batch_annotate_files(requests=requests)
+        operation.result(timeout=420)
+        return _google_batch_collect(bucket, job_id, len(items))
+    finally:
+        _google_batch_cleanup(bucket, job_id)
+
+async def _google_ocr_batch_async(client_vis, bucket, items: list) -> list:
+    """_google_ocr_batch for an event loop: client_vis is an ImageAnnotatorAsyncClient, so
+    the operation (the long part) is awaited; GCS has no asyncio client, so its short
+    upload/download calls run in the loop's default thread pool."""
+    job_id = uuid.uuid4().hex
+    try:
+        requests = await asyncio.to_thread(_google_batch_upload, bucket, job_id, items)
+        operation = await client_vis.async_batch_annotate_files(requests=requests)
+        await operation.result(timeout=420)
+        return await asyncio.to_thread(_google_batch_collect, bucket, job_id, len(items))
+    finally:
+        await asyncio.to_thread(_google_batch_cleanup, bucket, job_id)
+
+def _google_ocr_pages(client_vis, bucket, pdf_name: str, pdf_source) -> list:
+    """Upload PDF (a Path or bytes), run async Vision OCR, return list of raw page texts."""
+    return _google_ocr_batch(client_vis, bucket, [(pdf_name, pdf_source)])[0]
+
+def _google_clients(api_key: str):
     client_vis   = vision.ImageAnnotatorClient(client_options={"api_key": api_key})
     client_store = storage.Client(project=PROJECT)
+    return client_vis, client_store.bucket(BUCKET)
 
-    bucket  = client_store.bucket(BUCKET)
-    job_id  = uuid.uuid4().hex
-    blob_in = bucket.blob(f"{job_id}/{pdf_path.name}")
-    blob_in.upload_from_filename(pdf_path)
-    blob_in.make_public()
-
-    gcs_src  = f"gs://{BUCKET}/{job_id}/{pdf_path.name}"
-    gcs_dest = f"gs://{BUCKET}/{job_id}/ocr/"
-
-    request = vision.AsyncAnnotateFileRequest(
-        input_config = vision.InputConfig(
-            gcs_source = vision.GcsSource(uri=gcs_src),
-            mime_type  = "application/pdf",
-        ),
-        features      = [vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
-        output_config = vision.OutputConfig(
-            gcs_destination = vision.GcsDestination(uri=gcs_dest),
-            batch_size      = 1,
-        ),
-    )
+# event loop -> {api_key: (ImageAnnotatorAsyncClient, storage.Client)}: an asyncio gRPC
+# channel belongs to the loop it was made on, so clients are reused per loop and key
+_google_async_clients_by_loop = {}
+
+def _google_async_clients(api_key: str):
+    """The async Vision client and GCS bucket for api_key on the running loop, made once and reused."""
+    clients = _google_async_clients_by_loop.setdefault(asyncio.get_running_loop(), {})
+    if api_key not in clients:
+        clients[api_key] = (vision.ImageAnnotatorAsyncClient(client_options={"api_key": api_key}),
+                            storage.Client(project=PROJECT))
+    client_vis, client_store = clients[api_key]
+    return client_vis, client_store.bucket(BUCKET)
 
-    operation = client_vis.async_batch_annotate_files(requests=[request])
-    operation.result(timeout=420)
+async def close_google_async_clients():
+    """Close the clients _google_async_clients made on the running loop; call before the loop stops."""
+    for client_vis, client_store in _google_async_clients_by_loop.pop(asyncio.get_running_loop(), {}).values():
+        await client_vis.transport.close()
+        client_store.close()
 
-    # Avoid e.g. 1, 10, 11, sorting problem
-    blobs = natsorted(bucket.list_blobs(prefix=f"{job_id}/ocr/"), key=lambda b: b.name)
+def run_google_ocr(pdf_path: Path, api_key: str, include_page_numbers: bool = True) -> tuple:
+    """Upload PDF, run async Vision OCR, return (text, page_count, cached_pages).
+
+    Pages already in the local page cache are not sent to Vision; only the
+    uncached ones are uploaded (as a smaller PDF) and merged back in order.
+
+    Note: Google Vision's block_type enum has no HEADER/FOOTER values (only TEXT, TABLE,
+    PICTURE, RULER, BARCODE), so header/footer filtering is not possible here.
+    """
+    return run_google_ocr_batch([pdf_path], api_key, include_page_numbers)[0]
 
-    texts = []
-    for i, blob in enumerate(blobs, start=1):
-        data = json.loads(blob.download_as_text())["responses"][0]
-        page_text = data.get("fullTextAnnotation", {}).get("text", "")
+def _google_batch_plan(pdf_paths: list) -> tuple:
+    """Look up cached pages: returns plans, one (keys, texts, missing) per PDF, and the
+    (plan index, pdf_name, source) items that still need Vision."""
+    if len(pdf_paths) > GOOGLE_BATCH_MAX_FILES:
+        raise ValueError(f"at most {GOOGLE_BATCH_MAX_FILES} PDFs per Vision batch")
+    if not page_cache.enabled:
+        return [None] * len(pdf_paths), [(i, p.name, p) for i, p in enumerate(pdf_paths)]
 
-        if include_page_numbers:
-            page_text = f"\n=== {i} ===\n{page_text}"
+    plans = []
+    to_send = []
+    for pdf_path in pdf_paths:
+        reader = PdfReader(str(pdf_path))
+        all_pages = list(range(len(reader.pages)))
+        keys = _page_cache_keys(reader, all_pages, "google", GOOGLE_CACHE_OPTIONS)
+        texts = _cached_texts(keys)
+        missing = [p for p in all_pages if texts[p] is None]
+        if missing:
+            source = pdf_path if len(missing) == len(all_pages) else _pdf_bytes(reader, missing)
+            to_send.append((len(plans), pdf_path.name, source))
+        plans.append((keys, texts, missing))
+    return plans, to_send
 
-        texts.append(page_text)
+def _google_batch_results(plans: list, to_send: list, batch: list, include_page_numbers: bool) -> list:
+    """Merge fresh Vision pages into the plans (caching them); one (text, page_count, cached_pages) per PDF."""
+    for (i, _, _), fresh in zip(to_send, batch):
+        if plans[i] is None:
+            plans[i] = ([None] * len(fresh), list(fresh), list(range(len(fresh))))
+            continue
+        keys, texts, missing = plans[i]
+        if len(fresh) == len(missing):
+            _store_texts(keys, missing, fresh)
+        for p, text in zip(missing, fresh):
+            texts[p] = text
 
-    final_output = "\n".join(texts)
-    page_count = len(texts)
+    results = []
+    for keys, texts, missing in plans:
+        texts = [t or "" for t in texts]
+        results.append(("\n".join(_number_pages(texts, 0, include_page_numbers)), len(texts), len(texts) - len(missing)))
+    return results
 
-    bucket.delete_blobs(list(bucket.list_blobs(prefix=job_id)))
+def run_google_ocr_batch(pdf_paths: list, api_key: str, include_page_numbers: bool = True) -> list:
+    """Like run_google_ocr for several PDFs packed into one Vision operation
+    (at most GOOGLE_BATCH_MAX_FILES); returns one (text, page_count, cached_pages) per PDF.
+    """
+    plans, to_send = _google_batch_plan(pdf_paths)
+    batch = []
+    if to_send:
+        client_vis, bucket = _google_clients(api_key)
+        batch = _google_ocr_batch(client_vis, bucket, [(name, source) for _, name, source in to_send])
+    return _google_batch_results(plans, to_send, batch, include_page_numbers)
 
-    return final_output, page_count
+async def run_google_ocr_batch_async(pdf_paths: list, api_key: str, include_page_numbers: bool = True) -> list:
+    """Coroutine version of run_google_ocr_batch, for bulk_vision_runner --mode async."""
+    plans, to_send = await asyncio.to_thread(_google_batch_plan, pdf_paths)
+    batch = []
+    if to_send:
+        client_vis, bucket = _google_async_clients(api_key)
+        batch = await _google_ocr_batch_async(client_vis, bucket, [(name, source) for _, name, source in to_send])
+    return _google_batch_results(plans, to_send, batch, include_page_numbers)
 
 SARVAM_PAGE_LIMIT = 10
 
-def _run_sarvam_ocr_chunk(client, chunk_path: Path, page_offset: int, include_page_numbers: bool, filter_headers_footers: bool) -> list:
-    """Run Sarvam OCR on a single chunk PDF, return list of page text strings."""
+class OcrChunk(NamedTuple):
+    """One streamed chunk of Sarvam OCR output."""
+    index: int           # 1-based chunk number
+    total: int           # total number of chunks
+    texts: list          # page texts (numbered if requested), in page order
+    cached_pages: int    # how many of these pages came from the local page cache
+    timings: dict = None # per-stage seconds for the upstream job ({} if fully cached, None if not given)
+
+def _sarvam_cache_options(filter_headers_footers: bool) -> dict:
+    return {"language": "sa-IN", "output_format": "md", "filter_headers_footers": filter_headers_footers}
+
+def _sarvam_create_job(client):
     try:
-        job = client.document_intelligence.create_job(language="sa-IN", output_format="md")
+        return client.document_intelligence.create_job(language="sa-IN", output_format="md")
     except TooManyRequestsError as e:
         body = getattr(e, "body", {}) or {}
         err = (body.get("error") or {}) if isinstance(body, dict) else {}
         code = err.get("code", "")
         if code == "insufficient_quota_error" or "credits" in err.get("message", "").lower():
             raise RuntimeError("QUOTA_EXHAUSTED") from None
-        raise RuntimeError(f"Sarvam API rate limit: {err.get('message') or str(e)}") from None
-    job.upload_file(str(chunk_path))
-    job.start()
-    job.wait_until_complete()
-
-    with tempfile.TemporaryDirectory() as td:
-        zip_path = Path(td) / "output.zip"
-        job.download_output(str(zip_path))
-        with zipfile.ZipFile(zip_path) as zf:
-            json_names = natsorted([n for n in zf.namelist() if n.endswith(".json")])
-            texts = []
-            for i, name in enumerate(json_names, start=1):
-                data = json.loads(zf.read(name))
-                blocks = sorted(data.get("blocks", []), key=lambda b: b.get("reading_order", 0))
-                excluded = {"header", "footnote"} if filter_headers_footers else set()
-                page_text = "\n".join(
-                    b["text"] for b in blocks
-                    if b.get("layout_tag") not in excluded
-                )
-                if include_page_numbers:
-                    page_text = f"\n=== {page_offset + i} ===\n{page_text}"
-                texts.append(page_text)
+        raise SarvamRateLimitError(f"Sarvam API rate limit: {err.get('message') or str(e)}") from None
+
+def _sarvam_upload_bytes(client, job, filename: str, pdf_bytes: bytes):
+    """Upload an in-memory PDF to a job's presigned URL (the SDK's upload_file only takes a path)."""
+    upload_response = client.document_intelligence.get_upload_links(job_id=job.job_id, files=[filename])
+    file_details = (upload_response.upload_urls or {}).get(filename)
+    if not file_details:
+        raise ValueError(f"No upload URL for file: {filename}")
+    response = httpx.put(
+        file_details.file_url,
+        content=pdf_bytes,
+        headers={"Content-Type": "application/pdf", "x-ms-blob-type": "BlockBlob"},
+        timeout=300.0,
+    )
+    response.raise_for_status()
+
+def _sarvam_download_bytes(client, job) -> bytes:
+    """Fetch a finished job's output zip into memory (the SDK's download_output only writes to a path)."""
+    download_response = client.document_intelligence.get_download_links(job.job_id)
+    if not download_response.download_urls:
+        raise ValueError("No download URL available")
+    file_details = next(iter(download_response.download_urls.values()))
+    response = httpx.get(file_details.file_url, timeout=300.0)
+    response.raise_for_status()
+    return response.content
+
+def _parse_sarvam_output(zip_bytes: bytes, filter_headers_footers: bool) -> list:
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
+        json_names = natsorted([n for n in zf.namelist() if n.endswith(".json")])
+        texts = []
+        for name in json_names:
+            data = json.loads(zf.read(name))
+            blocks = sorted(data.get("blocks", []), key=lambda b: b.get("reading_order", 0))
+            excluded = {"header", "footnote"} if filter_headers_footers else set()
+            page_text = "\n".join(
+                b["text"] for b in blocks
+                if b.get("layout_tag") not in excluded
+            )
+            texts.append(page_text)
     return texts
 
+# Adaptive job-status polling: poll fast at first (small chunks can finish in
+# seconds), back off exponentially, and once the learned per-page estimate says
+# the job should be close to done, sleep straight up to that point.
+SARVAM_POLL_INITIAL_SECS = 0.5
+SARVAM_POLL_BACKOFF = 1.6
+SARVAM_POLL_MAX_SECS = 10.0
+SARVAM_JOB_TIMEOUT_SECS = float(os.getenv("SARVAM_JOB_TIMEOUT_SECS", "1800"))
+SARVAM_TERMINAL_STATES = {"Completed", "PartiallyCompleted", "Failed"}
+SARVAM_QUEUED_STATES = {"Accepted", "Pending"}
+
+class _SecsPerPageEstimate:
+    """Exponentially weighted estimate of Sarvam queue + processing seconds per page."""
+
+    def __init__(self, initial: float, alpha: float = 0.3):
+        self.value = initial
+        self.alpha = alpha
+        self._lock = threading.Lock()
+
+    def update(self, secs: float, pages: int):
+        if pages <= 0:
+            return
+        with self._lock:
+            self.value += self.alpha * (secs / pages - self.value)
+
+sarvam_secs_per_page = _SecsPerPageEstimate(float(os.getenv("SARVAM_SECS_PER_PAGE", "2.0")))
+
+metrics.describe("ocr_sarvam_stage_seconds", "Seconds spent per Sarvam OCR chunk stage", "summary")
+metrics.describe("ocr_sarvam_status_polls_total", "Sarvam job-status polls issued", "counter")
+metrics.describe("ocr_sarvam_chunks_total", "Sarvam OCR chunks sent upstream", "counter")
+metrics.describe("ocr_sarvam_pages_total", "Pages sent upstream to Sarvam OCR", "counter")
+
+def _next_poll_delay(elapsed: float, delay: float, expected: float) -> float:
+    """Sleep before the next status poll: exponential backoff, but don't poll
+    repeatedly well before `expected` (the estimated completion time)."""
+    if elapsed < 0.8 * expected:
+        delay = max(delay, 0.8 * expected - elapsed)
+    return min(delay, SARVAM_POLL_MAX_SECS)
+
+def _wait_for_sarvam_job(job, n_pages: int, timings: dict):
+    """Poll until the job reaches a terminal state; fills timings["queue_wait"] and ["processing"]."""
+    t0 = time.perf_counter()
+    expected = sarvam_secs_per_page.value * n_pages
+    delay = SARVAM_POLL_INITIAL_SECS
+    running_at = None
+    prev_poll = t0
+    polls = 0
+    while True:
+        state = job.get_status().job_state
+        polls += 1
+        now = time.perf_counter()
+        if running_at is None and state not in SARVAM_QUEUED_STATES:
+            # it left the queue somewhere between the previous poll and this one
+            running_at = (prev_poll + now) / 2
+        prev_poll = now
+        if state in SARVAM_TERMINAL_STATES:
+            break
+        elapsed = now - t0
+        if elapsed >= SARVAM_JOB_TIMEOUT_SECS:
+            raise RuntimeError(f"Sarvam job {job.job_id} did not finish within {SARVAM_JOB_TIMEOUT_SECS:.0f} s")
+        time.sleep(_next_poll_delay(elapsed, delay, expected))
+        delay *= SARVAM_POLL_BACKOFF
+
+    timings["queue_wait"] = running_at - t0
+    timings["processing"] = now - running_at
+    metrics.inc("ocr_sarvam_status_polls_total", polls)
+    sarvam_secs_per_page.update(now - t0, n_pages)
+    if state == "Failed":
+        raise RuntimeError(f"Sarvam job {job.job_id} failed")
+
+def _run_sarvam_ocr_chunk(client, chunk_name: str, chunk_bytes: bytes, n_pages: int, filter_headers_footers: bool) -> tuple:
+    """Run Sarvam OCR on a single in-memory chunk PDF.
+
+    Returns (raw page texts, timings), where timings holds seconds spent in each
+    stage: create, upload (incl. start), queue_wait, processing, download, parse.
+    """
+    timings = {}
+    t = time.perf_counter()
+
+    def lap(stage):
+        nonlocal t
+        now = time.perf_counter()
+        timings[stage] = now - t
+        t = now
+
+    job = _sarvam_create_job(client)
+    lap("create")
+    _sarvam_upload_bytes(client, job, chunk_name, chunk_bytes)
+    job.start()
+    lap("upload")
+    _wait_for_sarvam_job(job, n_pages, timings)
+    t = time.perf_counter()
+    zip_bytes = _sarvam_download_bytes(client, job)
+    lap("download")
+    texts = _parse_sarvam_output(zip_bytes, filter_headers_footers)
+    lap("parse")
+
+    timings = {stage: round(secs, 3) for stage, secs in timings.items()}
+    for stage, secs in timings.items():
+        metrics.observe("ocr_sarvam_stage_seconds", secs, stage=stage)
+    metrics.inc("ocr_sarvam_chunks_total")
+    metrics.inc("ocr_sarvam_pages_total", n_pages)
+    logger.info("Sarvam chunk %s: %d pages, timings %s", chunk_name, n_pages, timings)
+    return texts, timings
+
 def run_sarvam_ocr(pdf_path: Path, api_key: str, include_page_numbers: bool = True, filter_headers_footers: bool = True) -> tuple:
-    """Submit PDF to Sarvam Vision, return (text, page_count). Splits into chunks if > 10 pages."""
+    """Submit PDF to Sarvam Vision, return (text, page_count, cached_pages). Splits into chunks if > 10 pages."""
     all_texts = []
-    for _, _, chunk_texts in stream_sarvam_ocr(pdf_path, api_key, include_page_numbers, filter_headers_footers):
-        all_texts.extend(chunk_texts)
-    return "\n".join(all_texts), len(all_texts)
+    cached_pages = 0
+    for chunk in stream_sarvam_ocr(pdf_path, api_key, include_page_numbers, filter_headers_footers):
+        all_texts.extend(chunk.texts)
+        cached_pages += chunk.cached_pages
+    return "\n".join(all_texts), len(all_texts), cached_pages
+
+class _ChunkPlan(NamedTuple):
+    start: int           # 0-based index of the chunk's first page
+    keys: list           # page cache keys (None when the cache is off)
+    texts: list          # cached page texts, None where a page must be OCR'd
+    missing: list        # positions within the chunk that must be OCR'd
+    pdf_bytes: bytes     # PDF of just the missing pages (b"" if none)
+
+def _plan_sarvam_chunks(pdf_path: Path, total_pages: int, cache_options: dict):
+    """Lazily build each chunk's cache lookups and upload PDF, one chunk at a time.
+
+    The reader works off the open file rather than a copy of it in memory, and
+    its parsed-object cache is cleared after each chunk so that large scan
+    images are released once built, instead of accumulating for the whole book.
+    """
+    with open(pdf_path, "rb") as fh:
+        reader = PdfReader(fh)
+        for chunk_start in range(0, total_pages, SARVAM_PAGE_LIMIT):
+            reader.resolved_objects.clear()
+            chunk_pages = list(range(chunk_start, min(chunk_start + SARVAM_PAGE_LIMIT, total_pages)))
+            keys = _page_cache_keys(reader, chunk_pages, "sarvam", cache_options)
+            texts = _cached_texts(keys)
+            missing = [j for j, t in enumerate(texts) if t is None]
+            pdf_bytes = _pdf_bytes(reader, [chunk_pages[j] for j in missing]) if missing else b""
+            yield _ChunkPlan(chunk_start, keys, texts, missing, pdf_bytes)
+
+_EXHAUSTED = object()
+
+def _one_ahead(iterable):
+    """Yield items from iterable while the next one is produced on a helper thread."""
+    it = iter(iterable)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr-chunk") as ex:
+        fut = ex.submit(next, it, _EXHAUSTED)
+        while True:
+            item = fut.result()
+            if item is _EXHAUSTED:
+                return
+            fut = ex.submit(next, it, _EXHAUSTED)
+            yield item
 
 def stream_sarvam_ocr(pdf_path: Path, api_key: str, include_page_numbers: bool = True, filter_headers_footers: bool = True):
-    """Generator: yields (chunk_index, total_chunks, chunk_texts) as each chunk completes."""
-    reader = PdfReader(str(pdf_path))
-    total_pages = len(reader.pages)
+    """Generator: yields an OcrChunk as each 10-page chunk completes.
+
+    Chunk PDFs are built in memory, one chunk ahead of the upload, so the next
+    chunk is ready as soon as the current one finishes and no temp files are
+    written. Pages found in the local page cache are not sent upstream; a
+    chunk whose pages are all cached is yielded without contacting Sarvam.
+    """
+    with open(pdf_path, "rb") as fh:
+        total_pages = len(PdfReader(fh).pages)
     total_chunks = (total_pages + SARVAM_PAGE_LIMIT - 1) // SARVAM_PAGE_LIMIT
     client = SarvamAI(api_subscription_key=api_key)
 
-    with tempfile.TemporaryDirectory() as chunk_dir:
-        for i, chunk_start in enumerate(range(0, total_pages, SARVAM_PAGE_LIMIT), start=1):
-            chunk_end = min(chunk_start + SARVAM_PAGE_LIMIT, total_pages)
-            writer = PdfWriter()
-            for p in range(chunk_start, chunk_end):
-                writer.add_page(reader.pages[p])
-            chunk_path = Path(chunk_dir) / f"chunk_{chunk_start}.pdf"
-            with open(chunk_path, "wb") as f:
-                writer.write(f)
-            chunk_texts = _run_sarvam_ocr_chunk(client, chunk_path, chunk_start, include_page_numbers, filter_headers_footers)
-            yield i, total_chunks, chunk_texts
+    plans = _plan_sarvam_chunks(pdf_path, total_pages, _sarvam_cache_options(filter_headers_footers))
+    for i, plan in enumerate(_one_ahead(plans), start=1):
+        texts = list(plan.texts)
+        timings = {}
+        if plan.missing:
+            fresh, timings = _run_sarvam_ocr_chunk(client, f"chunk_{plan.start}.pdf", plan.pdf_bytes, len(plan.missing), filter_headers_footers)
+            if len(fresh) == len(plan.missing):
+                _store_texts(plan.keys, plan.missing, fresh)
+            for j, text in zip(plan.missing, fresh):
+                texts[j] = text
+
+        texts = [t or "" for t in texts]
+        yield OcrChunk(
+            index=i,
+            total=total_chunks,
+            texts=_number_pages(texts, plan.start, include_page_numbers),
+            cached_pages=len(texts) - len(plan.missing),
+            timings=timings,
+        )